@@ -1,12 +1,8 @@
 import os
-import threading
 import time
 import logging
-from flask import Flask, jsonify
-from dotenv import load_dotenv
-from binance.client import Client
-from binance.enums import *
-from binance.exceptions import BinanceAPIException
+from flask import Flask, Blueprint, jsonify
+from trading.runtime import Services
 
 
 # Load environment variables FROM .env directly
@@ -20,66 +16,29 @@ from binance.exceptions import BinanceAPIException
 # Load environment variables FROM .env directly
 # Load evnvironment variables using SecureConfig
 
-
-from secure_config import SecureConfig
-
-sc = SecureConfig()
-config = sc.load_decrypted_env()
-
-BINANCE_API_KEY = config['BINANCE_API_KEY']
-BINANCE_SECRET_KEY = config['BINANCE_SECRET_KEY']
-BINANCE_MODE = config.get('BINANCE_MODE', 'test')
-
-print("API MODE:", BINANCE_MODE)
-
-# Logging setup
-os.makedirs('logs', exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[
-        logging.FileHandler('logs/trading.log'),
-        logging.StreamHandler()
-    ]
-)
-
-
-# Binance endpoint selection
-if BINANCE_MODE == 'test':
-    BINANCE_API_URL = 'https://testnet.binance.vision'
-else:
-    BINANCE_API_URL = 'https://api.binance.com'
-
-# ✅ 正確初始化 client
-if BINANCE_MODE == 'test':
-    client = Client(
-        BINANCE_API_KEY, 
-        BINANCE_SECRET_KEY,
-        testnet=True
+# 匯入 app 不做任何網路、金鑰或資料庫 I/O：
+# 解密設定、Binance client（經 gateway）、資料庫、K 線快取都在第一次使用時才建立
+services = Services()
+
+
+def setup_logging():
+    # Logging setup
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        handlers=[
+            logging.FileHandler('logs/trading.log'),
+            logging.StreamHandler()
+        ]
     )
-    # logging.info("🧪 Using Binance TESTNET - No real money involved")
-    logging.info("Using Binance TESTNET - No real money involved")
-else:
-    client = Client(BINANCE_API_KEY, BINANCE_SECRET_KEY)
-    # logging.warning("⚠️  Using Binance LIVE - Real trading mode!")
-    logging.warning("Using Binance LIVE - Real trading mode!")
-
-#======================================
-# Load database module
-from trading_data.database import TradingDatabase
 
-# 其他程式碼不變
-db = TradingDatabase()
 
-#======================================
-#======================================
-#======================================
-#======================================
+bp = Blueprint('trading', __name__)
 
-app = Flask(__name__)
 
 # Root route
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def index():
     return """
     <html>
@@ -91,189 +50,91 @@ def index():
                 <li><b>GET</b> <code>/health</code></li>
                 <li><b>POST</b> <code>/trade</code> (start trading)</li>
                 <li><b>GET</b> <code>/trade</code> (status)</li>
+                <li><b>GET</b> <code>/api/trade/stream</code> (live events, Server-Sent Events)</li>
             </ul>
         </body>
     </html>
     """
 
 # Trading state
-trading_thread = None
-trading_active = False
-trading_status = {
-    'active': False,
-    'positions': [],
-    'pnl': 0.0
-}
+# 交易引擎同一時間只在一個 worker 執行（services.engine 持有 lease），
+# scheduler 只在該 worker 內有值；其他 worker 從共享狀態檔讀取狀態
+scheduler = None
 
 # Sample trading strategy: SMA crossover
 SYMBOL = 'BTCUSDT'
-INTERVAL = Client.KLINE_INTERVAL_1MINUTE
+INTERVAL = '1m'  # Client.KLINE_INTERVAL_1MINUTE
 QUANTITY = 0.001
 SHORT_WINDOW = 5
 LONG_WINDOW = 10
 
 
-def get_klines(symbol, interval, limit=LONG_WINDOW+1, max_retries=3):
-    for attempt in range(max_retries):
-        try:
-            klines = client.get_klines(symbol=symbol, interval=interval, limit=limit)
-            closes = [float(k[4]) for k in klines]
-            return closes
-        except Exception as e:
-            if attempt < max_retries - 1:
-                wait_time = 5
-                logging.warning(f"Retry {attempt + 1}/{max_retries} after {wait_time}s: {e}")
-                time.sleep(wait_time)
-            else:
-                logging.error(f"Failed after {max_retries} attempts: {e}")
-                return []
-
-def calculate_sma(data, window):
-    if len(data) < window:
-        return None
-    return sum(data[-window:]) / window
-
-def trading_loop():
-    global trading_active, trading_status
-    position = None
-    entry_price = 0.0
-    balance = 1000.0
-    pnl = 0.0
-    
-    logging.info("Trading loop started.")
-    while trading_active:
-        try:
-            closes = get_klines(SYMBOL, INTERVAL)
-            if len(closes) < LONG_WINDOW:
-                time.sleep(10)
-                continue
-            sma_short = calculate_sma(closes, SHORT_WINDOW)
-            sma_long = calculate_sma(closes, LONG_WINDOW)
-            price = closes[-1]
-            # Simple SMA crossover logic
-            # Add trading record and state saving to database
-            if sma_short and sma_long:  
-                if sma_short > sma_long and not position:
-                    # BUY
-                    order = client.create_test_order(
-                        symbol=SYMBOL,
-                        side=SIDE_BUY,
-                        type=ORDER_TYPE_MARKET,
-                        quantity=QUANTITY
-                    )
-                    
-                    position = 'LONG'
-                    entry_price = price
-                    
-                    # 寫入資料庫
-                    db.insert_trade({
-                        'action': 'BUY',
-                        'symbol': SYMBOL,
-                        'price': price,
-                        'quantity': QUANTITY,
-                        'balance': balance,
-                        'sma_short': sma_short,
-                        'sma_long': sma_long
-                    })
-                    
-                    # 儲存狀態
-                    db.save_state(position, entry_price, balance)
-                    
-                    logging.info(f"BUY {SYMBOL} at {price}")
-                elif sma_short < sma_long and position == 'LONG':
-                    # SELL
-                    order = client.create_test_order(
-                        symbol=SYMBOL,
-                        side=SIDE_SELL,
-                        type=ORDER_TYPE_MARKET,
-                        quantity=QUANTITY
-                    )
-                    
-                    pnl += (price - entry_price) * QUANTITY
-                    balance += pnl
-                    
-                    # 寫入資料庫
-                    db.insert_trade({
-                        'action': 'SELL',
-                        'symbol': SYMBOL,
-                        'price': price,
-                        'quantity': QUANTITY,
-                        'pnl': (price - entry_price) * QUANTITY,
-                        'balance': balance,
-                        'sma_short': sma_short,
-                        'sma_long': sma_long
-                    })
-                    
-                    position = None
-                    entry_price = 0.0
-                    
-                    # 儲存狀態
-                    db.save_state(position, entry_price, balance)
-                    
-                    logging.info(f"SELL {SYMBOL} at {price} | PnL: {pnl:.2f}")
-
-
-                # if sma_short > sma_long and not position:
-                #     # BUY
-                #     order = client.create_test_order(
-                #         symbol=SYMBOL,
-                #         side=SIDE_BUY,
-                #         type=ORDER_TYPE_MARKET,
-                #         quantity=QUANTITY
-                #     )
-                #     position = 'LONG'
-                #     entry_price = price
-                #     logging.info(f"BUY {SYMBOL} at {price}")
-                # elif sma_short < sma_long and position == 'LONG':
-                #     # SELL
-                #     order = client.create_test_order(
-                #         symbol=SYMBOL,
-                #         side=SIDE_SELL,
-                #         type=ORDER_TYPE_MARKET,
-                #         quantity=QUANTITY
-                #     )
-                #     pnl += (price - entry_price) * QUANTITY
-                #     position = None
-                #     entry_price = 0.0
-                #     logging.info(f"SELL {SYMBOL} at {price} | PnL: {pnl:.2f}")
-            trading_status['positions'] = [position] if position else []
-            trading_status['pnl'] = pnl
-        except BinanceAPIException as e:
-            logging.error(f"Binance API error: {e}")
-        except Exception as e:
-            logging.error(f"Unexpected error: {e}")
-        time.sleep(30)
-    logging.info("Trading loop stopped.")
-
-@app.route('/health', methods=['GET'])
-def health():
-    # Check Binance API connectivity
-    try:
-        server_time = client.get_server_time()
-        binance_status = 'ok'
-    except Exception as e:
-        binance_status = f'error: {str(e)}'
-
-    # Check API Key & Secret Key validity
-    try:
-        # This will fail if keys are invalid or have no permission
-        account_info = client.get_account()
-        key_status = 'ok'
-    except Exception as e:
-        key_status = f'error: {str(e)}'
+def trading_loop(active):
+    global scheduler
+    from trading.clock import ServerClock
+    from trading.simulator import ReplayClock
+    from trading.scheduler import TradingScheduler, parse_pair_specs
+    from trading.sharding import ShardCoordinator
+    from trading.stream import KlineStream, WebSocketTransport, STREAM_URLS
+
+    config = services.config
+    # 多幣種設定，例如 TRADING_PAIRS=BTCUSDT:1m:5:10,ETHUSDT:5m:20:50
+    # 同一幣種可跑多個策略並共用指標快取，例如 BTCUSDT:1m:5:10,BTCUSDT:1m:rsi:14:30:70,BTCUSDT:1m:macd
+    trading_pairs = parse_pair_specs(config.get('TRADING_PAIRS', SYMBOL), INTERVAL, SHORT_WINDOW, LONG_WINDOW)
+    # KLINE_STREAM=true 改用 websocket 收盤 K 線，取代每 30 秒 REST 輪詢
+    kline_stream = config.get('KLINE_STREAM', 'false').lower() == 'true' and services.mode != 'paper'
+    kline_stream_url = config.get('KLINE_STREAM_URL', STREAM_URLS['test' if services.mode == 'test' else 'live'])
+
+    # 下單與訊號判斷分離：訂單交給背景 worker 併發送出，成交後再回寫部位
+    # ORDER_MODE=live 才會送真實訂單，預設只送 test order；回放模式一律在模擬交易所成交（計手續費與滑價）
+    order_executor = services.order_executor
+    order_executor.start()
+    # 輪詢模式對齊 K 線收盤（以伺服器時間為準）；回放模式以回放時鐘對齊，等待時間依 PAPER_SPEED 縮放
+    paper = services.mode == 'paper'
+    clock = ReplayClock(services.gateway.client) if paper else ServerClock(services.client)
+    # 回放資料本來就在本機；KlineStore 以真實時間判斷收盤，會向回放要不存在的未來 K 線
+    store = None if paper else services.kline_store
+    # SHARD_SYMBOLS=true 多個程序（或節點）共用同一個資料庫時，以租約分配幣種，每個幣種只由一個程序交易
+    shard = None
+    if config.get('SHARD_SYMBOLS', 'false').lower() == 'true':
+        shard = ShardCoordinator(services.db, [symbol for symbol, _, _, _ in trading_pairs],
+                                 lease_seconds=float(config.get('SHARD_LEASE_SECONDS', 30)),
+                                 renew_seconds=float(config.get('SHARD_RENEW_SECONDS', 10)))
+    scheduler = TradingScheduler.from_specs(
+        services.client, trading_pairs, QUANTITY, db=services.db, store=store,
+        executor=order_executor, max_workers=int(config.get('SCHEDULER_WORKERS', 8)), clock=clock,
+        close_delay=float(config.get('CANDLE_CLOSE_DELAY', 0.25)),
+        # BATCH_SIGNALS=true 收盤後先同步所有幣種，再一次向量化判斷全部 SMA 交叉訊號
+        batch_signals=config.get('BATCH_SIGNALS', 'false').lower() == 'true',
+        shard=shard
+    )
+    if kline_stream:
+        stream = KlineStream(transport=WebSocketTransport(kline_stream_url),
+                             pairs=sorted({(symbol, interval) for symbol, interval, _, _ in trading_pairs}))
+        scheduler.run_stream(active, stream)
+    else:
+        scheduler.run(active)
 
+@bp.route('/health', methods=['GET'])
+def health():
+    # 背景執行緒定期檢查 Binance 連線與 API Key，這裡只回傳快取結果
+    health_prober = services.health_prober
+    health_prober.start()
+    probes = health_prober.snapshot()
     return jsonify({
         'status': 'OK',
-        'binance_api': binance_status,
-        'api_key_status': key_status
+        'binance_api': probes['binance_api']['status'],
+        'api_key_status': probes['api_key_status']['status'],
+        'probes': probes,
+        'startup': services.status()
     })
 
 
 
-from flask import request, abort, jsonify
+from flask import request, abort, jsonify, Response
 
 # HTML control page for /trade
-@app.route('/trade', methods=['GET'])
+@bp.route('/trade', methods=['GET'])
 def trade_page():
     return f"""
     <html>
@@ -291,6 +152,8 @@ def trade_page():
         <button onclick="getStatus()">Get Status</button>
         <button onclick="stopTrading()">Stop Trading</button>
         <div id="result"></div>
+        <h2>Live</h2>
+        <pre id="live"></pre>
         <script>
         function startTrading() {{
             fetch('/api/trade/start', {{method: 'POST'}})
@@ -308,6 +171,12 @@ def trade_page():
             let html = '<pre>' + JSON.stringify(d, null, 2) + '</pre>';
             document.getElementById('result').innerHTML = html;
         }}
+        // Pushed updates from /api/trade/stream, newest first
+        const live = document.getElementById('live');
+        const events = new EventSource('/api/trade/stream?types=trading,trade,status');
+        ['trading', 'trade', 'status', 'lagged'].forEach(kind => events.addEventListener(kind, e => {{
+            live.textContent = kind + ' ' + e.data + '\\n' + live.textContent.split('\\n').slice(0, 49).join('\\n');
+        }}));
         </script>
         <a href='/'>Back to Home</a>
     </body>
@@ -315,41 +184,74 @@ def trade_page():
     """
 
 # RESTful API endpoints for trading control
-@app.route('/api/trade/start', methods=['POST'])
+@bp.route('/api/trade/start', methods=['POST'])
 def api_trade_start():
-    global trading_thread, trading_active
-    if trading_active:
-        return jsonify({'status': 'error', 'message': 'Trading already running.'}), 400
-    trading_active = True
-    trading_thread = threading.Thread(target=trading_loop, daemon=True)
-    trading_thread.start()
-    return jsonify({'status': 'success', 'message': 'Trading started.'})
-
-@app.route('/api/trade/status', methods=['GET'])
+    # 任何 worker 都可以啟動，但只有拿到 lease 的那一個會真的跑交易迴圈
+    started, owner = services.engine.start(trading_loop, current_trade_status,
+                                           on_stop=lambda: scheduler and scheduler.stop())
+    if not started:
+        return jsonify({'status': 'error', 'message': 'Trading already running.', 'owner': owner}), 400
+    return jsonify({'status': 'success', 'message': 'Trading started.', 'owner': owner})
+
+def current_trade_status():
+    # 只在持有交易引擎的 worker 內呼叫；其他 worker 由 services.engine.status() 讀共享快照
+    symbols = scheduler.status() if scheduler else {}
+    order_executor = services.peek('order_executor')
+    # positions 維持單一幣種時的格式（例如 ['LONG']），各幣種的部位另外放在 positions_by_symbol
+    positions_by_symbol = {}
+    for st in symbols.values():
+        if st.get('positions'):
+            positions_by_symbol.setdefault(st['symbol'], []).extend(st['positions'])
+    return {
+        'positions': [p for st in symbols.values() for p in st.get('positions', [])],
+        'positions_by_symbol': positions_by_symbol,
+        'pnl': sum(st.get('pnl', 0.0) for st in symbols.values()),
+        'symbols': symbols,
+        'scheduler': scheduler.timing_status() if scheduler else None,
+        'gateway': services.gateway.stats(),
+        'pending_orders': order_executor.pending() if order_executor else {},
+        'shard': scheduler.shard.status() if scheduler and scheduler.shard else None
+    }
+
+@bp.route('/api/trade/status', methods=['GET'])
 def api_trade_status():
-    return jsonify({
-        'active': trading_active,
-        'positions': trading_status['positions'],
-        'pnl': trading_status['pnl']
-    })
-
-@app.route('/api/trade/stop', methods=['POST'])
+    return jsonify(services.engine.status(current_trade_status))
+
+@bp.route('/api/trade/stream', methods=['GET'])
+def api_trade_stream():
+    # Server-Sent Events：持倉、PnL、成交即時推送，取代 dashboard 每秒輪詢 /api/trade/status
+    # 先送一次 snapshot，之後只送變動；斷線重連時瀏覽器帶 Last-Event-ID，從緩衝區補送
+    # ?types=trade,status 只訂閱部分事件
+    from trading.events import BUS
+    # 交易迴圈在別的 worker 時，把它寫進共享狀態的事件轉發到本 worker 的 BUS
+    services.engine.follow_events()
+    types = request.args.get('types')
+    kinds = set(t.strip() for t in types.split(',')) if types else None
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # 先記下序號再建 snapshot，建 snapshot 期間發布的事件才會接著送出
+    since = BUS.last_seq
+    body = BUS.stream(last_event_id, kinds, snapshot=services.engine.status(current_trade_status), since=since)
+    return Response(body, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/trade/stop', methods=['POST'])
 def api_trade_stop():
-    global trading_active
-    if not trading_active:
+    # 交易迴圈在別的 worker 時，透過共享狀態送出停止請求，由持有者在一秒內停下
+    if not services.engine.stop():
         return jsonify({'status': 'error', 'message': 'Trading is not running.'}), 400
-    trading_active = False
     return jsonify({'status': 'success', 'message': 'Trading stopped.'})
 
 def test_connection():
+    client, kline_store = services.client, services.kline_store
     try:
         # 測試伺服器時間
         server_time = client.get_server_time()
         # logging.info(f"✅ Server time: {server_time}")
         logging.info(f"Server time: {server_time}")
         
-        # 測試獲取 K 線
-        klines = client.get_klines(symbol='BTCUSDT', interval='1m', limit=5)
+        # 測試獲取 K 線（經由本地快取，只補抓缺少的部分）
+        kline_store.sync(client, 'BTCUSDT', '1m', lookback=5)
+        klines = kline_store.get_klines('BTCUSDT', '1m', limit=5)
         # logging.info(f"✅ Got {len(klines)} klines")
         logging.info(f"Got {len(klines)} klines")
         
@@ -360,14 +262,76 @@ def test_connection():
         return False
     
 
-@app.route('/api/stats', methods=['GET'])
+@bp.route('/api/stats', methods=['GET'])
 def get_stats():
-    stats = db.get_statistics()
+    stats = services.db.get_statistics()
     return jsonify(stats)
 
 
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus 文字格式：API/DB/下單延遲直方圖、tick 漂移、weight 與各佇列深度
+    from trading.metrics import REGISTRY
+    return REGISTRY.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def _parse_time_ms(value):
+    """epoch 毫秒或 ISO 時間字串 → epoch 毫秒"""
+    if value is None or value == '':
+        return None
+    if value.lstrip('-').isdigit():
+        return int(value)
+    from datetime import datetime
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+@bp.route('/api/trades', methods=['GET'])
+def get_trades():
+    # 分頁查詢：?symbol=&action=&start=&end=&limit=&cursor=&order=asc|desc，下一頁帶入回傳的 next_cursor
+    args = request.args
+    try:
+        page = services.db.query_trades(
+            symbol=args.get('symbol'),
+            action=args.get('action'),
+            start_ms=_parse_time_ms(args.get('start')),
+            end_ms=_parse_time_ms(args.get('end')),
+            limit=int(args.get('limit', 100)),
+            cursor=args.get('cursor'),
+            ascending=args.get('order', 'desc').lower() == 'asc'
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid query parameter: {e}'}), 400
+    return jsonify(page)
+
+
+@bp.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    # 來回交易配對與績效（持倉時間、回撤、Sharpe、profit factor、各小時表現），可用 ?symbol= 篩選
+    from trading_data.analytics import analyze
+    return jsonify(analyze(services.db, request.args.get('symbol')))
+
+
+def create_app(warm=False):
+    """
+    App factory. Cheap: registers routes only. warm=True starts building the
+    database, kline cache and Binance client concurrently in the background.
+    """
+    setup_logging()
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.services = services
+    if warm:
+        services.warm()
+    return app
+
+
+# gunicorn 'app:app' 延遲初始化；gunicorn 'app:create_app(warm=True)' 啟動時就在背景預熱
+app = create_app()
+
+
 # 在啟動前測試
 if __name__ == '__main__':
+    services.warm()
     if not test_connection():
         # logging.error("無法連接幣安 API！")
         exit(1)
@@ -0,0 +1,52 @@
+# benchmarks/batch_signal_benchmark.py
+"""
+Decide N symbols at a candle close: a Python loop of per-symbol list
+signals (SMACrossoverStrategy.signal(closes)) vs one crossover_masks pass
+over a (symbols x window) close matrix, with a different window pair per symbol.
+
+Run from the repo root:
+    python -m benchmarks.batch_signal_benchmark
+"""
+import time
+
+import numpy as np
+
+from trading.strategy import SMACrossoverStrategy, crossover_masks
+
+SYMBOLS = (10, 100, 300, 1000)
+WIDTH = 60
+REPEATS = 50
+
+
+def best_of(func):
+    best = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'symbols':>8} {'loop (ms)':>10} {'batch (ms)':>11} {'speedup':>8}")
+    for n in SYMBOLS:
+        closes = 30000 + rng.standard_normal((n, WIDTH)).cumsum(axis=1) * 10
+        shorts = rng.integers(3, 15, n)
+        longs = rng.integers(20, WIDTH + 1, n)
+        strategies = [SMACrossoverStrategy(s, l) for s, l in zip(shorts.tolist(), longs.tolist())]
+        rows = closes.tolist()
+
+        def loop():
+            return [s.signal(row) for s, row in zip(strategies, rows)]
+
+        def batch():
+            return crossover_masks(closes, shorts, longs)
+
+        t_loop = best_of(loop)
+        t_batch = best_of(batch)
+        print(f"{n:>8} {t_loop * 1000:>10.3f} {t_batch * 1000:>11.3f} {t_loop / t_batch:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
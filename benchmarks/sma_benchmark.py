@@ -0,0 +1,59 @@
+# benchmarks/sma_benchmark.py
+"""
+Compare the list-based calculate_sma with the rolling SMA engine.
+
+Run from the repo root:
+    python -m benchmarks.sma_benchmark
+"""
+import random
+import time
+
+from trading.strategy import calculate_sma, SMACrossoverStrategy
+
+TICKS = 5000
+WINDOWS = (10, 200, 2000)
+
+
+def bench_list(closes, short_window, long_window):
+    # Old path: slice and re-sum both windows in should_buy and again in should_sell
+    start = time.perf_counter()
+    for i in range(long_window, len(closes)):
+        window = closes[i - long_window:i + 1]
+        sma_short = calculate_sma(window, short_window)
+        sma_long = calculate_sma(window, long_window)
+        sma_short > sma_long
+        sma_short = calculate_sma(window, short_window)
+        sma_long = calculate_sma(window, long_window)
+        sma_short < sma_long
+    return time.perf_counter() - start
+
+
+def bench_rolling(closes, short_window, long_window):
+    strategy = SMACrossoverStrategy(short_window, long_window)
+    for close in closes[:long_window]:
+        strategy.update(close)
+    start = time.perf_counter()
+    for close in closes[long_window:]:
+        strategy.update(close)
+        strategy.signal()
+    return time.perf_counter() - start
+
+
+def main():
+    random.seed(42)
+    print(f"{'long window':>12} {'list (us/tick)':>15} {'rolling (us/tick)':>18} {'speedup':>8}")
+    for long_window in WINDOWS:
+        short_window = max(2, long_window // 4)
+        price = 30000.0
+        closes = []
+        for _ in range(long_window + TICKS):
+            price += random.gauss(0, 10)
+            closes.append(price)
+        t_list = bench_list(closes, short_window, long_window)
+        t_rolling = bench_rolling(closes, short_window, long_window)
+        print(f"{long_window:>12} {t_list / TICKS * 1e6:>15.2f} {t_rolling / TICKS * 1e6:>18.2f} "
+              f"{t_list / t_rolling:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/startup_benchmark.py
+"""
+Measure cold application startup.
+
+Each run is a fresh interpreter, so module imports are not cached:
+  lazy        import app (routes only, what gunicorn 'app:app' pays)
+  serial      import app, then build config, client, database and kline cache one after another
+              (the work the old module-level startup did, minus the Binance ping)
+  concurrent  import app, then services.warm() and wait for it
+
+Dummy keys in test mode are used so no .env.encrypted is needed and nothing hits the network.
+With local SQLite both serial and concurrent are dominated by importing python-binance, which
+holds the GIL, so they come out close; warm() pays off when builders wait on I/O (a PostgreSQL
+pool connecting to DATABASE_URL), and lazy is what every plain import now costs.
+
+Run from the repo root:
+    python -m benchmarks.startup_benchmark [--runs 5]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+SNIPPET = '''
+import time
+started = time.perf_counter()
+import app
+from trading.runtime import Services
+app.services = Services(config_loader=lambda: {
+    'BINANCE_API_KEY': 'x', 'BINANCE_SECRET_KEY': 'y', 'BINANCE_MODE': 'test'})
+mode = %r
+if mode == 'serial':
+    for name in ('config', 'client', 'db', 'kline_store'):
+        getattr(app.services, name)
+elif mode == 'concurrent':
+    for t in app.services.warm():
+        t.join()
+print(time.perf_counter() - started)
+'''
+
+MODES = ('lazy', 'serial', 'concurrent')
+
+
+def run_once(mode):
+    out = subprocess.run([sys.executable, '-c', SNIPPET % mode], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold startup benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'median (ms)':>12} {'min (ms)':>10} {'max (ms)':>10}")
+    for mode in MODES:
+        times = [run_once(mode) for _ in range(args.runs)]
+        print(f"{mode:>12} {statistics.median(times) * 1000:>12.1f} {min(times) * 1000:>10.1f} "
+              f"{max(times) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
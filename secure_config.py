@@ -68,6 +68,23 @@ class SecureConfig:
             print(f"⚠️  Original .env moved to {backup}")
             print("   You should DELETE this file after verification")
     
+    def rotate_key(self):
+        """產生新金鑰並以新金鑰重新加密 .env.encrypted"""
+        config = self.load_decrypted_env() if os.path.exists('.env.encrypted') else None
+
+        key = Fernet.generate_key()
+        tmp = f"{self.key_file}.new"
+        with open(tmp, 'wb') as f:
+            f.write(key)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, self.key_file)
+        self.cipher = Fernet(key)
+        print(f"✓ New encryption key saved to: {self.key_file}")
+
+        if config:
+            self.save_encrypted_env(config['BINANCE_API_KEY'], config['BINANCE_SECRET_KEY'],
+                                    config.get('BINANCE_MODE', 'test'))
+
     def load_decrypted_env(self):
         """從加密檔案載入並解密 API Key"""
         if not os.path.exists('.env.encrypted'):
@@ -98,6 +115,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Secure API Key Manager')
     parser.add_argument('--setup', action='store_true', help='Setup encrypted API keys')
     parser.add_argument('--verify', action='store_true', help='Verify decryption')
+    parser.add_argument('--rotate', action='store_true', help='Rotate encryption key and re-encrypt API keys')
     args = parser.parse_args()
     
     sc = SecureConfig()
@@ -134,5 +152,11 @@ if __name__ == '__main__':
         print(f"  Mode:    {config['BINANCE_MODE']}")
         print("\n✅ Decryption successful")
     
+    elif args.rotate:
+        print("\n🔄 Rotating encryption key...")
+        sc.rotate_key()
+        print("\n✅ Key rotated")
+        print("   Backup the new .encryption_key and discard the old one")
+    
     else:
         parser.print_help()
\ No newline at end of file
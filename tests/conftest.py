@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Import `trading` and `trading_data` from the checkout when pytest is run as plain `pytest`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,138 @@
+# tests/test_gateway.py
+import json
+import threading
+import time
+
+import pytest
+from binance.exceptions import BinanceAPIException
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+from trading.gateway import GatewayClient, RequestGateway
+
+
+class Response:
+    def __init__(self, status_code, headers=None, code=0, msg=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = json.dumps({'code': code, 'msg': msg})
+
+
+def api_error(status_code, headers=None, code=0, msg=''):
+    response = Response(status_code, headers, code, msg)
+    return BinanceAPIException(response, status_code, response.text)
+
+
+class FakeClient:
+    """Each method pops its next outcome from `script[name]`: an exception is raised, anything else returned."""
+    def __init__(self, **script):
+        self.script = {name: list(outcomes) for name, outcomes in script.items()}
+        self.calls = []
+        self.response = None
+
+    def __getattr__(self, name):
+        if name not in self.script:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            outcome = self.script[name].pop(0) if len(self.script[name]) > 1 else self.script[name][0]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return call
+
+
+class FakeTime:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def gateway(client, **kwargs):
+    kwargs.setdefault('base_delay', 0.001)
+    kwargs.setdefault('max_delay', 0.001)
+    return RequestGateway(client, **kwargs)
+
+
+def test_weight_budget_blocks_until_the_next_window():
+    clock = FakeTime(59.9)
+    gw = gateway(FakeClient(get_klines=[[]]), weight_per_minute=10, time_fn=clock)
+    for _ in range(5):
+        gw.call('get_klines')
+    assert gw.stats()['weight_used'] == 10
+
+    done = threading.Event()
+    threading.Thread(target=lambda: (gw.call('get_klines'), done.set()), daemon=True).start()
+    assert not done.wait(0.3)
+    assert gw.stats()['queued'] == 1
+    clock.now = 60.0
+    assert done.wait(2)
+    assert gw.stats()['weight_used'] == 2
+
+
+def test_used_weight_header_raises_the_local_count():
+    client = FakeClient(get_klines=[[]])
+    client.response = Response(200, {'x-mbx-used-weight-1m': '700'})
+    gw = gateway(client, weight_per_minute=1000)
+    gw.call('get_klines')
+    assert gw.stats()['weight_used'] == 700
+
+
+def test_request_heavier_than_the_budget_is_refused():
+    gw = gateway(FakeClient(get_account=[{}]), weight_per_minute=10)
+    with pytest.raises(ValueError):
+        gw.call('get_account')
+    assert gw.stats()['total_requests'] == 0
+
+
+@pytest.mark.parametrize('status', [429, 418])
+def test_rate_limit_pauses_every_call_then_retries(status):
+    client = FakeClient(get_klines=[api_error(status, {'Retry-After': '0.2'}), ['ok']])
+    gw = gateway(client)
+    started = time.monotonic()
+    assert gw.call('get_klines') == ['ok']
+    assert time.monotonic() - started >= 0.2
+    assert client.calls == ['get_klines', 'get_klines']
+    assert gw.total_retries == 1
+
+
+def test_data_calls_retry_transport_errors_and_5xx():
+    client = FakeClient(get_klines=[Timeout('slow'), api_error(502), ['ok']])
+    gw = gateway(client)
+    assert gw.call('get_klines') == ['ok']
+    assert len(client.calls) == 3
+
+
+def test_data_call_gives_up_after_max_retries():
+    client = FakeClient(get_klines=[Timeout('down')])
+    gw = gateway(client, max_retries=2)
+    with pytest.raises(Timeout):
+        gw.call('get_klines')
+    assert len(client.calls) == 3
+
+
+@pytest.mark.parametrize('error', [Timeout('slow'), RequestsConnectionError('reset'), api_error(503)])
+def test_order_calls_are_never_retried(error):
+    # The order may have executed; OrderExecutor reconciles instead
+    client = FakeClient(create_order=[error, {'status': 'FILLED'}])
+    gw = gateway(client)
+    with pytest.raises(type(error)):
+        gw.call('create_order', symbol='BTCUSDT')
+    assert client.calls == ['create_order']
+    assert gw.total_retries == 0
+
+
+def test_client_errors_are_not_retried():
+    client = FakeClient(get_klines=[api_error(400, code=-1121, msg='Invalid symbol.'), ['ok']])
+    with pytest.raises(BinanceAPIException):
+        gateway(client).call('get_klines')
+    assert len(client.calls) == 1
+
+
+def test_gateway_client_routes_method_calls():
+    client = FakeClient(get_server_time=[{'serverTime': 1}])
+    gw = gateway(client)
+    assert GatewayClient(client, gw).get_server_time() == {'serverTime': 1}
+    assert gw.stats()['total_requests'] == 1
@@ -0,0 +1,142 @@
+# tests/test_orders.py
+import json
+import queue
+
+import pytest
+from binance.exceptions import BinanceAPIException
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+from trading.orders import NEW_ORDER_REJECTED, UNKNOWN_ORDER, OrderExecutor, OrderRequest, make_client_order_id
+
+
+class Response:
+    def __init__(self, status_code, code, msg):
+        self.status_code = status_code
+        self.headers = {}
+        self.text = json.dumps({'code': code, 'msg': msg})
+
+
+def api_error(status_code, code, msg=''):
+    response = Response(status_code, code, msg)
+    return BinanceAPIException(response, status_code, response.text)
+
+
+class MockExchange:
+    """
+    Market orders fill at `price`. `send_errors` are raised by create_order in turn,
+    after (`executed_before_error`) or before the order is booked; `lookup_errors`
+    likewise by get_order.
+    """
+    def __init__(self, price=100.0, send_errors=(), lookup_errors=(), executed_before_error=True):
+        self.price = price
+        self.send_errors = list(send_errors)
+        self.lookup_errors = list(lookup_errors)
+        self.executed_before_error = executed_before_error
+        self.orders = {}
+        self.sent = []
+        self.lookups = 0
+
+    def _book(self, symbol, quantity, client_order_id):
+        order = {'symbol': symbol, 'clientOrderId': client_order_id, 'orderId': len(self.orders) + 1,
+                 'status': 'FILLED', 'executedQty': str(quantity),
+                 'cummulativeQuoteQty': str(quantity * self.price)}
+        self.orders[client_order_id] = order
+        return order
+
+    def create_order(self, symbol, side, type, quantity, newClientOrderId, **kwargs):
+        self.sent.append(newClientOrderId)
+        if newClientOrderId in self.orders:
+            raise api_error(400, NEW_ORDER_REJECTED, 'Duplicate order sent.')
+        if self.send_errors:
+            error = self.send_errors.pop(0)
+            if self.executed_before_error:
+                self._book(symbol, quantity, newClientOrderId)
+            raise error
+        return dict(self._book(symbol, quantity, newClientOrderId))
+
+    def get_order(self, symbol, origClientOrderId, **kwargs):
+        self.lookups += 1
+        if self.lookup_errors:
+            raise self.lookup_errors.pop(0)
+        if origClientOrderId not in self.orders:
+            raise api_error(400, UNKNOWN_ORDER, 'Order does not exist.')
+        return dict(self.orders[origClientOrderId])
+
+
+def run_order(exchange, client_order_id='bot-BTCUSDT-B-1', **kwargs):
+    kwargs.setdefault('poll_interval', 0.001)
+    kwargs.setdefault('max_lookup_delay', 0.005)
+    executor = OrderExecutor(exchange, max_workers=1, test_orders=False, **kwargs)
+    results = queue.Queue()
+    request = OrderRequest('BTCUSDT', 'BUY', 0.5, client_order_id, price_hint=99.0)
+    assert executor.submit(request, lambda fill: results.put(('fill', fill)),
+                           lambda req, error: results.put(('error', error)))
+    executor.start()
+    try:
+        return results.get(timeout=5), executor
+    finally:
+        executor.stop()
+
+
+def test_fill_is_reported_with_the_executed_price():
+    (kind, fill), executor = run_order(MockExchange(price=101.0))
+    assert kind == 'fill'
+    assert (fill.price, fill.quantity, fill.status) == (101.0, 0.5, 'FILLED')
+    assert executor.pending() == {}
+
+
+@pytest.mark.parametrize('error', [Timeout('read timed out'), RequestsConnectionError('reset'), api_error(502, -1000)])
+def test_unknown_outcome_is_reconciled_instead_of_resent(error):
+    exchange = MockExchange(send_errors=[error])
+    (kind, fill), _ = run_order(exchange)
+    assert kind == 'fill' and fill.price == 100.0
+    assert exchange.sent == ['bot-BTCUSDT-B-1']
+
+
+def test_order_that_never_arrived_is_resent_under_the_same_id():
+    exchange = MockExchange(send_errors=[Timeout('connect timed out')], executed_before_error=False)
+    (kind, _), _ = run_order(exchange)
+    assert kind == 'fill'
+    assert exchange.sent == ['bot-BTCUSDT-B-1', 'bot-BTCUSDT-B-1']
+    assert list(exchange.orders) == ['bot-BTCUSDT-B-1']
+
+
+def test_failing_lookups_keep_the_order_pending_until_one_succeeds():
+    lookup_errors = [Timeout('lookup timed out'), RequestsConnectionError('reset'), api_error(503, -1001)]
+    exchange = MockExchange(send_errors=[Timeout('read timed out')], lookup_errors=lookup_errors)
+    (kind, fill), _ = run_order(exchange)
+    assert kind == 'fill' and fill.status == 'FILLED'
+    assert exchange.lookups == 4
+    assert exchange.sent == ['bot-BTCUSDT-B-1']
+
+
+def test_duplicate_id_rejected_by_binance_is_treated_as_accepted():
+    exchange = MockExchange()
+    exchange._book('BTCUSDT', 0.5, 'bot-BTCUSDT-B-1')
+    (kind, fill), _ = run_order(exchange)
+    assert kind == 'fill' and fill.exchange_order_id == 1
+    assert len(exchange.orders) == 1
+
+
+def test_definite_rejection_is_reported_once():
+    exchange = MockExchange(send_errors=[api_error(400, NEW_ORDER_REJECTED, 'Account has insufficient balance.')],
+                            executed_before_error=False)
+    (kind, error), executor = run_order(exchange)
+    assert kind == 'error' and 'insufficient balance' in str(error)
+    assert exchange.sent == ['bot-BTCUSDT-B-1'] and exchange.lookups == 0
+    assert executor.finished['bot-BTCUSDT-B-1'] == 'REJECTED'
+
+
+def test_submit_refuses_a_known_client_order_id():
+    executor = OrderExecutor(MockExchange(), test_orders=False)
+    request = OrderRequest('BTCUSDT', 'BUY', 0.5, 'bot-BTCUSDT-B-1')
+    assert executor.submit(request, lambda fill: None)
+    assert not executor.submit(OrderRequest('BTCUSDT', 'BUY', 0.5, 'bot-BTCUSDT-B-1'), lambda fill: None)
+    assert executor.queue.qsize() == 1
+
+
+def test_client_order_id_is_deterministic_per_decision_candle():
+    a = make_client_order_id('BTCUSDT', 'BUY', 1700000000000)
+    assert a == make_client_order_id('BTCUSDT', 'BUY', 1700000000000) == 'bot-BTCUSDT-B-1700000000000'
+    assert a != make_client_order_id('BTCUSDT', 'SELL', 1700000000000)
+    assert len(make_client_order_id('VERYLONGSYMBOLNAMEUSDT', 'BUY', 1700000000000, prefix='bot12')) <= 36
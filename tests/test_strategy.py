@@ -0,0 +1,47 @@
+# tests/test_strategy.py
+import numpy as np
+import pytest
+
+from trading.indicators import IndicatorCache
+from trading.strategy import SMACrossoverStrategy, batch_crossover_signals, crossover_masks
+
+
+def random_walk(rng, n, start=30000.0):
+    return start + np.cumsum(rng.normal(0, 25, n))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_crossover_masks_match_per_symbol_signal(seed):
+    rng = np.random.default_rng(seed)
+    windows = [(2, 5), (5, 10), (7, 30), (20, 50), (10, 10), (12, 6)]
+    width = 60
+    closes = np.full((len(windows), width), np.nan)
+    expected = []
+    for row, (short, long) in enumerate(windows):
+        # Some rows are shorter than their long window and must come out False/None
+        series = random_walk(rng, int(rng.integers(3, width + 1)))
+        closes[row, width - len(series):] = series
+        strategy = SMACrossoverStrategy(short, long)
+        for close in series:
+            strategy.update(close)
+        expected.append(strategy.signal())
+    buy, sell = crossover_masks(closes, [s for s, _ in windows], [l for _, l in windows])
+    got = ['BUY' if b else 'SELL' if s else None for b, s in zip(buy.tolist(), sell.tolist())]
+    assert got == expected
+
+
+def test_crossover_masks_rejects_windows_wider_than_matrix():
+    with pytest.raises(ValueError):
+        crossover_masks(np.ones((1, 5)), 2, 6)
+
+
+def test_batch_signals_match_signal_for_windows_over_history():
+    rng = np.random.default_rng(7)
+    strategies = []
+    for short, long in ((5, 10), (50, 1000)):
+        strategy = SMACrossoverStrategy(short, long, IndicatorCache(history=500))
+        for i, close in enumerate(random_walk(rng, 1200)):
+            strategy.cache.update(close, close, close, open_time=i)
+        strategies.append(strategy)
+    assert batch_crossover_signals(strategies) == [s.signal() for s in strategies]
+    assert strategies[1].signal() is not None
@@ -0,0 +1,66 @@
+# tests/test_stream.py
+import json
+
+from trading.stream import KlineStream, kline_stream_name, parse_kline_event
+
+
+def kline_event(open_time, close, closed=True, symbol='BTCUSDT', interval='1m'):
+    return json.dumps({'e': 'kline', 's': symbol, 'k': {
+        't': open_time, 'T': open_time + 59999, 'i': interval, 'o': '1', 'h': '2', 'l': '0.5', 'c': str(close),
+        'v': '10', 'q': '20', 'n': 5, 'V': '4', 'Q': '8', 'x': closed}})
+
+
+class FakeTransport:
+    """Plays `sessions` (one message list per connection); an Exception item drops the connection."""
+    timeout = 0.1
+
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        self.messages = []
+        self.connects = []
+
+    def connect(self, streams):
+        self.connects.append(list(streams))
+        self.messages = list(self.sessions.pop(0)) if self.sessions else []
+
+    def recv(self):
+        if not self.messages:
+            return None
+        message = self.messages.pop(0)
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    def close(self):
+        pass
+
+
+def test_parse_kline_event_matches_rest_layout():
+    name, row, closed = parse_kline_event(kline_event(60000, 101.5))
+    assert name == kline_stream_name('BTCUSDT', '1m') == 'btcusdt@kline_1m'
+    assert row[0] == 60000 and row[4] == '101.5' and row[6] == 119999
+    assert closed
+
+
+def test_parse_combined_payload_and_other_events():
+    combined = json.dumps({'stream': 'btcusdt@kline_1m', 'data': json.loads(kline_event(0, 1))})
+    assert parse_kline_event(combined)[1] is not None
+    assert parse_kline_event(json.dumps({'e': 'trade'})) == (None, None, False)
+
+
+def test_stream_queues_only_closed_klines_and_reconnects():
+    transport = FakeTransport([
+        [kline_event(0, 1, closed=False), kline_event(0, 2), ConnectionError('dropped')],
+        [json.dumps({'result': None, 'id': 1}), kline_event(60000, 3)],
+    ])
+    stream = KlineStream('BTCUSDT', '1m', transport=transport)
+    stream._stop.wait = lambda timeout: False  # reconnect without the backoff sleep
+    stream.start()
+    try:
+        first = stream.get(timeout=2)
+        second = stream.get(timeout=2)
+    finally:
+        stream.stop()
+    assert [first[0], first[4]] == [0, '2']
+    assert [second[0], second[4]] == [60000, '3']
+    assert transport.connects[:2] == [['btcusdt@kline_1m'], ['btcusdt@kline_1m']]
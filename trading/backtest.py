@@ -0,0 +1,174 @@
+# trading/backtest.py
+"""
+Vectorized backtesting of the SMA crossover strategy over historical candles.
+
+Decisions follow Trader.evaluate: on every closed candle, go LONG when
+SMA(short) > SMA(long) and we are flat, close the position when
+SMA(short) < SMA(long). Trades fill at that candle's close, and each SELL
+adds its PnL to the balance.
+
+Usage:
+    python -m trading.backtest data/BTCUSDT-1m.npy --short 5 --long 10
+    python -m trading.backtest --symbol BTCUSDT --interval 1m   # from the local KlineStore
+"""
+import os
+import numpy as np
+
+# Column of the close price in the Binance kline row layout
+CLOSE_COL = 4
+
+
+def load_candles(path, mmap=True):
+    """
+    Load a 2D float array of klines (Binance row layout) from .npy, .csv or .parquet.
+    .npy files are memory-mapped read-only unless mmap=False.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        return np.load(path, mmap_mode='r' if mmap else None)
+    if ext == '.csv':
+        with open(path) as f:
+            first = f.readline().split(',')[0]
+        try:
+            float(first)
+            skip = 0
+        except ValueError:
+            skip = 1  # header row
+        return np.loadtxt(path, delimiter=',', skiprows=skip, dtype=np.float64, ndmin=2)
+    if ext == '.parquet':
+        import pandas as pd
+        return pd.read_parquet(path).to_numpy(dtype=np.float64)
+    raise ValueError(f"Unsupported candle file: {path}")
+
+
+def closes_of(candles):
+    candles = np.asarray(candles)
+    if candles.ndim == 1:
+        return candles.astype(np.float64, copy=False)
+    return candles[:, CLOSE_COL].astype(np.float64, copy=False)
+
+
+def rolling_sma(closes, window):
+    """
+    SMA for every bar via a cumulative sum; NaN until `window` bars are available.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(closes.shape[0], np.nan)
+    if window > closes.shape[0]:
+        return out
+    csum = np.cumsum(closes)
+    out[window - 1] = csum[window - 1]
+    out[window:] = csum[window:] - csum[:-window]
+    out[window - 1:] /= window
+    return out
+
+
+def crossover_positions(sma_short, sma_long):
+    """
+    Position (1 = LONG, 0 = flat) after each bar: the last non-neutral
+    crossover regime, carried forward until the opposite one appears.
+    """
+    diff = sma_short - sma_long
+    regime = np.sign(np.nan_to_num(diff, nan=0.0))
+    idx = np.where(regime != 0, np.arange(regime.shape[0]), 0)
+    np.maximum.accumulate(idx, out=idx)
+    return (regime[idx] > 0).astype(np.int8)
+
+
+class BacktestResult:
+    def __init__(self, closes, sma_short, sma_long, position, signals, entries, exits,
+                 trade_pnl, balance, equity, start_balance):
+        self.closes = closes
+        self.sma_short = sma_short
+        self.sma_long = sma_long
+        self.position = position
+        self.signals = signals        # +1 BUY, -1 SELL, 0 no action, per bar
+        self.entries = entries        # bar index of each BUY
+        self.exits = exits            # bar index of each SELL
+        self.trade_pnl = trade_pnl    # PnL of each closed round trip
+        self.balance = balance        # realized balance after each bar
+        self.equity = equity          # balance plus open-position mark-to-market
+        self.start_balance = start_balance
+
+    def summary(self):
+        trades = len(self.trade_pnl)
+        wins = int((self.trade_pnl > 0).sum())
+        peak = np.maximum.accumulate(self.equity) if len(self.equity) else self.equity
+        drawdown = float((peak - self.equity).max()) if len(self.equity) else 0.0
+        return {
+            'total_trades': trades,
+            'winning_trades': wins,
+            'win_rate': round((wins / trades * 100) if trades > 0 else 0, 2),
+            'total_pnl': round(float(self.trade_pnl.sum()), 8),
+            'final_balance': round(float(self.balance[-1]) if len(self.balance) else self.start_balance, 8),
+            'max_drawdown': round(drawdown, 8),
+            'open_position': bool(len(self.position) and self.position[-1])
+        }
+
+
+def run_backtest(candles, short_window=5, long_window=10, quantity=0.001, balance=1000.0, fee_rate=0.0,
+                 sma_short=None, sma_long=None):
+    """
+    Replay candles (2D kline array or 1D closes) through the SMA crossover rules.
+    fee_rate is charged on the notional of every fill and deducted from trade PnL.
+    Precomputed SMA arrays can be passed in to skip recomputing them.
+    """
+    closes = closes_of(candles)
+    n = closes.shape[0]
+    if sma_short is None:
+        sma_short = rolling_sma(closes, short_window)
+    if sma_long is None:
+        sma_long = rolling_sma(closes, long_window)
+    position = crossover_positions(sma_short, sma_long)
+
+    change = np.diff(position, prepend=np.int8(0))
+    signals = change.astype(np.int8)
+    entries = np.flatnonzero(change > 0)
+    exits = np.flatnonzero(change < 0)
+
+    entry_px = closes[entries[:len(exits)]]
+    exit_px = closes[exits]
+    trade_pnl = (exit_px - entry_px) * quantity - (entry_px + exit_px) * quantity * fee_rate
+
+    realized = np.zeros(n)
+    realized[exits] = trade_pnl
+    balance_curve = balance + np.cumsum(realized)
+
+    # Entry price carried forward while LONG, for mark-to-market equity
+    entry_marker = np.zeros(n, dtype=np.int64)
+    entry_marker[entries] = entries
+    np.maximum.accumulate(entry_marker, out=entry_marker)
+    open_pnl = np.where(position == 1, (closes - closes[entry_marker]) * quantity, 0.0)
+    equity = balance_curve + open_pnl
+
+    return BacktestResult(closes, sma_short, sma_long, position, signals, entries, exits,
+                          trade_pnl, balance_curve, equity, balance)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='SMA crossover backtest')
+    parser.add_argument('path', nargs='?', help='Candle file (.npy, .csv or .parquet)')
+    parser.add_argument('--store', default='data/klines.db', help='KlineStore database used when no path is given')
+    parser.add_argument('--symbol', default='BTCUSDT')
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--short', type=int, default=5)
+    parser.add_argument('--long', type=int, default=10)
+    parser.add_argument('--quantity', type=float, default=0.001)
+    parser.add_argument('--balance', type=float, default=1000.0)
+    parser.add_argument('--fee', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.path:
+        candles = load_candles(args.path)
+    else:
+        from trading_data.kline_store import KlineStore
+        candles = KlineStore(args.store).to_array(args.symbol, args.interval)
+    started = time.perf_counter()
+    result = run_backtest(candles, args.short, args.long, args.quantity, args.balance, args.fee)
+    elapsed = time.perf_counter() - started
+    for key, value in result.summary().items():
+        print(f"{key}: {value}")
+    print(f"\n{len(result.closes)} candles in {elapsed * 1000:.1f} ms")
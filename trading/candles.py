@@ -0,0 +1,151 @@
+# trading/candles.py
+"""
+Fixed-capacity OHLCV candle buffer backed by NumPy arrays.
+
+Every candle is stored twice, at slot i and at slot i + capacity, so the
+last n candles always sit contiguously in memory. Readers get read-only
+views of the arrays (no copy, no per-row Python objects). The price for
+that is twice the memory of a plain ring: 96 bytes per candle, about
+94 KiB per symbol at the default capacity of 500.
+
+append() only queues the candle on a flat Python list, since a NumPy row store
+costs more than the rolling indicators it feeds. Queued candles are
+written to the arrays in one vectorized store by the next read (or once
+the queue holds `capacity` candles), so a feed that is never read, such
+as a backtest, pays for one store per `capacity` candles.
+
+Views alias the buffer: they are only valid until the next append, so
+copy them if they have to outlive the current candle.
+"""
+import numpy as np
+
+# Column order of the float block, matching Binance kline fields 1..5
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+
+class CandleBuffer:
+    def __init__(self, capacity=500):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = int(capacity)
+        self._times = np.zeros(2 * self.capacity, dtype=np.int64)
+        self._ohlcv = np.zeros((2 * self.capacity, 5), dtype=np.float64)
+        self._pos = 0
+        self._count = 0
+        self._pending = []
+        self._flush_at = 6 * self.capacity
+        self.last_open_time = None
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def reset(self):
+        self._pos = 0
+        self._count = 0
+        self._pending = []
+        self.last_open_time = None
+
+    def resize(self, capacity):
+        """Change the capacity, keeping the newest candles that still fit."""
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self._flush()
+        n = min(len(self), int(capacity))
+        times, ohlcv = self.open_times(n).copy(), self.ohlcv(n).copy()
+        self.capacity = int(capacity)
+        self._flush_at = 6 * self.capacity
+        self._times = np.zeros(2 * self.capacity, dtype=np.int64)
+        self._ohlcv = np.zeros((2 * self.capacity, 5), dtype=np.float64)
+        self._times[:n] = self._times[self.capacity:self.capacity + n] = times
+        self._ohlcv[:n] = self._ohlcv[self.capacity:self.capacity + n] = ohlcv
+        self._pos = n % self.capacity
+        self._count = n
+
+    def append(self, open_time, open, high, low, close, volume=0.0):
+        """
+        Append one closed candle. A candle with an open time not after the last
+        one is ignored (returns False); open_time=None skips that check.
+        """
+        if open_time is not None:
+            if self.last_open_time is not None and open_time <= self.last_open_time:
+                return False
+            self.last_open_time = open_time
+        pending = self._pending
+        pending += (open_time if open_time is not None else self._count, open, high, low, close, volume)
+        self._count += 1
+        if len(pending) >= self._flush_at:
+            self._flush()
+        return True
+
+    def _flush(self):
+        """Write the queued candles to both halves of the arrays."""
+        pending = self._pending
+        if not pending:
+            return
+        capacity = self.capacity
+        # Six fields per candle; open times are exact in float64 (below 2**53 ms)
+        rows = np.array(pending[-6 * capacity:], dtype=np.float64).reshape(-1, 6)
+        start = (self._pos + len(pending) // 6 - len(rows)) % capacity
+        index = (start + np.arange(len(rows))) % capacity
+        times = rows[:, 0].astype(np.int64)
+        self._times[index] = self._times[index + capacity] = times
+        self._ohlcv[index] = self._ohlcv[index + capacity] = rows[:, 1:]
+        self._pos = (start + len(rows)) % capacity
+        self._pending = []
+
+    def append_kline(self, kline):
+        """Append a Binance kline ([open_time, open, high, low, close, volume, ...]), parsing it once."""
+        return self.append(int(kline[0]), float(kline[1]), float(kline[2]), float(kline[3]),
+                           float(kline[4]), float(kline[5]))
+
+    def extend(self, klines):
+        """Append Binance klines; returns how many were new."""
+        return sum(1 for k in klines if self.append_kline(k))
+
+    def _span(self, n):
+        self._flush()
+        size = len(self)
+        n = size if n is None else min(int(n), size)
+        end = self._pos + self.capacity
+        return end - n, end
+
+    @staticmethod
+    def _readonly(view):
+        view.flags.writeable = False
+        return view
+
+    def ohlcv(self, n=None):
+        """View of the last n candles as an (n, 5) array, oldest first."""
+        start, end = self._span(n)
+        return self._readonly(self._ohlcv[start:end])
+
+    def column(self, index, n=None):
+        start, end = self._span(n)
+        return self._readonly(self._ohlcv[start:end, index])
+
+    def open_times(self, n=None):
+        start, end = self._span(n)
+        return self._readonly(self._times[start:end])
+
+    def opens(self, n=None):
+        return self.column(OPEN, n)
+
+    def highs(self, n=None):
+        return self.column(HIGH, n)
+
+    def lows(self, n=None):
+        return self.column(LOW, n)
+
+    def closes(self, n=None):
+        return self.column(CLOSE, n)
+
+    def volumes(self, n=None):
+        return self.column(VOLUME, n)
+
+    def last(self):
+        """The newest candle as (open_time, open, high, low, close, volume) Python values, or None."""
+        if not self._count:
+            return None
+        self._flush()
+        i = self._pos - 1 + self.capacity
+        return (int(self._times[i]),) + tuple(self._ohlcv[i].tolist())
@@ -0,0 +1,117 @@
+# trading/clock.py
+"""
+Exchange clock and candle-boundary arithmetic.
+
+ServerClock estimates the offset between the local clock and Binance
+from get_server_time. Each sync takes a few samples and keeps the one
+with the shortest round trip, taking the midpoint of the request as the
+moment the server read its clock. Candle boundaries are computed in
+server time, so a loop can wake just after a candle closes instead of
+on a fixed period.
+
+Candles are aligned the way Binance aligns them: fixed steps from the
+epoch, except weeks, which open on Monday 00:00 UTC (the epoch was a
+Thursday), and months, which open on the first of the month.
+"""
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+from trading.utils import interval_to_ms
+
+# 1970-01-05, the first Monday after the epoch
+WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000
+
+
+def _month_index_ms(index):
+    return int(datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def candle_open_ms(ts_ms, interval):
+    """Open time of the `interval` candle containing ts_ms."""
+    if interval.endswith('M'):
+        months = int(interval[:-1])
+        day = datetime.fromtimestamp(int(ts_ms) // 1000, tz=timezone.utc)
+        index = day.year * 12 + day.month - 1
+        return _month_index_ms(index - (index - 1970 * 12) % months)
+    step = interval_to_ms(interval)
+    offset = WEEK_OFFSET_MS if interval.endswith('w') else 0
+    return (int(ts_ms) - offset) // step * step + offset
+
+
+def next_open_ms(open_ms, interval):
+    """Open time of the candle after the one opened at open_ms."""
+    if interval.endswith('M'):
+        day = datetime.fromtimestamp(int(open_ms) // 1000, tz=timezone.utc)
+        return _month_index_ms(day.year * 12 + day.month - 1 + int(interval[:-1]))
+    return int(open_ms) + interval_to_ms(interval)
+
+
+def next_boundary_ms(now_ms, interval):
+    """First candle boundary of `interval` strictly after now_ms."""
+    return next_open_ms(candle_open_ms(now_ms, interval), interval)
+
+
+def is_boundary(ts_ms, interval):
+    return candle_open_ms(ts_ms, interval) == int(ts_ms)
+
+
+def seconds_until_close(interval, now_ms=None, delay=0.25):
+    """
+    Seconds from now until `delay` seconds after the current candle closes (local clock by default).
+    """
+    now_ms = time.time() * 1000 if now_ms is None else now_ms
+    return max(0.0, (next_boundary_ms(now_ms, interval) - now_ms) / 1000 + delay)
+
+
+class ServerClock:
+    def __init__(self, client, resync_interval=300, samples=3):
+        self.client = client
+        self.resync_interval = resync_interval
+        self.samples = samples
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.synced_at = None
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """
+        Measure the server offset; on failure the previous offset is kept.
+        """
+        best = None
+        for _ in range(self.samples):
+            try:
+                sent = time.time() * 1000
+                server = self.client.get_server_time()['serverTime']
+                received = time.time() * 1000
+            except Exception as e:
+                logging.warning(f"Server time sync failed: {e}")
+                continue
+            rtt = received - sent
+            if best is None or rtt < best[0]:
+                best = (rtt, server - (sent + received) / 2)
+        with self._lock:
+            self.synced_at = time.monotonic()
+            if best is not None:
+                self.rtt_ms, self.offset_ms = best
+        return best is not None
+
+    def maybe_resync(self):
+        if self.synced_at is None or time.monotonic() - self.synced_at >= self.resync_interval:
+            self.sync()
+
+    def now_ms(self):
+        return time.time() * 1000 + self.offset_ms
+
+    def wall_seconds(self, ms):
+        """Local seconds to wait for `ms` of server time to pass."""
+        return ms / 1000
+
+    def stats(self):
+        with self._lock:
+            return {
+                'offset_ms': round(self.offset_ms, 1),
+                'rtt_ms': round(self.rtt_ms, 1) if self.rtt_ms is not None else None,
+                'synced_seconds_ago': round(time.monotonic() - self.synced_at, 1) if self.synced_at else None,
+            }
@@ -0,0 +1,187 @@
+# trading/engine.py
+"""
+Run the trading loop in at most one worker process, while every worker
+can serve its status and live events.
+
+TradingEngine.start() takes the EngineLease before starting the loop
+thread, so a second /api/trade/start, in this worker or any other, is
+refused while the loop runs. While running, the owner publishes a
+snapshot into SharedState every publish_interval seconds and right after
+each event on the local EventBus. The snapshot has the trade status, the
+owner's identity and heartbeat, and the recent event tail. Other workers
+answer /api/trade/status from that snapshot without locking. They
+re-publish the event tail on their own EventBus, so /api/trade/stream
+works on any worker, under the owner's event ids (see trading/events.py).
+A worker never mirrors while it holds the lease or events of a run it
+started itself. stop() from a non-owner bumps the shared
+stop-request counter, which the owner picks up within one publish
+interval.
+"""
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from collections import deque
+
+from trading.events import BUS
+
+
+class TradingEngine:
+    def __init__(self, state, lease, publish_interval=1.0, stale_after=None, event_tail=256):
+        self.state = state
+        self.lease = lease
+        self.publish_interval = publish_interval
+        # A snapshot whose heartbeat is older than this means the owner is gone; several
+        # missed publishes, so a long STATE_PUBLISH_INTERVAL does not look like a dead owner
+        self.stale_after = stale_after if stale_after is not None else max(10.0, 5 * publish_interval)
+        self.thread = None
+        self._publisher = None
+        self._active = False
+        self._stop_baseline = None
+        self._snapshot = None
+        self._on_stop = None
+        self._started_at = None
+        self._tail = deque(maxlen=event_tail)
+        self._after = 0
+        self._mirror = None
+        self.run_id = None
+
+    @property
+    def running_here(self):
+        # The publisher outlives the loop thread until the final snapshot is written and the lease released
+        return self._publisher is not None and self._publisher.is_alive()
+
+    def active(self):
+        """
+        Loop condition for the owner: False once stopped locally or from another worker.
+        """
+        return self._active and self.state.stop_requests() == self._stop_baseline
+
+    def start(self, target, snapshot, on_stop=None):
+        """
+        Run target(active) on a thread in this process if no process holds the lease.
+        snapshot() returns the status dict to publish; on_stop() wakes the loop on a remote stop.
+        Returns (started, owner).
+        """
+        if self.running_here or not self.lease.acquire():
+            return False, self.lease.owner()
+        self._stop_baseline = self.state.stop_requests()
+        self._snapshot = snapshot
+        self._on_stop = on_stop
+        self._started_at = time.time()
+        self._active = True
+        self.run_id = uuid.uuid4().hex[:12]
+        BUS.origin = self.run_id
+        self._after = BUS.last_seq
+        BUS.publish('trading', {'active': True})
+        self.thread = threading.Thread(target=self._run, args=(target,), name='trading-engine', daemon=True)
+        self._publisher = threading.Thread(target=self._publish_loop, name='engine-publisher', daemon=True)
+        self.thread.start()
+        self._publisher.start()
+        return True, self.lease.owner()
+
+    def stop(self):
+        """
+        Stop the loop wherever it runs; returns False if no live engine was found.
+        """
+        if self.running_here:
+            self._active = False
+            if self._on_stop:
+                self._on_stop()
+            return True
+        if not self.status().get('active'):
+            return False
+        self.state.request_stop()
+        return True
+
+    def status(self, live=None):
+        """
+        Trade status for any worker: live() in the owner, else the shared snapshot.
+        """
+        if self.running_here and live is not None:
+            status = dict(live(), active=self.active())
+            status['engine'] = self._engine_info()
+            return status
+        shared = self.state.read() or {}
+        status = dict(shared.get('status') or {'positions': [], 'positions_by_symbol': {}, 'pnl': 0.0, 'symbols': {}})
+        engine = shared.get('engine')
+        alive = bool(engine and engine.get('active') and time.time() - engine['heartbeat'] < self.stale_after)
+        status['active'] = alive
+        status['engine'] = engine
+        return status
+
+    def _engine_info(self):
+        return {'pid': os.getpid(), 'host': socket.gethostname(), 'started_at': self._started_at,
+                'run': self.run_id, 'heartbeat': time.time(), 'active': self.active()}
+
+    def _run(self, target):
+        try:
+            target(self.active)
+        except Exception as e:
+            logging.error(f"Trading engine stopped with error: {e}")
+        finally:
+            self._active = False
+
+    def _publish(self):
+        try:
+            status = self._snapshot()
+        except Exception as e:
+            logging.warning(f"Engine status snapshot failed: {e}")
+            status = None
+        self.state.write({'engine': self._engine_info(), 'status': status, 'events': list(self._tail)})
+
+    def _publish_loop(self):
+        after = self._after
+        stopping = False
+        while True:
+            events, _ = BUS.read(after, timeout=self.publish_interval)
+            for event in events:
+                after = event[0]
+                self._tail.append(event)
+            if self._active and not self.active():
+                # Stop requested by another worker: wake the scheduler out of its wait
+                self._active = False
+                logging.info("Stop requested from another worker")
+                if self._on_stop:
+                    self._on_stop()
+            if not self.thread.is_alive():
+                if not stopping:
+                    # One more pass so the 'trading' event below reaches the snapshot
+                    stopping = True
+                    BUS.publish('trading', {'active': False})
+                    continue
+                self._publish()
+                break
+            self._publish()
+        self.lease.release()
+
+    def follow_events(self, poll_interval=0.25):
+        """
+        Re-publish the owner's events on this worker's EventBus (no-op in the owner).
+        """
+        if self._mirror is None:
+            self._mirror = threading.Thread(target=self._mirror_loop, args=(poll_interval,),
+                                            name='engine-mirror', daemon=True)
+            self._mirror.start()
+
+    def _mirror_loop(self, poll_interval):
+        last = None
+        owner = None
+        while True:
+            shared = self.state.read() or {}
+            engine = shared.get('engine') or {}
+            tail = shared.get('events') or []
+            if engine.get('run') != owner:
+                # New run: its sequence numbers start over, and its backlog is not news
+                owner = engine.get('run')
+                last = tail[-1][0] if tail else 0
+            # The events of a run started here are already on this worker's bus
+            if not self.lease.held and owner is not None and owner != self.run_id:
+                for seq, kind, payload, event_id in tail:
+                    if seq > last:
+                        BUS.publish_payload(kind, payload, event_id)
+            if tail:
+                last = max(last, tail[-1][0])
+            time.sleep(poll_interval)
@@ -0,0 +1,141 @@
+# trading/events.py
+"""
+In-process event fan-out for the live /api/trade/stream endpoint.
+
+EventBus keeps the last `capacity` events in one shared ring, each tagged
+with a sequence number and serialized to JSON once. Publishing appends to
+the ring and wakes readers. It never waits on a client, so a slow or
+stalled dashboard cannot hold up the trading loop. Each client keeps its
+own cursor into the ring. A client that falls more than `capacity` events
+behind skips ahead and gets a 'lagged' event telling it how many it missed
+(it should refetch /api/trade/status). Reconnecting browsers send
+Last-Event-ID and resume from the ring.
+
+The SSE id of an event is '<origin>:<seq>', the trading run that published
+it and its sequence number there, not the local sequence number. Events
+mirrored from another worker keep the owner's id, so a browser that
+reconnects to a different worker resumes at the same event, and an id
+that is not in the ring (another run, or too old) gets a fresh snapshot.
+
+Traders publish 'status' (position, PnL, balance, last price) when it
+changes, and 'trade' on every fill. app.py publishes 'trading' on
+start/stop.
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from itertools import islice
+
+from trading import metrics
+
+
+def format_sse(event_id, kind, payload):
+    if event_id is None:
+        return f"event: {kind}\ndata: {payload}\n\n"
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+class EventBus:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.subscribers = 0
+        # Prefix of the ids of events published here; TradingEngine sets it to its run id
+        self.origin = f"{os.getpid()}"
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, kind, data):
+        """
+        Append one event for every client; returns its sequence number.
+        """
+        return self.publish_payload(kind, json.dumps(data, default=str))
+
+    def publish_payload(self, kind, payload, event_id=None):
+        """
+        publish() for an event already serialized elsewhere (events mirrored from
+        another worker, which keep the owner's `event_id`).
+        """
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, kind, payload, event_id or f"{self.origin}:{self._seq}"))
+            self._cond.notify_all()
+            return self._seq
+
+    def locate(self, event_id):
+        """
+        Local sequence number of the event with SSE id `event_id`, or None if it is not in the ring.
+        """
+        with self._cond:
+            for seq, _, _, eid in reversed(self._events):
+                if eid == event_id:
+                    return seq
+        return None
+
+    def _event_id(self, seq):
+        if not self._events or not self._events[0][0] <= seq <= self._seq:
+            return None
+        return self._events[seq - self._events[0][0]][3]
+
+    def read(self, after, timeout=None):
+        """
+        Events newer than sequence `after`, waiting up to `timeout` seconds for one.
+        Returns (events, missed), where `missed` counts events already dropped from the ring.
+        """
+        with self._cond:
+            if self._seq <= after:
+                self._cond.wait(timeout)
+            if self._seq <= after or not self._events:
+                return [], 0
+            first = self._events[0][0]
+            missed = max(0, first - after - 1)
+            return list(islice(self._events, max(0, after + 1 - first), None)), missed
+
+    def stream(self, last_event_id=None, kinds=None, heartbeat=15.0, snapshot=None, active=lambda: True,
+               since=None):
+        """
+        Generate Server-Sent Events text for one client.
+        Starts after `last_event_id` when that event is still in the ring, otherwise
+        with `snapshot` (a dict sent as a 'snapshot' event) and the events after it.
+        `since` is last_seq read before the snapshot was built; the generator
+        body only runs on the first next(), so events published in between
+        would otherwise be lost.
+        """
+        after = self._seq if since is None else min(since, self._seq)
+        resume = self.locate(last_event_id) if last_event_id else None
+        if resume is not None:
+            after = resume
+        elif snapshot is not None:
+            with self._cond:
+                snapshot_id = self._event_id(after)
+            yield format_sse(snapshot_id, 'snapshot', json.dumps(snapshot, default=str))
+        with self._cond:
+            self.subscribers += 1
+        try:
+            last_sent = time.monotonic()
+            while active():
+                events, missed = self.read(after, timeout=heartbeat)
+                if missed:
+                    yield f"event: lagged\ndata: {json.dumps({'missed': missed})}\n\n"
+                for seq, kind, payload, event_id in events:
+                    after = seq
+                    if kinds is None or kind in kinds:
+                        yield format_sse(event_id, kind, payload)
+                        last_sent = time.monotonic()
+                if time.monotonic() - last_sent >= heartbeat:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+
+BUS = EventBus()
+metrics.SSE_CLIENTS.set_function(lambda: BUS.subscribers)
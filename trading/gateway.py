@@ -0,0 +1,227 @@
+# trading/gateway.py
+"""
+Rate-limit-aware gateway for every Binance REST call.
+
+RequestGateway admits calls in priority order (orders before data fetches
+before health probes) while keeping the per-minute request weight under a
+budget. The budget is synced with the X-MBX-USED-WEIGHT-1M response header.
+A 429/418 pauses every call until Retry-After has passed. Retryable
+failures back off exponentially with jitter.
+Against a replayed exchange the budget runs on replay time (`time_fn`,
+`speed`), so a 1000x replay gets 1000x the wall-clock request rate.
+
+GatewayClient wraps a binance Client so existing code (Trader, KlineStore,
+HealthProber) goes through the gateway without changes.
+"""
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+from trading import metrics
+from trading.utils import backoff_delay
+
+PRIORITY_ORDER = 0
+PRIORITY_DATA = 1
+PRIORITY_HEALTH = 2
+
+# Request weight per client method (GET /api/v3/...); anything else counts as 1
+METHOD_WEIGHTS = {
+    'get_klines': 2,
+    'get_historical_klines': 2,
+    'get_server_time': 1,
+    'ping': 1,
+    'get_account': 20,
+    'get_exchange_info': 20,
+    'get_order': 4,
+    'get_open_orders': 6,
+    'get_all_orders': 20,
+    'get_my_trades': 20,
+    'get_symbol_ticker': 2,
+    'create_order': 1,
+    'create_test_order': 1,
+    'cancel_order': 1,
+}
+
+ORDER_METHODS = {
+    'create_order', 'create_test_order', 'cancel_order', 'get_order',
+    'order_market', 'order_market_buy', 'order_market_sell',
+    'order_limit', 'order_limit_buy', 'order_limit_sell',
+}
+HEALTH_METHODS = {'get_server_time', 'ping', 'get_account', 'get_system_status'}
+
+
+def method_priority(name):
+    if name in ORDER_METHODS:
+        return PRIORITY_ORDER
+    if name in HEALTH_METHODS:
+        return PRIORITY_HEALTH
+    return PRIORITY_DATA
+
+
+class RequestGateway:
+    def __init__(self, client, weight_per_minute=1000, max_concurrent=8, max_retries=5,
+                 base_delay=0.5, max_delay=30.0, time_fn=time.time, speed=1.0):
+        """
+        time_fn: seconds for the weight window and bans (e.g. replay time).
+        speed: time_fn seconds per wall second; 0 means time only moves when
+        stepped, so the weight budget is not enforced.
+        """
+        self.client = client
+        self.weight_per_minute = weight_per_minute
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.time_fn = time_fn
+        self.speed = speed
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._window = int(time_fn() // 60)
+        self._used = 0
+        self._banned_until = 0.0
+        self.total_requests = 0
+        self.total_retries = 0
+        metrics.API_WEIGHT_USED.set_function(lambda: self.stats()['weight_used'])
+        metrics.API_WEIGHT_LIMIT.set_function(lambda: self.weight_per_minute)
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self._waiting), 'gateway')
+
+    def stats(self):
+        with self._cond:
+            self._roll_window()
+            return {
+                'weight_used': self._used,
+                'weight_limit': self.weight_per_minute,
+                'queued': len(self._waiting),
+                'in_flight': self._in_flight,
+                'banned_for': max(0.0, round(self._banned_until - self.time_fn(), 1)),
+                'total_requests': self.total_requests,
+                'total_retries': self.total_retries,
+            }
+
+    def call(self, method, *args, priority=None, weight=None, **kwargs):
+        """
+        Run client.<method>(*args, **kwargs) once the weight budget and priority allow.
+        """
+        priority = method_priority(method) if priority is None else priority
+        weight = METHOD_WEIGHTS.get(method, 1) if weight is None else weight
+        func = getattr(self.client, method)
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            self._acquire(priority, weight)
+            try:
+                result = func(*args, **kwargs)
+                self._sync_used_weight()
+                metrics.API_REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+                metrics.API_REQUESTS.inc(method, 'ok')
+                return result
+            except BinanceAPIException as e:
+                self._sync_used_weight(e.response)
+                if e.status_code in (418, 429):
+                    self._ban(e)
+                elif not (e.status_code >= 500 and priority != PRIORITY_ORDER):
+                    # Ordinary 4xx rejections are not retryable; a 5xx on an order may have executed
+                    metrics.API_REQUESTS.inc(method, 'rejected')
+                    raise
+                error = e
+            except (RequestsConnectionError, BinanceRequestException, Timeout) as e:
+                if priority == PRIORITY_ORDER:
+                    # The order may have reached Binance; OrderExecutor looks it up before resending
+                    metrics.API_REQUESTS.inc(method, 'error')
+                    raise
+                error = e
+            finally:
+                self._release()
+            if attempt >= self.max_retries:
+                metrics.API_REQUESTS.inc(method, 'error')
+                raise error
+            wait = backoff_delay(attempt, self.base_delay, self.max_delay)
+            logging.warning(f"{method} failed ({error}), retry {attempt + 1}/{self.max_retries} in {wait:.2f}s")
+            self.total_retries += 1
+            metrics.API_RETRIES.inc(method)
+            attempt += 1
+            time.sleep(wait)
+
+    def _roll_window(self):
+        window = int(self.time_fn() // 60)
+        if window != self._window:
+            self._window = window
+            self._used = 0
+
+    def _acquire(self, priority, weight):
+        if weight > self.weight_per_minute:
+            # Could never fit in one window, so it would wait forever
+            raise ValueError(f"request weight {weight} exceeds the budget of {self.weight_per_minute} per minute")
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                self._roll_window()
+                now = self.time_fn()
+                over_budget = self.speed and self._used + weight > self.weight_per_minute
+                if (self._waiting[0] == ticket and self._in_flight < self.max_concurrent
+                        and now >= self._banned_until and not over_budget):
+                    heapq.heappop(self._waiting)
+                    self._in_flight += 1
+                    self._used += weight
+                    self.total_requests += 1
+                    self._cond.notify_all()
+                    return
+                if now < self._banned_until:
+                    timeout = self._banned_until - now
+                elif over_budget:
+                    timeout = (self._window + 1) * 60 - now
+                else:
+                    timeout = None
+                self._cond.wait(timeout / self.speed if timeout is not None and self.speed else timeout)
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _sync_used_weight(self, response=None):
+        response = response if response is not None else getattr(self.client, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if not headers:
+            return
+        used = headers.get('x-mbx-used-weight-1m') or headers.get('X-MBX-USED-WEIGHT-1M')
+        if used is None:
+            return
+        with self._cond:
+            self._roll_window()
+            # The server count includes other processes sharing our IP
+            self._used = max(self._used, int(used))
+
+    def _ban(self, error):
+        headers = getattr(error.response, 'headers', None) or {}
+        retry_after = float(headers.get('Retry-After', 60))
+        with self._cond:
+            self._banned_until = max(self._banned_until, self.time_fn() + retry_after)
+            self._cond.notify_all()
+        logging.error(f"Binance rate limit hit (HTTP {error.status_code}), pausing all requests for {retry_after:.0f}s")
+
+
+class GatewayClient:
+    """
+    Drop-in stand-in for binance.client.Client that sends every method call through a RequestGateway.
+    """
+    def __init__(self, client, gateway):
+        self._client = client
+        self.gateway = gateway
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def call(*args, **kwargs):
+            return self.gateway.call(name, *args, **kwargs)
+        return call
@@ -0,0 +1,77 @@
+# trading/health.py
+"""
+Background health probes for the Binance connection.
+
+HealthProber checks connectivity (get_server_time) and key validity
+(get_account) on a schedule in its own thread, so /health can return the
+cached results immediately instead of calling Binance per request.
+"""
+import time
+import logging
+import threading
+
+
+class HealthProber:
+    def __init__(self, client, interval=30, account_interval=300):
+        self.client = client
+        # get_account costs far more API weight than get_server_time, so probe it less often
+        self.probes = {
+            'binance_api': (lambda: self.client.get_server_time(), interval),
+            'api_key_status': (lambda: self.client.get_account(), account_interval),
+        }
+        self.results = {name: {'status': 'pending', 'checked_at': None, 'latency_ms': None}
+                        for name in self.probes}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Concurrent first /health requests must not each start a probe thread
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def probe(self, name):
+        func, _ = self.probes[name]
+        started = time.monotonic()
+        try:
+            func()
+            status = 'ok'
+        except Exception as e:
+            status = f'error: {str(e)}'
+            logging.warning(f"Health probe {name} failed: {e}")
+        result = {
+            'status': status,
+            'checked_at': time.time(),
+            'latency_ms': round((time.monotonic() - started) * 1000, 1)
+        }
+        with self._lock:
+            self.results[name] = result
+        return result
+
+    def snapshot(self):
+        """
+        Cached probe results with the age of each one in seconds.
+        """
+        now = time.time()
+        with self._lock:
+            results = {name: dict(r) for name, r in self.results.items()}
+        for r in results.values():
+            r['age_seconds'] = round(now - r['checked_at'], 1) if r['checked_at'] else None
+        return results
+
+    def _run(self):
+        next_due = {name: 0.0 for name in self.probes}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for name, (_, interval) in self.probes.items():
+                if now >= next_due[name]:
+                    self.probe(name)
+                    next_due[name] = time.monotonic() + interval
+            self._stop.wait(max(0.5, min(next_due.values()) - time.monotonic()))
@@ -0,0 +1,394 @@
+# trading/indicators.py
+"""
+Incremental rolling indicators.
+
+RollingSMAEngine keeps one ring buffer of closed-candle prices and a running
+sum per window, so each new candle costs O(number of windows) instead of
+re-summing the whole window.
+
+SMA, EMA, RSI, MACD, BollingerBands and ATR follow the same idea: each keeps
+just the state it needs and updates in O(1) per closed candle. value is None
+until `warmup` candles have been pushed.
+
+IndicatorCache holds the indicators of one symbol/interval. Strategies
+ask it for indicators by spec, e.g. cache.get('ema', 12), and get back the
+same instance when specs match, so a dozen strategy variants on one symbol
+compute each indicator once per candle.
+"""
+import math
+from collections import deque
+
+from trading.candles import CandleBuffer
+
+
+class RollingSMAEngine:
+    def __init__(self, windows, resync_every=10000):
+        windows = sorted(set(int(w) for w in windows))
+        if not windows or windows[0] < 1:
+            raise ValueError("windows must be positive integers")
+        self.windows = tuple(windows)
+        self.capacity = windows[-1]
+        # Running sums pick up float rounding error over time; rebuild them
+        # from the buffer every `resync_every` updates to keep it bounded.
+        self.resync_every = resync_every
+        self._buf = [0.0] * self.capacity
+        self._sums = {w: 0.0 for w in self.windows}
+        self._pos = 0
+        self._count = 0
+        self._since_resync = 0
+        self.last = None
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def reset(self):
+        self._buf = [0.0] * self.capacity
+        self._sums = {w: 0.0 for w in self.windows}
+        self._pos = 0
+        self._count = 0
+        self._since_resync = 0
+        self.last = None
+
+    def update(self, value):
+        """
+        Push one closed-candle value into the buffer and update every window sum.
+        """
+        value = float(value)
+        buf = self._buf
+        cap = self.capacity
+        pos = self._pos
+        count = self._count
+        sums = self._sums
+        for w in self.windows:
+            if count >= w:
+                sums[w] -= buf[(pos - w) % cap]
+            sums[w] += value
+        buf[pos] = value
+        self._pos = (pos + 1) % cap
+        self._count = count + 1
+        self.last = value
+        self._since_resync += 1
+        if self._since_resync >= self.resync_every:
+            self._resync()
+
+    def extend(self, values):
+        for v in values:
+            self.update(v)
+
+    def sma(self, window):
+        """
+        Return the current SMA for `window`, or None until enough candles are in.
+        """
+        if self._count < window:
+            return None
+        return self._sums[window] / window
+
+    def values(self, n=None):
+        """
+        Return the last `n` buffered values, oldest first.
+        """
+        size = len(self)
+        n = size if n is None else min(n, size)
+        start = (self._pos - n) % self.capacity
+        if start + n <= self.capacity:
+            return self._buf[start:start + n]
+        return self._buf[start:] + self._buf[:self._pos]
+
+    def _resync(self):
+        for w in self.windows:
+            self._sums[w] = math.fsum(self.values(w))
+        self._since_resync = 0
+
+
+class SMA:
+    """
+    Simple moving average over a ring of the last `period` closes.
+
+    A single-window RollingSMAEngine inlined, since this runs for every
+    strategy window on every candle. The running sum is rebuilt with fsum
+    each time the ring wraps, which bounds rounding error at O(1) amortized.
+    """
+    def __init__(self, period):
+        self.period = int(period)
+        if self.period < 1:
+            raise ValueError("period must be a positive integer")
+        self.warmup = self.period
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self._buf = [0.0] * self.period
+        self._pos = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, high, low, close):
+        buf = self._buf
+        pos = self._pos
+        self._sum += close - buf[pos]
+        buf[pos] = close
+        pos += 1
+        if pos == self.period:
+            pos = 0
+            self._sum = math.fsum(buf)
+        self._pos = pos
+        self._count += 1
+        if self._count >= self.period:
+            self.value = self._sum / self.period
+
+
+class EMA:
+    """
+    Exponential moving average, seeded with the SMA of the first `period` closes.
+    """
+    def __init__(self, period):
+        self.period = int(period)
+        self.warmup = self.period
+        self.alpha = 2.0 / (self.period + 1)
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self._count = 0
+        self._seed = 0.0
+
+    def update(self, high, low, close):
+        self.push(close)
+
+    def push(self, value):
+        if self.value is not None:
+            self.value += self.alpha * (value - self.value)
+            return self.value
+        self._count += 1
+        self._seed += value
+        if self._count == self.period:
+            self.value = self._seed / self.period
+        return self.value
+
+
+class RSI:
+    """
+    Wilder's RSI: average gain/loss seeded with a simple mean over the first
+    `period` changes, then smoothed with factor 1/period.
+    """
+    def __init__(self, period=14):
+        self.period = int(period)
+        self.warmup = self.period + 1
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self._prev = None
+        self._count = 0
+        self._gain = 0.0
+        self._loss = 0.0
+
+    def update(self, high, low, close):
+        prev, self._prev = self._prev, close
+        if prev is None:
+            return
+        change = close - prev
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        n = self.period
+        if self._count < n:
+            self._count += 1
+            self._gain += gain
+            self._loss += loss
+            if self._count < n:
+                return
+            self._gain /= n
+            self._loss /= n
+        else:
+            self._gain = (self._gain * (n - 1) + gain) / n
+            self._loss = (self._loss * (n - 1) + loss) / n
+        if self._loss == 0:
+            self.value = 100.0 if self._gain > 0 else 50.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + self._gain / self._loss)
+
+
+class MACD:
+    """
+    value is (macd, signal, histogram).
+    """
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+        self.warmup = max(self.fast.period, self.slow.period) + self.signal.period - 1
+        self.value = None
+
+    def reset(self):
+        self.fast.reset()
+        self.slow.reset()
+        self.signal.reset()
+        self.value = None
+
+    def update(self, high, low, close):
+        fast = self.fast.push(close)
+        slow = self.slow.push(close)
+        if fast is None or slow is None:
+            return
+        macd = fast - slow
+        signal = self.signal.push(macd)
+        if signal is not None:
+            self.value = (macd, signal, macd - signal)
+
+
+class BollingerBands:
+    """
+    value is (middle, upper, lower) using the population standard deviation.
+    The running sums are of prices minus a reference price, which keeps the
+    variance from cancelling out at price levels in the tens of thousands;
+    they are rebuilt from the window every `resync_every` updates.
+    """
+    def __init__(self, period=20, width=2.0, resync_every=10000):
+        self.period = int(period)
+        self.width = float(width)
+        self.warmup = self.period
+        self.resync_every = resync_every
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self._window = deque(maxlen=self.period)
+        self._shift = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._since_resync = 0
+
+    def update(self, high, low, close):
+        window = self._window
+        if self._shift is None:
+            self._shift = close
+        if len(window) == self.period:
+            old = window[0] - self._shift
+            self._sum -= old
+            self._sumsq -= old * old
+        window.append(close)
+        x = close - self._shift
+        self._sum += x
+        self._sumsq += x * x
+        self._since_resync += 1
+        if self._since_resync >= self.resync_every:
+            self._shift = close
+            self._sum = math.fsum(v - close for v in window)
+            self._sumsq = math.fsum((v - close) ** 2 for v in window)
+            self._since_resync = 0
+        if len(window) < self.period:
+            return
+        mean = self._sum / self.period
+        std = math.sqrt(max(0.0, self._sumsq / self.period - mean * mean))
+        mean += self._shift
+        self.value = (mean, mean + self.width * std, mean - self.width * std)
+
+
+class ATR:
+    """
+    Wilder's average true range; needs high/low, so feed it full candles.
+    """
+    def __init__(self, period=14):
+        self.period = int(period)
+        self.warmup = self.period + 1
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self._prev_close = None
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, high, low, close):
+        prev, self._prev_close = self._prev_close, close
+        if prev is None:
+            return
+        tr = max(high - low, abs(high - prev), abs(low - prev))
+        n = self.period
+        if self._count < n:
+            self._count += 1
+            self._sum += tr
+            if self._count == n:
+                self.value = self._sum / n
+        else:
+            self.value = (self.value * (n - 1) + tr) / n
+
+
+INDICATORS = {
+    'sma': SMA,
+    'ema': EMA,
+    'rsi': RSI,
+    'macd': MACD,
+    'bollinger': BollingerBands,
+    'atr': ATR,
+}
+
+
+class IndicatorCache:
+    """
+    Indicators for one symbol/interval, updated once per closed candle.
+
+    Candles carrying an open time are deduplicated, so several Traders on the
+    same stream can all push the same kline and only the first one pays for
+    the update. The last `history` candles are kept in a CandleBuffer, which
+    strategies can read directly, and indicators registered later are warmed
+    up from it right away. The buffer grows to the warmup of the longest
+    indicator, so a window over `history` can still be read from it.
+    """
+    def __init__(self, history=500):
+        self.indicators = {}
+        self.candles = CandleBuffer(history)
+        self.close = None
+
+    def __len__(self):
+        return len(self.candles)
+
+    @property
+    def last_open_time(self):
+        return self.candles.last_open_time
+
+    @property
+    def warmup(self):
+        """Candles needed before every registered indicator has a value."""
+        return max((ind.warmup for ind in self.indicators.values()), default=1)
+
+    def get(self, name, *params):
+        """
+        Return the shared indicator for (name, *params), creating and warming it up on first use.
+        """
+        key = (name,) + tuple(params)
+        indicator = self.indicators.get(key)
+        if indicator is None:
+            if name not in INDICATORS:
+                raise ValueError(f"Unknown indicator {name!r}, expected one of {', '.join(INDICATORS)}")
+            indicator = INDICATORS[name](*params)
+            if indicator.warmup > self.candles.capacity:
+                self.candles.resize(indicator.warmup)
+            for _, high, low, close, _ in self.candles.ohlcv().tolist():
+                indicator.update(high, low, close)
+            self.indicators[key] = indicator
+        return indicator
+
+    def update(self, high, low, close, open_time=None, open=None, volume=0.0):
+        """
+        Push one closed candle into every indicator. Returns False for a candle already seen.
+        """
+        high, low, close = float(high), float(low), float(close)
+        if not self.candles.append(open_time, close if open is None else float(open), high, low, close,
+                                   float(volume)):
+            return False
+        for indicator in self.indicators.values():
+            indicator.update(high, low, close)
+        self.close = close
+        return True
+
+    def update_kline(self, kline):
+        """Push a Binance kline ([open_time, open, high, low, close, volume, ...])."""
+        return self.update(kline[2], kline[3], kline[4], open_time=int(kline[0]), open=kline[1],
+                           volume=kline[5])
+
+    def reset(self):
+        self.candles.reset()
+        self.close = None
+        for indicator in self.indicators.values():
+            indicator.reset()
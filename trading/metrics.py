@@ -0,0 +1,220 @@
+# trading/metrics.py
+"""
+Lightweight in-process metrics, rendered in the Prometheus text format.
+
+Counter, Gauge and Histogram keep plain floats behind one lock per
+metric. The hot-path cost of observe() is a bisect and a few additions.
+Labelled series are created on first use. Gauges can read their value
+from a callback at scrape time, e.g. for queue depths.
+
+The metrics the bot records are defined at the bottom of this module and
+served by /metrics in app.py.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Seconds; tuned for API calls and DB commits (1 ms .. 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _get(self, labels):
+        series = self._series.get(labels)
+        if series is None:
+            if len(labels) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+            with self._lock:
+                series = self._series.setdefault(labels, self._new_series())
+        return series
+
+    def clear(self):
+        with self._lock:
+            self._series = {}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_series(self):
+        return [0.0]
+
+    def inc(self, *labels, amount=1.0):
+        series = self._get(labels)
+        with self._lock:
+            series[0] += amount
+
+    def value(self, *labels):
+        return self._get(labels)[0]
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, s[0]) for labels, s in self._series.items()]
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self._callbacks = {}
+
+    def _new_series(self):
+        return [0.0]
+
+    def set(self, value, *labels):
+        series = self._get(labels)
+        with self._lock:
+            series[0] = value
+
+    def set_function(self, func, *labels):
+        """
+        Read the value from func() at scrape time; func returning None drops the sample.
+        """
+        self._callbacks[labels] = func
+
+    def value(self, *labels):
+        if labels in self._callbacks:
+            return self._callbacks[labels]()
+        return self._get(labels)[0]
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, s[0]) for labels, s in self._series.items()]
+        for labels, func in list(self._callbacks.items()):
+            try:
+                value = func()
+            except Exception:
+                value = None
+            if value is not None:
+                items.append((labels, value))
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_series(self):
+        # [per-bucket counts..., +Inf count, sum]
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, *labels):
+        series = self._get(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels):
+        series = self._get(labels)
+        return sum(series[:-1])
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(s)) for labels, s in self._series.items()]
+        lines = []
+        bounds = self.buckets + (float('inf'),)
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip(bounds, series[:-1]):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+# ---------- trading bot metrics ----------
+
+API_REQUEST_SECONDS = Histogram('binance_request_seconds', 'Binance REST call latency, including retries',
+                                ('method',))
+API_REQUESTS = Counter('binance_requests_total', 'Binance REST calls by outcome', ('method', 'outcome'))
+API_RETRIES = Counter('binance_retries_total', 'Retried Binance REST calls', ('method',))
+API_WEIGHT_USED = Gauge('binance_weight_used', 'Request weight used in the current minute')
+API_WEIGHT_LIMIT = Gauge('binance_weight_limit', 'Request weight budget per minute')
+
+KLINE_FETCH_SECONDS = Histogram('kline_fetch_seconds', 'Time to bring a symbol up to the latest closed candle',
+                                ('symbol',))
+SIGNAL_SECONDS = Histogram('signal_evaluation_seconds', 'Strategy signal evaluation time', ('symbol',),
+                           buckets=FAST_BUCKETS)
+ORDER_ROUND_TRIP_SECONDS = Histogram('order_round_trip_seconds', 'Order submission to fill', ('side',))
+ORDERS = Counter('orders_total', 'Orders by outcome', ('side', 'outcome'))
+
+DB_COMMIT_SECONDS = Histogram('db_commit_seconds', 'Database write transaction time', ('op',))
+DB_ROWS = Counter('db_rows_written_total', 'Rows written to the trades table')
+DB_PARKED = Counter('db_writes_parked_total', 'Write-behind rows that failed on their own and were parked', ('kind',))
+
+TICK_SECONDS = Histogram('scheduler_tick_seconds', 'Duration of one scheduler tick over all symbols')
+TICK_DRIFT_SECONDS = Histogram('scheduler_tick_drift_seconds', 'Lateness of a tick against its schedule')
+
+QUEUE_DEPTH = Gauge('queue_depth', 'Items waiting in internal queues', ('queue',))
+SSE_CLIENTS = Gauge('sse_clients', 'Clients connected to /api/trade/stream')
@@ -0,0 +1,142 @@
+# trading/optimizer.py
+"""
+Parallel (short_window, long_window) sweep over one or more candle datasets.
+
+Each dataset's closes are written once to a contiguous .npy file; worker
+processes memory-map those files read-only, so only file paths and window
+pairs cross the process boundary. Results come back as a table ranked by PnL.
+
+Usage:
+    python -m trading.optimizer data/BTCUSDT-1m.npy data/ETHUSDT-5m.npy \\
+        --short 5:50:5 --long 20:200:10 --workers 8
+"""
+import os
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from trading.backtest import load_candles, closes_of, rolling_sma, run_backtest
+
+# Per-process state, set up by _init_worker
+_datasets = {}
+_sma_cache = {}
+# Max cached SMA arrays per worker (each is 8 bytes per candle)
+SMA_CACHE_SIZE = 64
+
+
+def parse_range(text):
+    """
+    Parse 'start:stop:step' (inclusive) or a comma list '5,10,20' into a list of ints.
+    """
+    if ':' in text:
+        parts = [int(p) for p in text.split(':')]
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1
+        return list(range(start, stop + 1, step))
+    return [int(p) for p in text.split(',') if p.strip()]
+
+
+def window_grid(shorts, longs):
+    return [(s, l) for s in shorts for l in longs if s < l]
+
+
+def prepare_datasets(paths, workdir):
+    """
+    Write each dataset's closes to workdir/<name>.npy and return {name: path}.
+    The name is the file stem, e.g. 'BTCUSDT-1m'.
+    """
+    prepared = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        closes = np.ascontiguousarray(closes_of(load_candles(path)))
+        out = os.path.join(workdir, f"{name}.npy")
+        np.save(out, closes)
+        prepared[name] = out
+    return prepared
+
+
+def _init_worker(prepared):
+    global _datasets, _sma_cache
+    _datasets = {name: np.load(path, mmap_mode='r') for name, path in prepared.items()}
+    _sma_cache = {}
+
+
+def _sma(name, window):
+    key = (name, window)
+    if key not in _sma_cache:
+        if len(_sma_cache) >= SMA_CACHE_SIZE:
+            _sma_cache.clear()
+        _sma_cache[key] = rolling_sma(_datasets[name], window)
+    return _sma_cache[key]
+
+
+def _evaluate(task):
+    name, short_window, long_window, quantity, fee_rate = task
+    result = run_backtest(
+        _datasets[name], short_window, long_window, quantity=quantity, fee_rate=fee_rate,
+        sma_short=_sma(name, short_window), sma_long=_sma(name, long_window)
+    )
+    row = {'dataset': name, 'short_window': short_window, 'long_window': long_window}
+    row.update(result.summary())
+    return row
+
+
+def sweep(paths, shorts, longs, workers=None, quantity=0.001, fee_rate=0.0):
+    """
+    Backtest every (short, long) pair on every dataset and return rows ranked by total PnL.
+    """
+    grid = window_grid(shorts, longs)
+    with tempfile.TemporaryDirectory(prefix='sweep_') as workdir:
+        prepared = prepare_datasets(paths, workdir)
+        # Tasks are ordered by dataset and short window so chunks reuse the worker's SMA cache
+        tasks = [(name, s, l, quantity, fee_rate) for name in prepared for s, l in grid]
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(tasks) // (workers * 4))
+        logging.info(f"Sweeping {len(tasks)} combinations on {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(prepared,)) as pool:
+            rows = list(pool.map(_evaluate, tasks, chunksize=chunksize))
+    rows.sort(key=lambda r: r['total_pnl'], reverse=True)
+    return rows
+
+
+def format_table(rows, limit=20):
+    header = f"{'dataset':<16} {'short':>5} {'long':>5} {'trades':>7} {'win%':>7} {'pnl':>14} {'max_dd':>14}"
+    lines = [header, '-' * len(header)]
+    for r in rows[:limit]:
+        lines.append(
+            f"{r['dataset']:<16} {r['short_window']:>5} {r['long_window']:>5} {r['total_trades']:>7} "
+            f"{r['win_rate']:>7.2f} {r['total_pnl']:>14.6f} {r['max_drawdown']:>14.6f}"
+        )
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import csv
+    import time
+
+    parser = argparse.ArgumentParser(description='SMA crossover parameter sweep')
+    parser.add_argument('paths', nargs='+', help='Candle files (.npy, .csv or .parquet), one per symbol/interval')
+    parser.add_argument('--short', default='3:30:1', help='start:stop:step or comma list')
+    parser.add_argument('--long', default='10:200:5', help='start:stop:step or comma list')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--quantity', type=float, default=0.001)
+    parser.add_argument('--fee', type=float, default=0.0)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--csv', help='Write the full ranked table to this CSV file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    started = time.perf_counter()
+    rows = sweep(args.paths, parse_range(args.short), parse_range(args.long),
+                 workers=args.workers, quantity=args.quantity, fee_rate=args.fee)
+    print(format_table(rows, args.top))
+    print(f"\n{len(rows)} combinations in {time.perf_counter() - started:.1f} s")
+    if args.csv and rows:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
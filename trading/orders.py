@@ -0,0 +1,247 @@
+# trading/orders.py
+"""
+Asynchronous order execution, decoupled from signal evaluation.
+
+Traders hand an OrderRequest to OrderExecutor and return to evaluating
+signals. Worker threads submit the orders concurrently. Each order carries
+a deterministic client order id (symbol, side, decision candle), so a
+retried or duplicated submission never opens a second position. When the
+outcome of a submission is unknown, the executor looks the order up by
+that id before sending it again. A lookup that fails is retried with
+backoff until Binance returns the order or says it does not exist, so an
+order that may have executed is never reported as rejected. Fills are
+reported back through callbacks, and that id is what ends up in the
+trades table as order_id.
+"""
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+
+from binance.enums import ORDER_TYPE_MARKET, ORDER_RESP_TYPE_FULL
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+from trading import metrics
+from trading.utils import backoff_delay
+
+# Binance error codes; -2010 (NEW_ORDER_REJECTED) also covers e.g. insufficient balance
+NEW_ORDER_REJECTED = -2010
+UNKNOWN_ORDER = -2013
+
+FINAL_STATUSES = ('FILLED', 'CANCELED', 'REJECTED', 'EXPIRED', 'EXPIRED_IN_MATCH')
+
+
+def is_duplicate_order(error):
+    """True when Binance rejected the order because its client order id is already open."""
+    return error.code == NEW_ORDER_REJECTED and 'duplicate' in (error.message or '').lower()
+
+
+def make_client_order_id(symbol, side, open_time, prefix='bot'):
+    """
+    Deterministic id for the decision taken on the candle opened at `open_time`.
+    Binance allows up to 36 characters from [.A-Z:/a-z0-9_-].
+    """
+    return f"{prefix}-{symbol}-{side[0]}-{int(open_time or time.time() * 1000)}"[:36]
+
+
+class OrderRequest:
+    def __init__(self, symbol, side, quantity, client_order_id, price_hint=None):
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.client_order_id = client_order_id
+        self.price_hint = price_hint
+        self.submitted_at = time.time()
+
+
+class Fill:
+    def __init__(self, request, price, quantity, status='FILLED', exchange_order_id=None):
+        self.request = request
+        self.client_order_id = request.client_order_id
+        self.symbol = request.symbol
+        self.side = request.side
+        self.price = price
+        self.quantity = quantity
+        self.status = status
+        self.exchange_order_id = exchange_order_id
+        self.latency = time.time() - request.submitted_at
+
+
+class OrderExecutor:
+    def __init__(self, client, max_workers=4, test_orders=True, max_attempts=3,
+                 poll_interval=0.5, fill_timeout=30.0, max_queue=1000, max_finished=10000,
+                 max_lookup_delay=30.0):
+        self.client = client
+        self.max_workers = max_workers
+        self.test_orders = test_orders
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.fill_timeout = fill_timeout
+        self.max_lookup_delay = max_lookup_delay
+        self.queue = queue.Queue(maxsize=max_queue)
+        # client_order_id -> last known status of orders not final yet
+        self.orders = {}
+        # Recently finished ids (oldest evicted first), still refused by submit()
+        self.finished = OrderedDict()
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._threads = []
+        metrics.QUEUE_DEPTH.set_function(self.queue.qsize, 'orders')
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.max_workers):
+            t = threading.Thread(target=self._worker, name=f"order-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for t in self._threads:
+            t.join(timeout=self.fill_timeout)
+        self._threads = []
+
+    def pending(self):
+        with self._lock:
+            return dict(self.orders)
+
+    def submit(self, request, on_fill, on_error=None):
+        """
+        Queue an order; returns False if the same client order id is already known.
+        """
+        with self._lock:
+            if request.client_order_id in self.orders or request.client_order_id in self.finished:
+                logging.warning(f"Order {request.client_order_id} already submitted, ignoring duplicate")
+                return False
+            self.orders[request.client_order_id] = 'QUEUED'
+        self.queue.put((request, on_fill, on_error))
+        return True
+
+    def _set_status(self, client_order_id, status):
+        with self._lock:
+            if status not in FINAL_STATUSES:
+                self.orders[client_order_id] = status
+                return
+            self.orders.pop(client_order_id, None)
+            self.finished[client_order_id] = status
+            while len(self.finished) > self.max_finished:
+                self.finished.popitem(last=False)
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            request, on_fill, on_error = item
+            try:
+                fill = self._execute(request)
+            except Exception as e:
+                self._set_status(request.client_order_id, 'REJECTED')
+                metrics.ORDERS.inc(request.side, 'REJECTED')
+                logging.error(f"Order {request.client_order_id} failed: {e}")
+                self._callback(request, on_error, request, e)
+                continue
+            self._set_status(request.client_order_id, fill.status)
+            metrics.ORDERS.inc(request.side, fill.status)
+            # Callback errors (e.g. a failed trade insert) must not turn a real fill into a rejection
+            if fill.status == 'FILLED':
+                metrics.ORDER_ROUND_TRIP_SECONDS.observe(fill.latency, request.side)
+                self._callback(request, on_fill, fill)
+            else:
+                self._callback(request, on_error, request,
+                               RuntimeError(f"order {request.client_order_id} ended {fill.status}"))
+
+    def _callback(self, request, callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.error(f"Order {request.client_order_id} callback failed: {e}")
+
+    def _execute(self, request):
+        self._set_status(request.client_order_id, 'SENDING')
+        for attempt in range(self.max_attempts):
+            try:
+                return self._send(request)
+            except BinanceAPIException as e:
+                # The gateway never retries orders, so a 5xx may still have executed
+                if e.status_code < 500:
+                    if not is_duplicate_order(e) or self.test_orders:
+                        raise
+                    # Already accepted on an earlier attempt
+                    return self._await_fill(request)
+                error = e
+            except (Timeout, RequestsConnectionError, BinanceRequestException) as e:
+                error = e
+            logging.warning(f"Order {request.client_order_id} outcome unknown ({error}), reconciling")
+            if not self.test_orders:
+                existing = self._lookup(request)
+                if existing is not None:
+                    return self._await_fill(request, existing)
+            time.sleep(self.poll_interval * (attempt + 1))
+        raise RuntimeError(f"order {request.client_order_id} not accepted after {self.max_attempts} attempts")
+
+    def _send(self, request):
+        params = dict(
+            symbol=request.symbol,
+            side=request.side,
+            type=ORDER_TYPE_MARKET,
+            quantity=request.quantity,
+            newClientOrderId=request.client_order_id
+        )
+        if self.test_orders:
+            # Test orders are validated but never executed; treat them as filled at the signal price
+            self.client.create_test_order(**params)
+            return Fill(request, request.price_hint, request.quantity)
+        response = self.client.create_order(newOrderRespType=ORDER_RESP_TYPE_FULL, **params)
+        if response.get('status') in FINAL_STATUSES:
+            return self._fill_from(request, response)
+        return self._await_fill(request, response)
+
+    def _lookup(self, request):
+        """
+        The order as Binance has it, or None if Binance says it does not exist.
+        Any other failure leaves the outcome unknown, so it is retried with backoff
+        (the order stays pending in the meantime) rather than raised.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.client.get_order(symbol=request.symbol, origClientOrderId=request.client_order_id)
+            except BinanceAPIException as e:
+                if e.code == UNKNOWN_ORDER:
+                    return None
+                error = e
+            except (Timeout, RequestsConnectionError, BinanceRequestException) as e:
+                error = e
+            self._set_status(request.client_order_id, 'UNKNOWN')
+            wait = backoff_delay(attempt, self.poll_interval, self.max_lookup_delay)
+            logging.warning(f"Order {request.client_order_id} lookup failed ({error}), retry in {wait:.2f}s")
+            attempt += 1
+            time.sleep(wait)
+
+    def _await_fill(self, request, response=None):
+        """
+        Poll the order until it reaches a final status (fill reconciliation).
+        """
+        deadline = time.time() + self.fill_timeout
+        while True:
+            if response is not None:
+                self._set_status(request.client_order_id, response.get('status', 'UNKNOWN'))
+                if response.get('status') in FINAL_STATUSES:
+                    return self._fill_from(request, response)
+            if time.time() >= deadline:
+                raise RuntimeError(f"order {request.client_order_id} not final after {self.fill_timeout}s")
+            time.sleep(self.poll_interval)
+            response = self._lookup(request)
+
+    def _fill_from(self, request, response):
+        executed = float(response.get('executedQty') or 0)
+        quote = float(response.get('cummulativeQuoteQty') or 0)
+        price = quote / executed if executed else request.price_hint
+        return Fill(request, price, executed, response.get('status', 'FILLED'), response.get('orderId'))
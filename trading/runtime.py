@@ -0,0 +1,207 @@
+# trading/runtime.py
+"""
+Lazily built runtime services for the Flask app.
+
+Services holds the decrypted config, the Binance client (behind the
+request gateway), the database, the kline cache, the order executor, the
+health prober and the cross-worker trading engine. Each one is built the
+first time it is used. The heavy modules (python-binance, psycopg2,
+numpy) are imported inside the builders, so importing app.py does no
+network, key or database I/O.
+warm() builds the independent subsystems concurrently on background
+threads, so a fresh worker can serve requests while they come up.
+"""
+import os
+import time
+import logging
+import threading
+
+
+class Lazy:
+    """
+    Thread-safe value built by `factory` on first get().
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self.build_seconds = None
+        self._lock = threading.Lock()
+        self._value = None
+        self._built = False
+
+    def get(self):
+        if self._built:
+            return self._value
+        with self._lock:
+            if not self._built:
+                started = time.perf_counter()
+                self._value = self.factory()
+                self.build_seconds = time.perf_counter() - started
+                self._built = True
+        return self._value
+
+    def ready(self):
+        return self._built
+
+    def peek(self):
+        """The value if it has been built, else None (never triggers a build)."""
+        return self._value if self._built else None
+
+
+def load_secure_config():
+    from secure_config import SecureConfig
+    return SecureConfig().load_decrypted_env()
+
+
+class Services:
+    # Subsystems warm() brings up in parallel; the rest follow from these on first use
+    WARM = ('db', 'kline_store', 'client')
+
+    def __init__(self, config_loader=load_secure_config):
+        self._lazy = {
+            'config': Lazy(lambda: self._build_config(config_loader)),
+            'gateway': Lazy(self._build_gateway),
+            'client': Lazy(self._build_client),
+            'db': Lazy(self._build_db),
+            'kline_store': Lazy(self._build_kline_store),
+            'order_executor': Lazy(self._build_order_executor),
+            'health_prober': Lazy(self._build_health_prober),
+            'engine': Lazy(self._build_engine),
+        }
+
+    config = property(lambda self: self._lazy['config'].get())
+    gateway = property(lambda self: self._lazy['gateway'].get())
+    client = property(lambda self: self._lazy['client'].get())
+    db = property(lambda self: self._lazy['db'].get())
+    kline_store = property(lambda self: self._lazy['kline_store'].get())
+    order_executor = property(lambda self: self._lazy['order_executor'].get())
+    health_prober = property(lambda self: self._lazy['health_prober'].get())
+    engine = property(lambda self: self._lazy['engine'].get())
+
+    def peek(self, name):
+        return self._lazy[name].peek()
+
+    def status(self):
+        """
+        Which subsystems are up, and how long each took to build (seconds).
+        """
+        return {name: round(lazy.build_seconds, 4) if lazy.ready() else None
+                for name, lazy in self._lazy.items()}
+
+    def warm(self, names=None):
+        """
+        Build `names` (default: WARM) concurrently in daemon threads; returns the threads.
+        Failures are logged and retried on the next use.
+        """
+        threads = []
+        for name in names or self.WARM:
+            t = threading.Thread(target=self._warm_one, args=(name,), name=f"warm-{name}", daemon=True)
+            t.start()
+            threads.append(t)
+        return threads
+
+    def _warm_one(self, name):
+        try:
+            self._lazy[name].get()
+        except Exception as e:
+            logging.error(f"Startup: building {name} failed: {e}")
+
+    # ---------- builders ----------
+
+    def _build_config(self, loader):
+        config = loader()
+        print("API MODE:", config.get('BINANCE_MODE', 'test'))
+        return config
+
+    @property
+    def mode(self):
+        return self.config.get('BINANCE_MODE', 'test')
+
+    def _build_gateway(self):
+        from trading.gateway import RequestGateway
+
+        config = self.config
+        exchange = self._build_exchange(config)
+        kwargs = {}
+        if self.mode == 'paper':
+            # The weight budget follows the replay clock, so PAPER_SPEED scales it too
+            kwargs = {'time_fn': lambda: exchange.now_ms() / 1000, 'speed': exchange.speed}
+        return RequestGateway(
+            exchange,
+            weight_per_minute=int(config.get('WEIGHT_PER_MINUTE', 1000)),
+            max_concurrent=int(config.get('GATEWAY_CONCURRENCY', 8)),
+            **kwargs
+        )
+
+    def _build_exchange(self, config):
+        mode = config.get('BINANCE_MODE', 'test')
+        if mode == 'paper':
+            # Offline replay of PAPER_CANDLES at PAPER_SPEED x real time
+            from trading.simulator import SimulatedExchange
+            logging.info(f"Using simulated exchange (paper mode) on {config['PAPER_CANDLES']}")
+            return SimulatedExchange.from_file(
+                config['PAPER_CANDLES'],
+                config.get('PAPER_SYMBOL', 'BTCUSDT'),
+                config.get('PAPER_INTERVAL', '1m'),
+                speed=float(config.get('PAPER_SPEED', 1)),
+                fee_rate=float(config.get('PAPER_FEE_RATE', 0.001))
+            )
+
+        from binance.client import Client
+
+        # ping=False: connectivity is checked by the health prober, not on construction
+        if mode == 'test':
+            logging.info("Using Binance TESTNET - No real money involved")
+            return Client(config['BINANCE_API_KEY'], config['BINANCE_SECRET_KEY'], testnet=True, ping=False)
+        logging.warning("Using Binance LIVE - Real trading mode!")
+        return Client(config['BINANCE_API_KEY'], config['BINANCE_SECRET_KEY'], ping=False)
+
+    def _build_client(self):
+        from trading.gateway import GatewayClient
+        return GatewayClient(self.gateway.client, self.gateway)
+
+    def _build_db(self):
+        from trading_data.database import TradingDatabase
+
+        config = self.config
+        return TradingDatabase(
+            write_behind=config.get('DB_WRITE_BEHIND', 'false').lower() == 'true',
+            pool_max=int(config.get('DB_POOL_MAX', 10))
+        )
+
+    def _build_kline_store(self):
+        from trading_data.kline_store import KlineStore
+        return KlineStore()
+
+    def _build_order_executor(self):
+        from trading.orders import OrderExecutor
+
+        config = self.config
+        return OrderExecutor(
+            self.client,
+            max_workers=int(config.get('ORDER_WORKERS', 4)),
+            # Paper mode always fills on the simulated exchange, so fees, slippage and balances apply
+            test_orders=config.get('ORDER_MODE', 'test') != 'live' and self.mode != 'paper'
+        )
+
+    def _build_health_prober(self):
+        from trading.health import HealthProber
+
+        config = self.config
+        return HealthProber(
+            self.client,
+            interval=int(config.get('HEALTH_PROBE_INTERVAL', 30)),
+            account_interval=int(config.get('HEALTH_ACCOUNT_PROBE_INTERVAL', 300))
+        )
+
+    def _build_engine(self):
+        from trading.engine import TradingEngine
+        from trading.shared_state import EngineLease, SharedState
+
+        # Every worker of one deployment must point at the same STATE_DIR
+        config = self.config
+        state_dir = config.get('STATE_DIR', 'data')
+        return TradingEngine(
+            SharedState(os.path.join(state_dir, 'trading_state.mmap')),
+            EngineLease(os.path.join(state_dir, 'trading_engine.lock')),
+            publish_interval=float(config.get('STATE_PUBLISH_INTERVAL', 1.0))
+        )
@@ -0,0 +1,342 @@
+# trading/scheduler.py
+"""
+Run many Trader instances from one process.
+
+All traders share one client (and so one HTTP session). Each tick every
+trader fetches its new klines concurrently on a bounded worker pool. API
+weight is enforced by the client's RequestGateway (trading/gateway.py),
+which queues the fetches behind any pending orders.
+
+With a ServerClock (trading/clock.py) the loop wakes just after candle
+boundaries in server time instead of every tick_seconds. It steps only
+the traders whose interval just closed. A trader whose closed candle is
+not available yet is retried shortly afterwards.
+
+Traders for the same symbol and interval share one IndicatorCache and are
+stepped as a group: the first one fetches the candles, the rest follow
+the cache, so strategy variants cost neither extra requests nor extra
+indicator updates.
+
+With batch_signals=True a tick first syncs every group, then decides all
+SMA crossover traders at once from one close matrix
+(strategy.batch_crossover_signals) instead of one symbol at a time.
+
+With a ShardCoordinator (trading/sharding.py) several processes share the
+symbol list: each steps only the symbols it holds a lease on. A trader
+resumes its saved position when its symbol is acquired, and its state is
+flushed to the database when the symbol is handed over.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from trading import metrics
+from trading.clock import candle_open_ms, is_boundary, next_boundary_ms
+from trading.indicators import IndicatorCache
+from trading.strategy import SMACrossoverStrategy, batch_crossover_signals, build_strategy
+from trading.stream import kline_stream_name
+from trading.trader import Trader
+
+def _number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_pair_specs(text, default_interval, default_short, default_long):
+    """
+    Parse 'BTCUSDT:1m:5:10,ETHUSDT,BTCUSDT:1m:rsi:14:30:70' into
+    (symbol, interval, strategy, params) tuples.
+    A numeric third field means the SMA crossover (short, long); otherwise it
+    names a strategy in trading.strategy.STRATEGIES followed by its parameters.
+    Missing fields fall back to the defaults.
+    """
+    specs = []
+    for item in text.split(','):
+        parts = [p.strip() for p in item.split(':')]
+        if not parts[0]:
+            continue
+        symbol = parts[0].upper()
+        interval = parts[1] if len(parts) > 1 and parts[1] else default_interval
+        if len(parts) > 2 and parts[2] and not parts[2][0].isdigit():
+            specs.append((symbol, interval, parts[2].lower(), tuple(_number(p) for p in parts[3:])))
+            continue
+        short_window = int(parts[2]) if len(parts) > 2 else default_short
+        long_window = int(parts[3]) if len(parts) > 3 else default_long
+        specs.append((symbol, interval, 'sma', (short_window, long_window)))
+    return specs
+
+
+class TradingScheduler:
+    def __init__(self, client, traders, max_workers=8, tick_seconds=30, clock=None, close_delay=0.25,
+                 close_retries=8, retry_delay=0.5, batch_signals=False, shard=None):
+        self.client = client
+        self.traders = list(traders)
+        groups = {}
+        for trader in self.traders:
+            groups.setdefault(id(trader.strategy.cache), []).append(trader)
+        self.groups = [tuple(group) for group in groups.values()]
+        self.max_workers = max_workers
+        self.tick_seconds = tick_seconds
+        self.clock = clock
+        if clock is not None:
+            # Closed candles in the KlineStore are judged by server time too
+            for trader in self.traders:
+                trader.clock = clock
+        # Seconds after a boundary before fetching, and how long to keep polling for a late candle
+        self.close_delay = close_delay
+        self.close_retries = close_retries
+        self.retry_delay = retry_delay
+        self.batch_signals = batch_signals
+        self.shard = shard
+        if shard is not None:
+            shard.on_acquire = self._on_acquire
+            shard.on_release = self._on_release
+            shard.can_release = self._can_release
+            for trader in self.traders:
+                trader.shard = shard
+        self.timing = {'ticks': 0, 'retries': 0, 'late_candles': 0, 'last_jitter_ms': None,
+                       'max_jitter_ms': 0.0, 'next_wake_ms': None}
+        self._by_stream = {}
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_specs(cls, client, specs, quantity, db=None, store=None, executor=None, **kwargs):
+        caches = {}
+        per_symbol = {}
+        for symbol, _, _, _ in specs:
+            per_symbol[symbol] = per_symbol.get(symbol, 0) + 1
+        seen = {}
+        traders = []
+        for symbol, interval, name, params in specs:
+            cache = caches.setdefault((symbol, interval), IndicatorCache())
+            strategy = build_strategy(name, params, cache)
+            # Variants of one symbol need distinct names and client order ids
+            n = seen[symbol] = seen.get(symbol, 0) + 1
+            label = symbol if per_symbol[symbol] == 1 else f"{symbol}:{interval}:{strategy.label}"
+            traders.append(Trader(client, strategy, symbol, quantity, interval, {}, db=db, store=store,
+                                  executor=executor, name=label, order_prefix='bot' if n == 1 else f'bot{n}'))
+        return cls(client, traders, **kwargs)
+
+    def status(self):
+        return {t.name: dict(t.status) for t in self.traders if self._owns(t)}
+
+    def _owns(self, trader):
+        return self.shard is None or self.shard.owns(trader.symbol)
+
+    def _owned_groups(self, groups):
+        return [g for g in groups if self._owns(g[0])]
+
+    def _on_acquire(self, symbols):
+        symbols = set(symbols)
+        for trader in self.traders:
+            if trader.symbol not in symbols:
+                continue
+            with trader.lock:
+                trader.owner = self.shard.owner
+                try:
+                    trader.restore_state()
+                except Exception as e:
+                    logging.error(f"{trader.name}: restoring state failed: {e}")
+
+    def _can_release(self, symbol):
+        # Under the lock: a step that passed the ownership check before the release finishes first
+        for trader in self.traders:
+            if trader.symbol == symbol:
+                with trader.lock:
+                    if trader.pending_order:
+                        return False
+        return True
+
+    def _on_release(self, symbols):
+        # Wait for any step in progress so its trade is saved before the next owner restores it
+        symbols = set(symbols)
+        for trader in self.traders:
+            if trader.symbol in symbols:
+                with trader.lock:
+                    trader.owner = None
+        db = next((t.db for t in self.traders if t.db is not None), None)
+        if db is not None:
+            db.flush()
+
+    def _start_shard(self):
+        if self.shard is not None:
+            self.shard.start()
+
+    def _stop_shard(self):
+        if self.shard is not None:
+            self.shard.stop()
+
+    def timing_status(self):
+        timing = dict(self.timing)
+        if self.clock is not None:
+            timing['clock'] = self.clock.stats()
+        return timing
+
+    def stop(self):
+        self._stop.set()
+
+    def _step(self, group):
+        for i, trader in enumerate(group):
+            try:
+                trader.step(trader.strategy.warmup, follow=i > 0)
+            except Exception as e:
+                logging.error(f"{trader.name}: {e}")
+
+    def _sync(self, group):
+        ready = []
+        for i, trader in enumerate(group):
+            try:
+                with trader.lock:
+                    if trader.sync(trader.strategy.warmup, follow=i > 0):
+                        ready.append(trader)
+            except Exception as e:
+                logging.error(f"{trader.name}: {e}")
+        return ready
+
+    def evaluate_batch(self, traders):
+        """
+        Decide every ready trader; SMA crossovers share one vectorized pass.
+        """
+        batch = [t for t in traders if type(t.strategy) is SMACrossoverStrategy]
+        started = time.perf_counter()
+        signals = batch_crossover_signals([t.strategy for t in batch])
+        if batch:
+            metrics.SIGNAL_SECONDS.observe(time.perf_counter() - started, 'batch')
+        decisions = [(t, (signal,)) for t, signal in zip(batch, signals)]
+        decisions += [(t, ()) for t in traders if type(t.strategy) is not SMACrossoverStrategy]
+        for trader, signal in decisions:
+            try:
+                with trader.lock:
+                    trader.evaluate(*signal)
+            except Exception as e:
+                logging.error(f"{trader.name}: {e}")
+
+    def _run_groups(self, pool, groups):
+        groups = self._owned_groups(groups)
+        if not self.batch_signals:
+            for future in [pool.submit(self._step, g) for g in groups]:
+                future.result()
+            return
+        ready = []
+        for future in [pool.submit(self._sync, g) for g in groups]:
+            ready.extend(future.result())
+        self.evaluate_batch(ready)
+
+    def tick(self, pool):
+        self._run_groups(pool, self.groups)
+
+    def run(self, trading_active_flag):
+        if self.clock is not None:
+            return self.run_aligned(trading_active_flag)
+        logging.info(f"Scheduler started for {len(self.traders)} symbols.")
+        self._stop.clear()
+        self._start_shard()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                due = time.time()
+                while trading_active_flag() and not self._stop.is_set():
+                    started = time.time()
+                    metrics.TICK_DRIFT_SECONDS.observe(max(0.0, started - due))
+                    self.tick(pool)
+                    metrics.TICK_SECONDS.observe(time.time() - started)
+                    due = started + self.tick_seconds
+                    self._stop.wait(max(0.0, due - time.time()))
+        finally:
+            self._stop_shard()
+        logging.info("Scheduler stopped.")
+
+    def run_aligned(self, trading_active_flag):
+        """
+        Wake close_delay seconds after each candle boundary (server time) and
+        step only the traders whose candle just closed.
+        """
+        intervals = {g: g[0].interval for g in self.groups}
+        logging.info(f"Candle-aligned scheduler started for {len(self.traders)} symbols.")
+        self._stop.clear()
+        self.clock.sync()
+        self._start_shard()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                # Fill every window right away rather than waiting for the first close
+                self.tick(pool)
+                while trading_active_flag() and not self._stop.is_set():
+                    self.clock.maybe_resync()
+                    now = self.clock.now_ms()
+                    boundary = min(next_boundary_ms(now, interval) for interval in set(intervals.values()))
+                    wake = boundary + self.close_delay * 1000
+                    self.timing['next_wake_ms'] = int(wake)
+                    if self._stop.wait(max(0.0, self.clock.wall_seconds(wake - now))):
+                        break
+                    jitter = self.clock.now_ms() - wake
+                    self.timing['last_jitter_ms'] = round(jitter, 1)
+                    self.timing['max_jitter_ms'] = max(self.timing['max_jitter_ms'], round(jitter, 1))
+                    metrics.TICK_DRIFT_SECONDS.observe(max(0.0, jitter / 1000))
+
+                    started = time.time()
+                    closed = [g for g, interval in intervals.items() if is_boundary(boundary, interval)]
+                    self._step_closed(pool, closed, boundary)
+                    metrics.TICK_SECONDS.observe(time.time() - started)
+                    self.timing['ticks'] += 1
+        finally:
+            self._stop_shard()
+        logging.info("Scheduler stopped.")
+
+    def _step_closed(self, pool, groups, boundary):
+        """
+        Step trader groups until each has seen the candle that closed at `boundary`,
+        retrying the ones Binance has not published yet.
+        """
+        for attempt in range(self.close_retries + 1):
+            self._run_groups(pool, groups)
+            # The candle that closed at `boundary` opened in the previous millisecond's candle
+            groups = [g for g in self._owned_groups(groups)
+                      if (g[0].last_open_time or 0) < candle_open_ms(boundary - 1, g[0].interval)]
+            if not groups or self._stop.is_set():
+                return
+            if attempt < self.close_retries:
+                self.timing['retries'] += 1
+                self._stop.wait(self.clock.wall_seconds(self.retry_delay * 1000))
+        self.timing['late_candles'] += len(groups)
+        logging.warning(f"No closed {boundary} candle yet for {', '.join(g[0].symbol for g in groups)}")
+
+    def run_stream(self, trading_active_flag, stream):
+        """
+        Streaming variant: one REST warm-up pass, then dispatch closed klines from
+        a multi-pair KlineStream to the matching trader on the worker pool.
+        """
+        self._by_stream = {}
+        for t in self.traders:
+            self._by_stream.setdefault(kline_stream_name(t.symbol, t.interval), []).append(t)
+        logging.info(f"Streaming scheduler started for {len(self.traders)} symbols.")
+        self._stop.clear()
+        self._start_shard()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                self.tick(pool)
+                stream.start()
+                try:
+                    while trading_active_flag() and not self._stop.is_set():
+                        event = stream.get_event(timeout=1.0)
+                        if event is None:
+                            continue
+                        traders = self._by_stream.get(event[0])
+                        if traders:
+                            pool.submit(self._on_kline, traders, event[1])
+                finally:
+                    stream.stop()
+        finally:
+            self._stop_shard()
+        logging.info("Streaming scheduler stopped.")
+
+    def _on_kline(self, traders, kline):
+        # The first trader updates the shared cache; the others see the kline as already seen there
+        if not self._owns(traders[0]):
+            return
+        for trader in traders:
+            try:
+                trader.on_kline(kline, trader.strategy.warmup)
+            except Exception as e:
+                logging.error(f"{trader.name}: {e}")
@@ -0,0 +1,165 @@
+# trading/sharding.py
+"""
+Split the traded symbols across processes or nodes through leases in the
+trading database.
+
+Each symbol has one row in symbol_leases holding an owner and an expiry.
+Every renew_seconds a ShardCoordinator does four things:
+- heartbeats in shard_workers, which also tells it how many workers are alive
+- extends the leases it still holds
+- gives back any above its fair share, ceil(symbols / live workers)
+- claims free or expired leases up to that share
+Claims use SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL; SQLite
+serializes writers, so a single UPDATE is already atomic there.
+
+When a worker dies its heartbeat goes stale and its leases expire after
+lease_seconds. The survivors' fair share grows, and they pick the
+symbols up on their next round. When a worker joins, the others drop to
+the new share and it claims what they release. A symbol with an order in
+flight is kept until the order settles, so its fill is saved before the
+next owner restores the position. A worker that cannot renew stops
+trading its symbols renew_seconds before its leases expire, so two
+processes never trade the same symbol. This needs host clocks
+that agree to well within that margin.
+"""
+import os
+import math
+import time
+import socket
+import logging
+import threading
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class ShardCoordinator:
+    def __init__(self, db, symbols, owner=None, lease_seconds=30, renew_seconds=10,
+                 on_acquire=None, on_release=None, can_release=None):
+        if renew_seconds * 2 > lease_seconds:
+            raise ValueError("lease_seconds must be at least twice renew_seconds")
+        self.db = db
+        self.symbols = sorted(set(symbols))
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ms = int(lease_seconds * 1000)
+        self.renew_seconds = renew_seconds
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        # can_release(symbol) is False while handing it over would lose state, e.g. an order in flight
+        self.can_release = can_release
+        # symbol -> lease expiry (epoch ms) as last written by us
+        self._owned = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'workers': 0, 'rounds': 0, 'acquired': 0, 'released': 0, 'lost': 0, 'errors': 0}
+
+    def owns(self, symbol):
+        """
+        True while we hold `symbol` with at least renew_seconds of lease left.
+        """
+        expires_at = self._owned.get(symbol)
+        return expires_at is not None and _now_ms() < expires_at - self.renew_seconds * 1000
+
+    def owned(self):
+        return sorted(s for s in list(self._owned) if self.owns(s))
+
+    def start(self):
+        self.db.register_symbols(self.symbols)
+        self._stop.clear()
+        self.sync()
+        self._thread = threading.Thread(target=self._loop, name='shard-coordinator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Hand every symbol back and leave, so the other workers take over on their next round.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            released = self._hand_over(list(self._owned))
+            # Symbols with an order in flight stay leased until the lease runs out
+            kept = sorted(self._owned)
+            self._owned.clear()
+        if kept:
+            logging.warning(f"Shard {self.owner}: leaving {', '.join(kept)} to expire, orders in flight")
+        try:
+            self.db.release_symbols(self.owner, released)
+            self.db.leave_workers(self.owner)
+        except Exception as e:
+            logging.error(f"Shard {self.owner}: releasing leases failed: {e}")
+
+    def _loop(self):
+        while not self._stop.wait(self.renew_seconds):
+            self.sync()
+
+    def sync(self):
+        """
+        One round: heartbeat, renew, shed the excess and claim up to the fair share.
+        """
+        with self._lock:
+            try:
+                self._sync()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logging.error(f"Shard {self.owner}: lease round failed: {e}")
+
+    def _sync(self):
+        now = _now_ms()
+        workers = self.db.heartbeat_worker(self.owner, now, now - self.lease_ms)
+        expires_at = now + self.lease_ms
+        held = set(self.db.renew_leases(self.owner, expires_at, now))
+        lost = [s for s in self._owned if s not in held]
+        if lost:
+            logging.warning(f"Shard {self.owner}: lost leases on {', '.join(sorted(lost))}")
+            self._drop(lost, 'lost')
+        # Held in the database but not locally, e.g. after a round that failed halfway
+        gained = [s for s in sorted(held) if s not in self._owned]
+        for symbol in held:
+            self._owned[symbol] = expires_at
+
+        share = math.ceil(len(self.symbols) / max(1, len(workers)))
+        excess = self._hand_over(sorted(held)[share:])
+        if excess:
+            self.db.release_symbols(self.owner, excess)
+
+        gained = [s for s in gained if s not in excess]
+        gained += self.db.claim_symbols(self.owner, self.symbols, max(0, share - len(held)), expires_at, now)
+        if gained:
+            for symbol in gained:
+                self._owned[symbol] = expires_at
+            self.stats['acquired'] += len(gained)
+            logging.info(f"Shard {self.owner}: acquired {', '.join(gained)}")
+            if self.on_acquire:
+                self.on_acquire(gained)
+        self.stats['workers'] = len(workers)
+        self.stats['rounds'] += 1
+
+    def _hand_over(self, symbols):
+        """
+        Stop trading `symbols` before another worker can claim them. Returns the
+        ones released; those with an order in flight are kept for a later round.
+        """
+        expires = {s: self._owned.pop(s) for s in symbols if s in self._owned}
+        # owns() is False from here on, so no new order starts on these symbols
+        kept = [s for s in expires if self.can_release is not None and not self.can_release(s)]
+        for symbol in kept:
+            self._owned[symbol] = expires[symbol]
+        released = [s for s in expires if s not in kept]
+        self._drop(released, 'released')
+        return released
+
+    def _drop(self, symbols, reason):
+        for symbol in symbols:
+            self._owned.pop(symbol, None)
+        if not symbols:
+            return
+        self.stats[reason] += len(symbols)
+        if self.on_release:
+            self.on_release(symbols)
+
+    def status(self):
+        return dict(self.stats, owner=self.owner, symbols=len(self.symbols), owned=self.owned())
@@ -0,0 +1,139 @@
+# trading/shared_state.py
+"""
+State shared between the worker processes of one host.
+
+SharedState is a fixed-size mmap'd file holding one JSON document behind
+a seqlock. Its single writer (the process holding the EngineLease) makes
+the sequence number odd, writes the payload, then stores the new even
+sequence number together with the payload length. Readers take no lock.
+They copy the payload and retry if the sequence number was odd or moved
+while they read. The last parsed document is cached by sequence number,
+so a read that finds nothing new costs one 12-byte header unpack.
+
+The header also holds a stop-request counter that any process may bump.
+The lease owner watches it, so /api/trade/stop works from any worker.
+
+EngineLease is an exclusive flock on a lock file. At most one process
+holds it, and the kernel drops it when that process exits or crashes, so
+a dead owner never blocks a new start.
+"""
+import os
+import json
+import time
+import mmap
+import fcntl
+import socket
+import struct
+
+# seq (u64), payload length (u32), stop requests (u32)
+_HEADER = struct.Struct('<QII')
+_SEQ_LEN = struct.Struct('<QI')
+_SEQ = struct.Struct('<Q')
+_STOP = struct.Struct('<I')
+_STOP_OFFSET = _SEQ_LEN.size
+
+
+class SharedState:
+    def __init__(self, path='data/trading_state.mmap', size=1 << 22, read_retries=1000):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.path = path
+        self.size = size
+        self.read_retries = read_retries
+        self._cached_seq = None
+        self._cached = None
+
+    def write(self, data):
+        """
+        Replace the document. Only one process may write at a time (the lease owner).
+        """
+        payload = json.dumps(data, default=str).encode()
+        if _HEADER.size + len(payload) > self.size:
+            raise ValueError(f"shared state of {len(payload)} bytes does not fit in {self.size}")
+        seq = _SEQ.unpack_from(self._mm, 0)[0]
+        # An odd seq means the previous writer died mid-write; keep it odd and finish over it
+        if seq % 2 == 0:
+            seq += 1
+            _SEQ.pack_into(self._mm, 0, seq)
+        self._mm[_HEADER.size:_HEADER.size + len(payload)] = payload
+        _SEQ_LEN.pack_into(self._mm, 0, seq + 1, len(payload))
+
+    def read(self):
+        """
+        The current document (None if never written or no consistent copy could be taken).
+        """
+        mm = self._mm
+        for _ in range(self.read_retries):
+            seq, length = _SEQ_LEN.unpack_from(mm, 0)
+            if seq == self._cached_seq:
+                return self._cached
+            if seq == 0:
+                return None
+            if seq % 2:
+                time.sleep(0)
+                continue
+            payload = mm[_HEADER.size:_HEADER.size + length]
+            if _SEQ.unpack_from(mm, 0)[0] != seq:
+                continue
+            self._cached, self._cached_seq = json.loads(payload), seq
+            return self._cached
+        return None
+
+    def stop_requests(self):
+        return _STOP.unpack_from(self._mm, _STOP_OFFSET)[0]
+
+    def request_stop(self):
+        _STOP.pack_into(self._mm, _STOP_OFFSET, (self.stop_requests() + 1) & 0xFFFFFFFF)
+
+
+class EngineLease:
+    def __init__(self, path='data/trading_engine.lock'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        """True when this process holds the lease."""
+        return self._fd is not None
+
+    def acquire(self):
+        """
+        Take the lease without blocking; returns False if another process holds it.
+        """
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        owner = json.dumps({'pid': os.getpid(), 'host': socket.gethostname(), 'acquired_at': time.time()})
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, owner.encode(), 0)
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        os.ftruncate(fd, 0)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def owner(self):
+        """Who last took the lease ({'pid', 'host', 'acquired_at'}), or None."""
+        try:
+            with open(self.path) as f:
+                text = f.read()
+            return json.loads(text) if text else None
+        except (OSError, ValueError):
+            return None
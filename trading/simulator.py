@@ -0,0 +1,291 @@
+# trading/simulator.py
+"""
+Deterministic simulated exchange for paper trading and offline load tests.
+
+SimulatedExchange replays recorded candles behind the subset of the
+binance Client API the bot uses: get_klines, get_server_time, ping,
+get_symbol_ticker, get_account, create_test_order, create_order and
+get_order. Time comes from a replay clock. Use speed=1000 to run 1000x
+faster than real time, or speed=0 to advance only through step() for an
+as-fast-as-possible replay. get_klines never returns candles from the
+future; the candle still forming is reported at its open price.
+Market orders fill at the current price plus optional slippage, and a
+fee is charged in the quote asset. ReplayClock lets the candle-aligned
+scheduler wake on the replay clock instead of the wall clock.
+
+Usage:
+    python -m trading.simulator data/BTCUSDT-1m.npy --symbol BTCUSDT --interval 1m --short 5 --long 10
+"""
+import json
+import time
+import threading
+
+import numpy as np
+from binance.exceptions import BinanceAPIException
+
+from trading.backtest import load_candles
+from trading.utils import interval_to_ms
+
+
+class _ErrorResponse:
+    def __init__(self, status_code, code, msg):
+        self.status_code = status_code
+        self.text = json.dumps({'code': code, 'msg': msg})
+        self.headers = {}
+
+
+def _api_error(status_code, code, msg):
+    return BinanceAPIException(_ErrorResponse(status_code, code, msg), status_code, json.dumps({'code': code, 'msg': msg}))
+
+
+class SimulatedExchange:
+    def __init__(self, candles, speed=0, fee_rate=0.001, slippage_bps=0.0, balances=None,
+                 warmup=500, quote_asset='USDT'):
+        """
+        candles: {(symbol, interval): 2D kline array or list of kline rows}.
+        The clock starts at the open of candle `warmup` of the first series, so that many are already closed.
+        """
+        self.series = {}
+        for (symbol, interval), rows in candles.items():
+            arr = np.asarray(rows, dtype=np.float64)
+            self.series[(symbol, interval)] = (arr, arr[:, 0].astype(np.int64))
+        self.speed = speed
+        self.fee_rate = fee_rate
+        self.slippage_bps = slippage_bps
+        self.quote_asset = quote_asset
+        self.balances = dict(balances or {quote_asset: 10000.0})
+        self.orders = {}
+        self.response = None
+        self._lock = threading.Lock()
+        self._next_order_id = 1
+
+        first_arr, first_times = next(iter(self.series.values()))
+        self.step_ms = min(interval_to_ms(interval) for _, interval in self.series)
+        self.start_ms = int(first_times[min(warmup, len(first_times) - 1)])
+        self.end_ms = max(int(times[-1]) + interval_to_ms(interval)
+                          for (_, interval), (_, times) in self.series.items())
+        self._now_ms = self.start_ms
+        self._wall_start = time.monotonic()
+
+    @classmethod
+    def from_file(cls, path, symbol, interval, **kwargs):
+        return cls({(symbol, interval): load_candles(path, mmap=False)}, **kwargs)
+
+    # ---------- clock ----------
+
+    def now_ms(self):
+        if self.speed:
+            elapsed = (time.monotonic() - self._wall_start) * 1000 * self.speed
+            return min(self.end_ms, self._now_ms + int(elapsed))
+        return self._now_ms
+
+    def step(self, ms=None):
+        """
+        Advance the replay clock (default: one candle of the smallest interval).
+        Returns False once the recorded data is exhausted.
+        """
+        with self._lock:
+            self._now_ms = min(self.end_ms, self.now_ms() + (ms or self.step_ms))
+            self._wall_start = time.monotonic()
+            return self._now_ms < self.end_ms
+
+    def finished(self):
+        return self.now_ms() >= self.end_ms
+
+    # ---------- market data ----------
+
+    def _series(self, symbol, interval):
+        if (symbol, interval) not in self.series:
+            raise _api_error(400, -1121, f"Invalid symbol {symbol} / interval {interval}.")
+        return self.series[(symbol, interval)]
+
+    def _forming_index(self, times, now):
+        """Index of the candle containing `now`, i.e. the last one with open_time <= now."""
+        return int(np.searchsorted(times, now, side='right')) - 1
+
+    @staticmethod
+    def _row(candle):
+        # Same layout as the REST API: integer times/counts, prices and volumes as strings
+        c = [float(x) for x in candle[:11]]
+        return [int(c[0]), repr(c[1]), repr(c[2]), repr(c[3]), repr(c[4]), repr(c[5]),
+                int(c[6]), repr(c[7]), int(c[8]), repr(c[9]), repr(c[10]), '0']
+
+    def get_server_time(self):
+        return {'serverTime': self.now_ms()}
+
+    def ping(self):
+        return {}
+
+    def get_klines(self, symbol, interval, limit=500, startTime=None, endTime=None, **kwargs):
+        arr, times = self._series(symbol, interval)
+        now = self.now_ms()
+        last = self._forming_index(times, now)
+        if last < 0:
+            return []
+        hi = last
+        if endTime is not None:
+            hi = min(hi, self._forming_index(times, endTime))
+        if startTime is not None:
+            lo = int(np.searchsorted(times, startTime, side='left'))
+            hi = min(hi, lo + limit - 1)
+        else:
+            lo = max(0, hi - limit + 1)
+        rows = [self._row(arr[i]) for i in range(lo, hi + 1)]
+        if rows and hi == last and int(arr[last][6]) >= now:
+            # Still forming: only its open price is known at this point in the replay
+            o = rows[-1][1]
+            rows[-1][2:6] = [o, o, o, '0.0']
+        return rows
+
+    def _price(self, symbol):
+        for (sym, _), (arr, times) in self.series.items():
+            if sym == symbol:
+                i = self._forming_index(times, self.now_ms())
+                if i < 0:
+                    break
+                # Price now is the open of the forming candle, i.e. the last close
+                return float(arr[i][1])
+        raise _api_error(400, -1121, f"Invalid symbol {symbol}.")
+
+    def get_symbol_ticker(self, symbol):
+        return {'symbol': symbol, 'price': repr(self._price(symbol))}
+
+    # ---------- account & orders ----------
+
+    def get_account(self, **kwargs):
+        with self._lock:
+            return {'balances': [{'asset': a, 'free': repr(v), 'locked': '0.0'} for a, v in self.balances.items()]}
+
+    def _validate(self, symbol, side, type, quantity):
+        if side not in ('BUY', 'SELL'):
+            raise _api_error(400, -1102, f"Invalid side {side}.")
+        if type != 'MARKET':
+            raise _api_error(400, -1116, f"Only MARKET orders are simulated, got {type}.")
+        if float(quantity) <= 0:
+            raise _api_error(400, -1013, "Invalid quantity.")
+        self._price(symbol)
+
+    def create_test_order(self, symbol, side, type, quantity, newClientOrderId=None, **kwargs):
+        self._validate(symbol, side, type, quantity)
+        return {}
+
+    def create_order(self, symbol, side, type, quantity, newClientOrderId=None, **kwargs):
+        self._validate(symbol, side, type, quantity)
+        quantity = float(quantity)
+        base = symbol[:-len(self.quote_asset)] if symbol.endswith(self.quote_asset) else symbol
+        with self._lock:
+            client_id = newClientOrderId or f"sim-{self._next_order_id}"
+            if client_id in self.orders:
+                raise _api_error(400, -2010, "Duplicate order sent.")
+            slip = self.slippage_bps / 10000.0
+            price = self._price(symbol) * (1 + slip if side == 'BUY' else 1 - slip)
+            quote = price * quantity
+            fee = quote * self.fee_rate
+            if side == 'BUY':
+                if self.balances.get(self.quote_asset, 0.0) < quote + fee:
+                    raise _api_error(400, -2010, "Account has insufficient balance for requested action.")
+                self.balances[self.quote_asset] -= quote + fee
+                self.balances[base] = self.balances.get(base, 0.0) + quantity
+            else:
+                if self.balances.get(base, 0.0) < quantity - 1e-12:
+                    raise _api_error(400, -2010, "Account has insufficient balance for requested action.")
+                self.balances[base] -= quantity
+                self.balances[self.quote_asset] = self.balances.get(self.quote_asset, 0.0) + quote - fee
+            order = {
+                'symbol': symbol,
+                'orderId': self._next_order_id,
+                'clientOrderId': client_id,
+                'transactTime': self.now_ms(),
+                'price': '0.0',
+                'origQty': repr(quantity),
+                'executedQty': repr(quantity),
+                'cummulativeQuoteQty': repr(quote),
+                'status': 'FILLED',
+                'type': type,
+                'side': side,
+                'fills': [{'price': repr(price), 'qty': repr(quantity), 'commission': repr(fee),
+                           'commissionAsset': self.quote_asset}]
+            }
+            self._next_order_id += 1
+            self.orders[client_id] = order
+            return dict(order)
+
+    def get_order(self, symbol, origClientOrderId=None, orderId=None, **kwargs):
+        with self._lock:
+            if origClientOrderId is not None:
+                order = self.orders.get(origClientOrderId)
+            else:
+                order = next((o for o in self.orders.values() if o['orderId'] == orderId), None)
+        if order is None or order['symbol'] != symbol:
+            raise _api_error(400, -2013, "Order does not exist.")
+        return dict(order)
+
+
+class ReplayClock:
+    """
+    ServerClock stand-in for a SimulatedExchange: candle boundaries in replay
+    time, waits scaled by the replay speed.
+    """
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def sync(self):
+        return True
+
+    def maybe_resync(self):
+        pass
+
+    def now_ms(self):
+        return self.exchange.now_ms()
+
+    def wall_seconds(self, ms):
+        if not self.exchange.speed:
+            # Stepped replay: jump straight to the wake-up time
+            self.exchange.step(max(1, int(ms)))
+            return 0.0
+        return ms / 1000 / self.exchange.speed
+
+    def stats(self):
+        return {'replay_ms': self.exchange.now_ms(), 'speed': self.exchange.speed}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from trading.orders import OrderExecutor
+    from trading.strategy import SMACrossoverStrategy
+    from trading.trader import Trader
+
+    parser = argparse.ArgumentParser(description='Replay candles through Trader on the simulated exchange')
+    parser.add_argument('path', help='Candle file (.npy, .csv or .parquet)')
+    parser.add_argument('--symbol', default='BTCUSDT')
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--short', type=int, default=5)
+    parser.add_argument('--long', type=int, default=10)
+    parser.add_argument('--quantity', type=float, default=0.001)
+    parser.add_argument('--fee', type=float, default=0.0)
+    parser.add_argument('--slippage-bps', type=float, default=0.0)
+    args = parser.parse_args()
+
+    exchange = SimulatedExchange.from_file(args.path, args.symbol, args.interval, fee_rate=args.fee,
+                                           slippage_bps=args.slippage_bps, warmup=args.long)
+    # Real create_order calls, so fills carry slippage and the exchange balances pay the fees
+    executor = OrderExecutor(exchange, max_workers=1, test_orders=False, poll_interval=0.001)
+    executor.start()
+    status = {}
+    trader = Trader(exchange, SMACrossoverStrategy(args.short, args.long), args.symbol,
+                    args.quantity, args.interval, status, executor=executor)
+    started = time.perf_counter()
+    ticks = 0
+    while exchange.step():
+        trader.step(args.long)
+        # Settle the order at this candle's price before the replay moves on
+        while trader.pending_order:
+            time.sleep(0)
+        ticks += 1
+    executor.stop()
+    elapsed = time.perf_counter() - started
+    simulated = ticks * exchange.step_ms / 1000
+    status['exchange_balances'] = exchange.balances
+    print(json.dumps(status, indent=2))
+    print(f"\n{ticks} candles in {elapsed:.2f} s ({simulated / max(elapsed, 1e-9):,.0f}x real time)")
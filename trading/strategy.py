@@ -1,24 +1,328 @@
 # trading/strategy.py
 """
-Sample trading strategy logic (SMA crossover)
+Trading strategies on top of a shared per-symbol IndicatorCache.
+
+A Strategy asks the cache for the indicators it needs when it is built and
+turns their current values into 'BUY', 'SELL' or None. Strategies built on
+the same cache share indicator instances, so running several variants on
+one candle stream costs one indicator update per candle, not one per
+strategy. Without a cache argument each strategy gets a private one.
+
+Strategy specs ('ema:9:21') are resolved through STRATEGIES by
+build_strategy().
 """
+import numpy as np
+
+from trading.indicators import IndicatorCache
 
 def calculate_sma(data, window):
     if len(data) < window:
         return None
     return sum(data[-window:]) / window
 
-class SMACrossoverStrategy:
-    def __init__(self, short_window=5, long_window=10):
-        self.short_window = short_window
-        self.long_window = long_window
+def crossover_masks(closes, short_windows, long_windows):
+    """
+    SMA crossover for many symbols in one vectorized pass.
+    `closes` is a (symbols x width) matrix, newest close in the last column;
+    rows with fewer candles are NaN-padded on the left. Windows are scalars
+    or one per row. Returns (buy, sell) boolean masks; rows without enough
+    candles for their long window are False in both.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    rows, width = closes.shape
+    short = np.broadcast_to(np.asarray(short_windows, dtype=np.intp), (rows,))
+    long = np.broadcast_to(np.asarray(long_windows, dtype=np.intp), (rows,))
+    if width == 0 or short.max(initial=0) > width or long.max(initial=0) > width:
+        raise ValueError(f"windows must fit in the {width} columns of the close matrix")
+    missing = np.isnan(closes)
+    csum = np.zeros((rows, width + 1))
+    np.cumsum(np.where(missing, 0.0, closes), axis=1, out=csum[:, 1:])
+    index = np.arange(rows)
+    total = csum[:, width]
+    sma_short = (total - csum[index, width - short]) / short
+    sma_long = (total - csum[index, width - long]) / long
+    valid = (width - missing.sum(axis=1)) >= np.maximum(short, long)
+    return valid & (sma_short > sma_long), valid & (sma_short < sma_long)
+
+def batch_crossover_signals(strategies):
+    """
+    Signals for a list of SMACrossoverStrategy instances (one per symbol)
+    from a close matrix built out of their candle buffers.
+    Returns one of 'BUY', 'SELL' or None per strategy.
+    """
+    if not strategies:
+        return []
+    # A misconfigured pair may have short > long; the matrix must fit both
+    width = max(max(s.short_window, s.long_window) for s in strategies)
+    closes = np.full((len(strategies), width), np.nan)
+    for row, strategy in zip(closes, strategies):
+        recent = strategy.cache.candles.closes(width)
+        if len(recent):
+            row[width - len(recent):] = recent
+    buy, sell = crossover_masks(closes, [s.short_window for s in strategies], [s.long_window for s in strategies])
+    return ['BUY' if b else 'SELL' if s else None for b, s in zip(buy.tolist(), sell.tolist())]
+
+class Strategy:
+    name = None
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else IndicatorCache()
+        self.params = ()
+
+    @property
+    def label(self):
+        return ':'.join([self.name] + [f"{p:g}" for p in self.params])
+
+    @property
+    def warmup(self):
+        """
+        Candles to fetch before trading: enough for every indicator in the cache,
+        so the other strategies sharing it are warmed up too.
+        """
+        return self.cache.warmup
+
+    def update(self, close):
+        """
+        Feed one closed candle by its close only (no high/low, no de-duplication).
+        """
+        self.cache.update(close, close, close)
+
+    def update_kline(self, kline):
+        """
+        Feed one closed Binance kline; a kline another strategy already pushed is ignored.
+        """
+        self.cache.update_kline(kline)
+
+    def reset(self):
+        self.cache.reset()
+
+    def ready(self):
+        return self.signal_inputs() is not None
+
+    def signal_inputs(self):
+        """
+        Current indicator values the signal needs, or None while any is still warming up.
+        """
+        raise NotImplementedError
+
+    def decide(self, inputs):
+        raise NotImplementedError
+
+    def signal(self):
+        """
+        Return 'BUY', 'SELL' or None.
+        """
+        inputs = self.signal_inputs()
+        if inputs is None:
+            return None
+        return self.decide(inputs)
+
+    def smas(self):
+        """
+        Two indicator levels stored with each trade (the sma_short/sma_long columns).
+        """
+        return None, None
+
+    def should_buy(self):
+        return self.signal() == 'BUY'
+
+    def should_sell(self):
+        return self.signal() == 'SELL'
+
+
+class _CrossoverStrategy(Strategy):
+    """
+    Long while the fast average is above the slow one.
+    """
+    average = None
+
+    def __init__(self, short_window, long_window, cache=None):
+        super().__init__(cache)
+        self.short_window = int(short_window)
+        self.long_window = int(long_window)
+        self.params = (self.short_window, self.long_window)
+        self.fast = self.cache.get(self.average, self.short_window)
+        self.slow = self.cache.get(self.average, self.long_window)
+
+    def signal_inputs(self):
+        if self.fast.value is None or self.slow.value is None:
+            return None
+        return self.fast.value, self.slow.value
+
+    def decide(self, inputs):
+        fast, slow = inputs
+        if fast > slow:
+            return 'BUY'
+        if fast < slow:
+            return 'SELL'
+        return None
+
+    def smas(self):
+        return self.fast.value, self.slow.value
+
+
+class SMACrossoverStrategy(_CrossoverStrategy):
+    name = 'sma'
+    average = 'sma'
+
+    def __init__(self, short_window=5, long_window=10, cache=None):
+        super().__init__(short_window, long_window, cache)
+
+    def smas(self, closes=None):
+        """
+        Return (sma_short, sma_long), from the cache or from a list of closes.
+        """
+        if closes is None:
+            return self.fast.value, self.slow.value
+        return calculate_sma(closes, self.short_window), calculate_sma(closes, self.long_window)
+
+    def signal(self, closes=None):
+        """
+        Return 'BUY', 'SELL' or None, computing both SMAs once per decision.
+        """
+        sma_short, sma_long = self.smas(closes)
+        if not (sma_short and sma_long):
+            return None
+        return self.decide((sma_short, sma_long))
+
+    def should_buy(self, closes=None):
+        return self.signal(closes) == 'BUY'
+
+    def should_sell(self, closes=None):
+        return self.signal(closes) == 'SELL'
+
+
+class EMACrossoverStrategy(_CrossoverStrategy):
+    name = 'ema'
+    average = 'ema'
+
+    def __init__(self, fast=12, slow=26, cache=None):
+        super().__init__(fast, slow, cache)
+
+
+class RSIStrategy(Strategy):
+    """
+    Mean reversion: buy when RSI drops below `oversold`, sell above `overbought`.
+    """
+    name = 'rsi'
+
+    def __init__(self, period=14, oversold=30, overbought=70, cache=None):
+        super().__init__(cache)
+        self.oversold = oversold
+        self.overbought = overbought
+        self.params = (period, oversold, overbought)
+        self.rsi = self.cache.get('rsi', int(period))
+
+    def signal_inputs(self):
+        return self.rsi.value
+
+    def decide(self, rsi):
+        if rsi < self.oversold:
+            return 'BUY'
+        if rsi > self.overbought:
+            return 'SELL'
+        return None
+
+    def smas(self):
+        return self.rsi.value, None
+
+
+class MACDStrategy(Strategy):
+    """
+    Long while the MACD line is above its signal line.
+    """
+    name = 'macd'
+
+    def __init__(self, fast=12, slow=26, signal=9, cache=None):
+        super().__init__(cache)
+        self.params = (fast, slow, signal)
+        self.macd = self.cache.get('macd', int(fast), int(slow), int(signal))
+
+    def signal_inputs(self):
+        return self.macd.value
+
+    def decide(self, value):
+        histogram = value[2]
+        if histogram > 0:
+            return 'BUY'
+        if histogram < 0:
+            return 'SELL'
+        return None
+
+    def smas(self):
+        if self.macd.value is None:
+            return None, None
+        return self.macd.value[0], self.macd.value[1]
+
+
+class BollingerStrategy(Strategy):
+    """
+    Mean reversion: buy a close below the lower band, sell a close above the upper band.
+    """
+    name = 'bollinger'
+
+    def __init__(self, period=20, width=2.0, cache=None):
+        super().__init__(cache)
+        self.params = (period, width)
+        self.bands = self.cache.get('bollinger', int(period), float(width))
+
+    def signal_inputs(self):
+        if self.bands.value is None:
+            return None
+        return self.cache.close, self.bands.value
+
+    def decide(self, inputs):
+        close, (middle, upper, lower) = inputs
+        if close < lower:
+            return 'BUY'
+        if close > upper:
+            return 'SELL'
+        return None
+
+    def smas(self):
+        if self.bands.value is None:
+            return None, None
+        return self.bands.value[2], self.bands.value[1]
+
+
+class KeltnerStrategy(Strategy):
+    """
+    Breakout: buy a close above EMA + multiplier * ATR, sell a close below EMA - multiplier * ATR.
+    """
+    name = 'keltner'
+
+    def __init__(self, period=20, atr_period=10, multiplier=2.0, cache=None):
+        super().__init__(cache)
+        self.multiplier = float(multiplier)
+        self.params = (period, atr_period, multiplier)
+        self.ema = self.cache.get('ema', int(period))
+        self.atr = self.cache.get('atr', int(atr_period))
+
+    def signal_inputs(self):
+        if self.ema.value is None or self.atr.value is None:
+            return None
+        return self.cache.close, self.ema.value, self.atr.value
+
+    def decide(self, inputs):
+        close, ema, atr = inputs
+        if close > ema + self.multiplier * atr:
+            return 'BUY'
+        if close < ema - self.multiplier * atr:
+            return 'SELL'
+        return None
+
+    def smas(self):
+        return self.ema.value, self.atr.value
+
+
+STRATEGIES = {cls.name: cls for cls in (SMACrossoverStrategy, EMACrossoverStrategy, RSIStrategy, MACDStrategy,
+                                        BollingerStrategy, KeltnerStrategy)}
 
-    def should_buy(self, closes):
-        sma_short = calculate_sma(closes, self.short_window)
-        sma_long = calculate_sma(closes, self.long_window)
-        return sma_short and sma_long and sma_short > sma_long
 
-    def should_sell(self, closes):
-        sma_short = calculate_sma(closes, self.short_window)
-        sma_long = calculate_sma(closes, self.long_window)
-        return sma_short and sma_long and sma_short < sma_long
+def build_strategy(name, params=(), cache=None):
+    """
+    Build a strategy by registry name, e.g. build_strategy('rsi', (14, 25, 75), cache).
+    """
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {name!r}, expected one of {', '.join(STRATEGIES)}")
+    return STRATEGIES[name](*params, cache=cache)
@@ -0,0 +1,153 @@
+# trading/stream.py
+"""
+Closed-kline streaming over the Binance websocket API.
+
+KlineStream reads kline events from a transport in a background thread and
+queues only closed candles, converted to the same row layout as
+client.get_klines so the Trader can handle both sources the same way.
+"""
+import json
+import logging
+import queue
+import threading
+
+from trading import metrics
+
+STREAM_URLS = {
+    'test': 'wss://stream.testnet.binance.vision/ws',
+    'live': 'wss://stream.binance.com:9443/ws',
+}
+
+
+class WebSocketTransport:
+    """
+    Default transport built on websocket-client.
+    Point base_url at a local server (e.g. ws://127.0.0.1:8765/ws) to run against a fake stream.
+    """
+    def __init__(self, base_url=STREAM_URLS['live'], timeout=5):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.ws = None
+
+    def connect(self, streams):
+        import websocket
+        if len(streams) == 1:
+            self.ws = websocket.create_connection(f"{self.base_url}/{streams[0]}", timeout=self.timeout)
+            return
+        # Many streams share one connection through a SUBSCRIBE request
+        self.ws = websocket.create_connection(self.base_url, timeout=self.timeout)
+        self.ws.send(json.dumps({'method': 'SUBSCRIBE', 'params': list(streams), 'id': 1}))
+
+    def recv(self):
+        """
+        Return the next text message, or None if nothing arrived before the timeout.
+        """
+        import websocket
+        try:
+            return self.ws.recv()
+        except websocket.WebSocketTimeoutException:
+            return None
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+            self.ws = None
+
+
+def kline_stream_name(symbol, interval):
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+def parse_kline_event(message):
+    """
+    Convert a kline event into (stream_name, row, is_closed), where row matches
+    the get_klines layout. Returns (None, None, False) for anything that is not a kline.
+    """
+    data = json.loads(message) if isinstance(message, (str, bytes)) else message
+    if 'data' in data:
+        # combined stream payload: {"stream": ..., "data": {...}}
+        data = data['data']
+    if data.get('e') != 'kline':
+        return None, None, False
+    k = data['k']
+    row = [k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T'], k['q'], k['n'], k['V'], k['Q'], k.get('B', '0')]
+    return kline_stream_name(data['s'], k['i']), row, bool(k['x'])
+
+
+class KlineStream:
+    """
+    Stream closed klines for one symbol, or for several (symbol, interval)
+    pairs over a single connection by passing `pairs`.
+    """
+    def __init__(self, symbol=None, interval=None, transport=None, max_queue=1000, max_backoff=60, pairs=None):
+        pairs = pairs or [(symbol, interval)]
+        self.streams = [kline_stream_name(sym, ivl) for sym, ivl in pairs]
+        self.transport = transport or WebSocketTransport()
+        self.stream_name = '/'.join(self.streams)
+        self.max_backoff = max_backoff
+        self.queue = queue.Queue(maxsize=max_queue)
+        metrics.QUEUE_DEPTH.set_function(self.queue.qsize, 'kline_stream')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=getattr(self.transport, 'timeout', 5) + 1)
+            self._thread = None
+
+    def get(self, timeout=1.0):
+        """
+        Return the next closed kline row, or None if none closed within `timeout`.
+        """
+        event = self.get_event(timeout)
+        return event[1] if event else None
+
+    def get_event(self, timeout=1.0):
+        """
+        Return the next (stream_name, row) for a closed kline, or None on timeout.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self.transport.connect(self.streams)
+                logging.info(f"Kline stream connected: {self.stream_name}")
+                backoff = 1
+                while not self._stop.is_set():
+                    message = self.transport.recv()
+                    if message is None:
+                        continue
+                    name, row, is_closed = parse_kline_event(message)
+                    if row is None or not is_closed:
+                        continue
+                    try:
+                        self.queue.put_nowait((name, row))
+                    except queue.Full:
+                        # Drop the oldest candle; the Trader refills gaps over REST
+                        self.queue.get_nowait()
+                        self.queue.put_nowait((name, row))
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logging.warning(f"Kline stream {self.stream_name} error: {e}, reconnecting in {backoff}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                try:
+                    self.transport.close()
+                except Exception:
+                    pass
+        logging.info(f"Kline stream closed: {self.stream_name}")
@@ -4,67 +4,301 @@ Trader class to manage trading loop and Binance API interaction
 """
 import time
 import logging
+import threading
 from binance.enums import *
 from binance.exceptions import BinanceAPIException
+from trading import metrics
+from trading.events import BUS
+from trading.clock import seconds_until_close
+from trading.utils import interval_to_ms, closed_klines
+from trading.orders import OrderRequest, make_client_order_id
+
+# evaluate() default: no batch signal given, ask the strategy (None is a valid "no signal" result)
+_COMPUTE = object()
+
 
 class Trader:
-    def __init__(self, client, strategy, symbol, quantity, interval, status_dict):
+    def __init__(self, client, strategy, symbol, quantity, interval, status_dict, db=None, balance=1000.0,
+                 store=None, executor=None, name=None, order_prefix='bot'):
         self.client = client
         self.strategy = strategy
         self.symbol = symbol
+        # Distinguishes several strategy variants trading the same symbol
+        self.name = name or symbol
+        self.order_prefix = order_prefix
+        # Process that trades this symbol when symbols are sharded (trading/sharding.py)
+        self.owner = None
+        self.shard = None
+        # Server clock (trading/clock.py) set by the scheduler; None means the local clock
+        self.clock = None
         self.quantity = quantity
         self.interval = interval
         self.status = status_dict
         self.position = None
         self.entry_price = 0.0
         self.pnl = 0.0
+        self.balance = balance
+        self.db = db
+        self.store = store
+        self.executor = executor
+        self.pending_order = None
+        self.last_open_time = None
+        self.last_price = None
+        self._published = None
+        # Serializes candle pushes and decisions when a scheduler drives this Trader
+        self.lock = threading.Lock()
 
     def get_klines(self, limit):
+        """
+        Closes of the last `limit` closed candles: a read-only view into the
+        strategy's CandleBuffer after appending only the candles not seen yet.
+        """
+        self.sync_candles(limit)
+        return self.strategy.cache.candles.closes(limit)
+
+    def sync_candles(self, limit):
+        """
+        Fetch recent klines and push the closed ones we have not seen yet.
+        With a KlineStore, only the missing candles go to Binance and the rest is read locally.
+        """
+        fetch_limit = limit + 1 if self.last_open_time is None else 3
+        started = time.perf_counter()
         try:
-            klines = self.client.get_klines(symbol=self.symbol, interval=self.interval, limit=limit)
-            closes = [float(k[4]) for k in klines]
-            return closes
+            if self.store is not None:
+                now_ms = int(self.clock.now_ms()) if self.clock is not None else None
+                self.store.sync(self.client, self.symbol, self.interval, lookback=limit, now_ms=now_ms)
+                # Once warmed up, read only the rows after the last candle pushed
+                start_time = self.last_open_time + 1 if self.last_open_time is not None else None
+                klines = self.store.get_klines(self.symbol, self.interval, limit=limit, start_time=start_time)
+            else:
+                klines = closed_klines(self.client.get_klines(symbol=self.symbol, interval=self.interval,
+                                                              limit=fetch_limit))
         except Exception as e:
             logging.error(f"Error fetching klines: {e}")
-            return []
+            return 0
+        metrics.KLINE_FETCH_SECONDS.observe(time.perf_counter() - started, self.symbol)
+        return self.push_klines(klines, limit)
+
+    def push_klines(self, klines, limit):
+        """
+        Push closed klines into the strategy, skipping ones already seen.
+        Returns the number of new candles; refills the whole window over REST after a gap.
+        """
+        if self.last_open_time is not None:
+            klines = [k for k in klines if k[0] > self.last_open_time]
+            if klines and klines[0][0] - self.last_open_time > interval_to_ms(self.interval):
+                logging.warning(f"Gap in {self.symbol} klines, refilling {limit} candles")
+                self.strategy.reset()
+                self.last_open_time = None
+                return self.sync_candles(limit)
+        for k in klines:
+            self.strategy.update_kline(k)
+            self.last_open_time = k[0]
+            self.last_price = float(k[4])
+        return len(klines)
+
+    def follow_cache(self):
+        """
+        Catch up from the strategy's shared IndicatorCache, which another Trader
+        on the same symbol/interval has already fed this tick.
+        """
+        cache = self.strategy.cache
+        if cache.last_open_time is None or cache.last_open_time == self.last_open_time:
+            return 0
+        self.last_open_time = cache.last_open_time
+        self.last_price = cache.close
+        return 1
+
+    def evaluate(self, signal=_COMPUTE):
+        """
+        Act on the strategy's signal, or on `signal` when it was already computed in a batch.
+        """
+        if self.pending_order:
+            # Wait for the in-flight order to fill before acting on new signals
+            self.update_status()
+            return
+        if self.shard is not None and not self.shard.owns(self.symbol):
+            # Released while this step was queued; the new owner decides from here on
+            return
+        if signal is _COMPUTE:
+            started = time.perf_counter()
+            signal = self.strategy.signal()
+            metrics.SIGNAL_SECONDS.observe(time.perf_counter() - started, self.symbol)
+        if signal == 'BUY' and not self.position:
+            self.place_order(SIDE_BUY, self.last_price)
+        elif signal == 'SELL' and self.position == 'LONG':
+            self.place_order(SIDE_SELL, self.last_price)
+        self.update_status()
+
+    def place_order(self, side, price):
+        """
+        Send a market order tagged with a deterministic client order id.
+        With an OrderExecutor the order is queued and the fill arrives later via on_fill.
+        """
+        client_order_id = make_client_order_id(self.symbol, side, self.last_open_time, self.order_prefix)
+        smas = self.strategy.smas()
+        if self.executor is None:
+            started = time.perf_counter()
+            self.client.create_test_order(
+                symbol=self.symbol,
+                side=side,
+                type=ORDER_TYPE_MARKET,
+                quantity=self.quantity,
+                newClientOrderId=client_order_id
+            )
+            metrics.ORDER_ROUND_TRIP_SECONDS.observe(time.perf_counter() - started, side)
+            metrics.ORDERS.inc(side, 'FILLED')
+            self.on_fill(side, price, client_order_id, smas)
+            return
+        self.pending_order = client_order_id
+        request = OrderRequest(self.symbol, side, self.quantity, client_order_id, price_hint=price)
+        if not self.executor.submit(request, lambda fill: self._async_fill(fill, smas), self._async_error):
+            self.pending_order = None
+
+    def _async_fill(self, fill, smas):
+        with self.lock:
+            self.pending_order = None
+            self.on_fill(fill.side, fill.price, fill.client_order_id, smas)
+            self.update_status()
+
+    def _async_error(self, request, error):
+        with self.lock:
+            self.pending_order = None
+            logging.error(f"{request.side} {self.symbol} order {request.client_order_id} failed: {error}")
+            self.update_status()
+
+    def on_fill(self, side, price, order_id=None, smas=None):
+        pnl = None
+        if side == SIDE_BUY:
+            self.position = 'LONG'
+            self.entry_price = price
+            self.record_trade('BUY', price, order_id=order_id, smas=smas)
+            logging.info(f"BUY {self.symbol} at {self.entry_price}")
+        else:
+            pnl = (price - self.entry_price) * self.quantity
+            self.pnl += pnl
+            self.balance += pnl
+            self.position = None
+            self.entry_price = 0.0
+            self.record_trade('SELL', price, pnl, order_id=order_id, smas=smas)
+            logging.info(f"SELL {self.symbol} at {price} | PnL: {self.pnl:.2f}")
+        BUS.publish('trade', {'name': self.name, 'symbol': self.symbol, 'side': side, 'price': price,
+                              'quantity': self.quantity, 'pnl': pnl, 'total_pnl': self.pnl,
+                              'balance': self.balance, 'order_id': order_id})
+
+    def record_trade(self, action, price, pnl=None, order_id=None, smas=None):
+        if self.db is None:
+            return
+        sma_short, sma_long = smas or self.strategy.smas()
+        trade = {
+            'action': action,
+            'symbol': self.symbol,
+            'price': price,
+            'quantity': self.quantity,
+            'balance': self.balance,
+            'sma_short': sma_short,
+            'sma_long': sma_long,
+            'order_id': order_id,
+            'name': self.name
+        }
+        if pnl is not None:
+            trade['pnl'] = pnl
+        self.db.insert_trade(trade)
+        self.db.save_state(self.position, self.entry_price, self.balance, name=self.name, symbol=self.symbol,
+                           owner=self.owner, pnl=self.pnl)
+
+    def restore_state(self):
+        """
+        Resume position, entry price, balance and PnL from the last saved state of this trader.
+        """
+        if self.db is None:
+            return False
+        state = self.db.restore_state(self.name)
+        if state is None:
+            return False
+        self.position = state['position']
+        self.entry_price = state['entry_price']
+        self.balance = state['balance']
+        self.pnl = state['pnl']
+        logging.info(f"{self.name}: resumed {self.position or 'flat'} from {state['owner'] or 'previous run'}")
+        return True
+
+    def update_status(self):
+        self.status['symbol'] = self.symbol
+        self.status['strategy'] = self.strategy.label
+        self.status['interval'] = self.interval
+        self.status['positions'] = [self.position] if self.position else []
+        self.status['pnl'] = self.pnl
+        self.status['balance'] = self.balance
+        self.status['last_price'] = self.last_price
+        self.status['pending_order'] = self.pending_order
+        # Push to /api/trade/stream only when something a dashboard shows has changed
+        snapshot = (self.position, self.pnl, self.balance, self.last_price, self.pending_order)
+        if snapshot != self._published:
+            self._published = snapshot
+            BUS.publish('status', dict(self.status, name=self.name))
+
+    def step(self, long_window, follow=False):
+        """
+        One polling iteration: sync new closed candles and act on the signal.
+        With follow=True the candles come from the shared cache instead of Binance.
+        Returns False while the strategy does not have enough candles yet.
+        """
+        with self.lock:
+            if not self.sync(long_window, follow):
+                return False
+            self.evaluate()
+            return True
+
+    def sync(self, long_window, follow=False):
+        """
+        The fetch half of step(): bring the candles up to date and report whether the strategy is ready.
+        """
+        if follow:
+            self.follow_cache()
+        else:
+            self.sync_candles(long_window)
+        return self.strategy.ready()
+
+    def on_kline(self, kline, long_window):
+        """
+        Handle one closed kline pushed from a stream.
+        """
+        with self.lock:
+            if self.push_klines([kline], long_window) and self.strategy.ready():
+                self.evaluate()
 
     def run(self, trading_active_flag, short_window, long_window):
         logging.info("Trading loop started.")
         while trading_active_flag():
             try:
-                closes = self.get_klines(long_window + 1)
-                if len(closes) < long_window:
-                    time.sleep(10)
-                    continue
-                if self.strategy.should_buy(closes) and not self.position:
-                    # BUY
-                    self.client.create_test_order(
-                        symbol=self.symbol,
-                        side=SIDE_BUY,
-                        type=ORDER_TYPE_MARKET,
-                        quantity=self.quantity
-                    )
-                    self.position = 'LONG'
-                    self.entry_price = closes[-1]
-                    logging.info(f"BUY {self.symbol} at {self.entry_price}")
-                elif self.strategy.should_sell(closes) and self.position == 'LONG':
-                    # SELL
-                    self.client.create_test_order(
-                        symbol=self.symbol,
-                        side=SIDE_SELL,
-                        type=ORDER_TYPE_MARKET,
-                        quantity=self.quantity
-                    )
-                    pnl = (closes[-1] - self.entry_price) * self.quantity
-                    self.pnl += pnl
-                    logging.info(f"SELL {self.symbol} at {closes[-1]} | PnL: {self.pnl:.2f}")
-                    self.position = None
-                    self.entry_price = 0.0
-                self.status['positions'] = [self.position] if self.position else []
-                self.status['pnl'] = self.pnl
+                self.step(long_window)
             except BinanceAPIException as e:
                 logging.error(f"Binance API error: {e}")
             except Exception as e:
                 logging.error(f"Unexpected error: {e}")
-            time.sleep(30)
+            # Wake just after the next candle close instead of on a fixed period
+            time.sleep(seconds_until_close(self.interval))
         logging.info("Trading loop stopped.")
+
+    def run_stream(self, trading_active_flag, long_window, stream):
+        """
+        Streaming variant of run(): warm up over REST once, then act on each
+        closed kline pushed by `stream` (a trading.stream.KlineStream).
+        """
+        logging.info(f"Streaming trading loop started for {self.symbol}.")
+        self.sync_candles(long_window)
+        stream.start()
+        try:
+            while trading_active_flag():
+                try:
+                    kline = stream.get(timeout=1.0)
+                    if kline is not None:
+                        self.on_kline(kline, long_window)
+                except BinanceAPIException as e:
+                    logging.error(f"Binance API error: {e}")
+                except Exception as e:
+                    logging.error(f"Unexpected error: {e}")
+        finally:
+            stream.stop()
+        logging.info("Streaming trading loop stopped.")
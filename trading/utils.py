@@ -3,20 +3,30 @@
 Utility functions for the trading bot
 """
 import logging
+import random
 import time
 
-def retry_on_exception(func, retries=3, delay=5, exceptions=(Exception,)):
+def backoff_delay(attempt, base=1.0, max_delay=60.0):
     """
-    Retry a function call with specified retries and delay on given exceptions.
+    Jittered exponential backoff ("full jitter"): a random delay in [0, base * 2**attempt], capped.
+    """
+    return random.uniform(0, min(max_delay, base * (2 ** attempt)))
+
+def retry_on_exception(func, retries=3, delay=5, exceptions=(Exception,), max_delay=60):
+    """
+    Retry a function call on given exceptions with jittered exponential backoff,
+    using `delay` as the base delay.
     """
     for attempt in range(retries):
         try:
             return func()
         except exceptions as e:
-            logging.warning(f"Attempt {attempt+1} failed: {e}")
             if attempt < retries - 1:
-                time.sleep(delay)
+                wait = backoff_delay(attempt, delay, max_delay)
+                logging.warning(f"Attempt {attempt+1} failed: {e}, retrying in {wait:.1f}s")
+                time.sleep(wait)
             else:
+                logging.warning(f"Attempt {attempt+1} failed: {e}")
                 raise
 
 def format_pnl(pnl):
@@ -24,3 +34,34 @@ def format_pnl(pnl):
     Format profit and loss as a string with 2 decimals and sign.
     """
     return f"{pnl:+.2f}"
+
+
+_INTERVAL_UNIT_MS = {
+    's': 1000,
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+    # Months vary in length; this is the longest (use trading.clock for month boundaries)
+    'M': 31 * 24 * 60 * 60 * 1000,
+}
+
+def interval_to_ms(interval):
+    """
+    Convert a Binance kline interval such as '1m' or '4h' to milliseconds
+    (an upper bound for '1M').
+    """
+    unit = interval[-1]
+    if unit not in _INTERVAL_UNIT_MS:
+        raise ValueError(f"Unsupported kline interval: {interval}")
+    return int(interval[:-1]) * _INTERVAL_UNIT_MS[unit]
+
+def closed_klines(klines, last_open_time=None):
+    """
+    Return the closed klines newer than `last_open_time`.
+    The last row returned by get_klines is the candle that is still forming.
+    """
+    closed = klines[:-1]
+    if last_open_time is None:
+        return list(closed)
+    return [k for k in closed if k[0] > last_open_time]
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+TRADE_COLUMNS = ['id', 'timestamp', 'action', 'symbol', 'price', 'quantity', 'pnl', 'name']
+
+
+def load_trades_frame(db, symbol=None):
+    """從 TradingDatabase 讀出配對需要的欄位"""
+    placeholder = '%s' if db.db_type == 'postgres' else '?'
+    query = f"SELECT {', '.join(TRADE_COLUMNS)} FROM trades"
+    params = ()
+    if symbol:
+        query += f' WHERE symbol = {placeholder}'
+        params = (symbol,)
+    with db.connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def pair_trades(df):
+    """
+    把 BUY/SELL 紀錄配成來回交易（向量化，依 trader 名稱分開處理，同一 symbol 的策略變體各自配對）。
+    連續的 BUY 只取第一筆為進場（之後的 BUY 視為加碼重複訊號忽略），
+    連續的 SELL 只取第一筆為出場；沒有持倉時的 SELL 與最後未平倉的 BUY 不列入。
+    回傳每筆來回一列：name, symbol, entry_id, exit_id, entry_time, exit_time, hold_minutes,
+    entry_price, exit_price, quantity, pnl, return_pct, entry_hour, exit_hour, exit_dow
+    """
+    columns = ['name', 'symbol', 'entry_id', 'exit_id', 'entry_time', 'exit_time', 'hold_minutes',
+               'entry_price', 'exit_price', 'quantity', 'pnl', 'return_pct',
+               'entry_hour', 'exit_hour', 'exit_dow']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    # name 欄位加入前的舊交易以 symbol 為名稱
+    df = df.assign(name=df['name'].fillna(df['symbol']) if 'name' in df else df['symbol'])
+    # id 與寫入順序一致；timestamp 可能是 ISO 字串（SQLite）
+    df = df.sort_values(['name', 'id'], kind='stable')
+    timestamps = pd.to_datetime(df['timestamp'], format='ISO8601').to_numpy()
+    name = df['name'].to_numpy()
+    action = df['action'].to_numpy()
+
+    # 每段連續相同 action 的第一筆（換 trader 也算新的一段）
+    new_name = np.ones(len(df), dtype=bool)
+    new_name[1:] = name[1:] != name[:-1]
+    run_start = new_name.copy()
+    run_start[1:] |= action[1:] != action[:-1]
+    # 各 trader 開頭的 SELL 沒有對應進場
+    keep = run_start & ~(new_name & (action == 'SELL'))
+    runs = df[keep]
+    times = timestamps[keep]
+
+    # 過濾後同一 trader 內 BUY/SELL 嚴格交錯且以 BUY 開頭，SELL 的前一列就是它的進場
+    is_exit = (runs['action'] == 'SELL').to_numpy()
+    exit_idx = np.flatnonzero(is_exit)
+    entries = runs.iloc[exit_idx - 1]
+    exits = runs.iloc[exit_idx]
+
+    entry_time = times[exit_idx - 1]
+    exit_time = times[exit_idx]
+    entry_price = entries['price'].to_numpy(dtype=np.float64)
+    exit_price = exits['price'].to_numpy(dtype=np.float64)
+    quantity = exits['quantity'].to_numpy(dtype=np.float64)
+    recorded = exits['pnl'].to_numpy(dtype=np.float64)
+    # 舊資料可能沒有寫 pnl，用價差補
+    pnl = np.where(np.isnan(recorded), (exit_price - entry_price) * quantity, recorded)
+
+    pairs = pd.DataFrame({
+        'name': exits['name'].to_numpy(),
+        'symbol': exits['symbol'].to_numpy(),
+        'entry_id': entries['id'].to_numpy(),
+        'exit_id': exits['id'].to_numpy(),
+        'entry_time': entry_time,
+        'exit_time': exit_time,
+        'hold_minutes': (exit_time - entry_time) / np.timedelta64(1, 'm'),
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'quantity': quantity,
+        'pnl': pnl,
+        'return_pct': (exit_price - entry_price) / entry_price * 100,
+    })
+    pairs['entry_hour'] = pairs['entry_time'].dt.hour
+    pairs['exit_hour'] = pairs['exit_time'].dt.hour
+    pairs['exit_dow'] = pairs['exit_time'].dt.dayofweek
+    return pairs.sort_values('exit_time', kind='stable').reset_index(drop=True)
+
+
+def _performance(pairs):
+    pnl = pairs['pnl'].to_numpy(dtype=np.float64)
+    n = len(pnl)
+    if n == 0:
+        return {'total_trades': 0, 'winning_trades': 0, 'losing_trades': 0, 'win_rate': 0,
+                'total_pnl': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0, 'profit_factor': None,
+                'max_drawdown': 0.0, 'sharpe_ratio': 0.0, 'avg_hold_minutes': 0.0,
+                'max_hold_minutes': 0.0, 'min_hold_minutes': 0.0}
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl < 0]
+    gross_loss = -losses.sum()
+    equity = np.cumsum(pnl)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+    std = pnl.std(ddof=1) if n > 1 else 0.0
+    hold = pairs['hold_minutes'].to_numpy(dtype=np.float64)
+    return {
+        'total_trades': int(n),
+        'winning_trades': int(len(wins)),
+        'losing_trades': int(len(losses)),
+        'win_rate': round(len(wins) / n * 100, 2),
+        'total_pnl': float(pnl.sum()),
+        'avg_win': float(wins.mean()) if len(wins) else 0.0,
+        'avg_loss': float(losses.mean()) if len(losses) else 0.0,
+        # 總獲利 / 總虧損；沒有虧損時無法定義，回傳 None（JSON 為 null），不要寫成 0 讓人誤會是全虧
+        'profit_factor': float(wins.sum() / gross_loss) if gross_loss > 0 else None,
+        'max_drawdown': float(drawdown.max()),
+        # 每筆交易的 Sharpe（未年化），與 notebook 相同：mean / std * sqrt(n)
+        'sharpe_ratio': float(pnl.mean() / std * np.sqrt(n)) if std > 1e-12 else 0.0,
+        'avg_hold_minutes': float(hold.mean()),
+        'max_hold_minutes': float(hold.max()),
+        'min_hold_minutes': float(hold.min()),
+    }
+
+
+def summarize(pairs):
+    """
+    整體、各 symbol 與各 trader（策略變體）的績效，以及依出場小時的平均 PnL。
+    回傳可直接 JSON 化的 dict
+    """
+    hourly = pairs.groupby('exit_hour')['pnl'].agg(['mean', 'count'])
+    return {
+        'overall': _performance(pairs),
+        'by_symbol': {sym: _performance(group) for sym, group in pairs.groupby('symbol', sort=True)},
+        'by_name': {name: _performance(group) for name, group in pairs.groupby('name', sort=True)},
+        'by_hour': {int(hour): {'avg_pnl': float(row['mean']), 'trades': int(row['count'])}
+                    for hour, row in hourly.iterrows()},
+    }
+
+
+def analyze(db, symbol=None):
+    """讀取資料庫交易、配對並彙總（/api/analytics 使用）"""
+    return summarize(pair_trades(load_trades_frame(db, symbol)))
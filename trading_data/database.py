@@ -1,32 +1,158 @@
 import os
 import sqlite3
 import psycopg2
+from psycopg2 import pool as pg_pool
+from contextlib import contextmanager, nullcontext
+from collections import deque
 from datetime import datetime
 import json
 import hashlib
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from trading import metrics
+
+# 最新交易、時間區間、依 symbol 查詢都走索引，不必排序整張表
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_trades_action ON trades (action)',
+    'CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades (ts, id)',
+    'CREATE INDEX IF NOT EXISTS idx_trades_symbol_ts ON trades (symbol, ts, id)',
+)
+
+TRADE_FIELDS = ('id', 'trade_id', 'timestamp', 'ts', 'action', 'symbol', 'price', 'quantity',
+                'pnl', 'balance', 'sma_short', 'sma_long', 'order_id', 'name')
+MAX_PAGE_SIZE = 1000
+
+
+def _epoch_ms(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+
+def encode_cursor(ts, trade_id):
+    return f"{ts}_{trade_id}"
+
+
+def decode_cursor(cursor):
+    ts, trade_id = cursor.split('_')
+    return int(ts), int(trade_id)
+
+
+def _summarize_stats(total, wins, total_pnl):
+    return {
+        'total_trades': total,
+        'winning_trades': wins,
+        'win_rate': round((wins / total * 100) if total > 0 else 0, 2),
+        'total_pnl': round(float(total_pnl), 4)
+    }
+
 
 class TradingDatabase:
-    def __init__(self):
+    def __init__(self, write_behind=False, batch_size=100, flush_interval=1.0, max_queue=10000,
+                 pool_min=1, pool_max=10, pool_timeout=30.0, max_parked=10000):
         # 自動偵測使用哪種資料庫
-        database_url = os.getenv('DATABASE_URL')
+        self.database_url = os.getenv('DATABASE_URL')
+        self._local = threading.local()
+        # SQLite 各執行緒的連線（thread -> conn），結束的執行緒留下的連線在下次建立連線時關閉
+        self._thread_conns = {}
+        self._conns_lock = threading.Lock()
+        # SQLite 同時只能有一個寫入者；讀取走 WAL，不受這把鎖影響
+        self._write_lock = threading.Lock()
+        self._shared_conn = None
         
-        if database_url:
-            # PostgreSQL (Render/生產環境)
+        if self.database_url:
+            # PostgreSQL (Render/生產環境)：連線池，每次操作借一條連線
             self.db_type = 'postgres'
-            self.conn = psycopg2.connect(database_url)
+            self.pool = pg_pool.ThreadedConnectionPool(pool_min, pool_max, self.database_url)
+            # 連線池用完時 getconn() 直接丟 PoolError 而不是等待；先在這裡排隊等空出的連線
+            self._pool_slots = threading.BoundedSemaphore(pool_max)
+            self.pool_timeout = pool_timeout
         else:
-            # SQLite (本地開發)
+            # SQLite (本地開發)：每個執行緒一條連線，WAL 讓讀取不會卡住寫入
             self.db_type = 'sqlite'
+            self.pool = None
             os.makedirs('data', exist_ok=True)
-            self.conn = sqlite3.connect('data/trading.db', check_same_thread=False)
-            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.db_path = 'data/trading.db'
         
         self.init_tables()
+        
+        # write-behind：交易與狀態先進有界佇列，背景執行緒批次寫入
+        self._queue = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 單獨重寫仍失敗的 (kind, row)，保留在記憶體，可用 retry_parked() 重寫
+        self.parked = deque(maxlen=max_parked)
+        if write_behind:
+            self._queue = queue.Queue(maxsize=max_queue)
+            metrics.QUEUE_DEPTH.set_function(lambda: self._queue.qsize() if self._queue else None, 'db_writes')
+            self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+    
+    @property
+    def conn(self):
+        """相容舊用法（view_db、notebook）：SQLite 回傳目前執行緒的連線，PostgreSQL 回傳一條共用連線"""
+        if self.db_type == 'postgres':
+            if self._shared_conn is None or self._shared_conn.closed:
+                self._shared_conn = psycopg2.connect(self.database_url)
+            return self._shared_conn
+        return self._thread_conn()
+    
+    def _thread_conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._conns_lock:
+                for thread in [t for t in self._thread_conns if not t.is_alive()]:
+                    self._thread_conns.pop(thread).close()
+                self._thread_conns[threading.current_thread()] = conn
+        return conn
+    
+    @contextmanager
+    def connection(self, write=False):
+        """借用一條連線；區塊結束時 commit，發生例外則 rollback"""
+        if self.db_type == 'postgres':
+            if not self._pool_slots.acquire(timeout=self.pool_timeout):
+                raise pg_pool.PoolError(f"no database connection free after {self.pool_timeout}s")
+            try:
+                conn = self.pool.getconn()
+                try:
+                    yield conn
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    self.pool.putconn(conn)
+            finally:
+                self._pool_slots.release()
+        else:
+            conn = self._thread_conn()
+            with self._write_lock if write else nullcontext():
+                try:
+                    yield conn
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
     
     def init_tables(self):
+        with self.connection(write=True) as conn:
+            self._create_tables(conn)
+            self._migrate(conn)
+            self._init_statistics(conn)
+    
+    def _create_tables(self, conn):
         if self.db_type == 'postgres':
             # PostgreSQL 語法
-            self.conn.cursor().execute('''
+            conn.cursor().execute('''
                 CREATE TABLE IF NOT EXISTS trades (
                     id SERIAL PRIMARY KEY,
                     trade_id VARCHAR(100) UNIQUE NOT NULL,
@@ -39,11 +165,13 @@ class TradingDatabase:
                     balance DECIMAL(20, 8),
                     sma_short DECIMAL(20, 8),
                     sma_long DECIMAL(20, 8),
-                    order_id VARCHAR(100)
+                    order_id VARCHAR(100),
+                    ts BIGINT,
+                    name VARCHAR(100)
                 )
             ''')
             
-            self.conn.cursor().execute('''
+            conn.cursor().execute('''
                 CREATE TABLE IF NOT EXISTS system_state (
                     id INTEGER PRIMARY KEY,
                     position VARCHAR(10),
@@ -52,9 +180,60 @@ class TradingDatabase:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            
+            # 統計彙總表：insert_trade 在同一個交易內累加，/api/stats 不必掃整張表
+            conn.cursor().execute('''
+                CREATE TABLE IF NOT EXISTS trade_stats (
+                    id INTEGER PRIMARY KEY,
+                    total_trades BIGINT NOT NULL DEFAULT 0,
+                    winning_trades BIGINT NOT NULL DEFAULT 0,
+                    total_pnl DECIMAL(28, 8) NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            # 同一 symbol 可有多個策略變體，依 trader 名稱分開統計
+            conn.cursor().execute('''
+                CREATE TABLE IF NOT EXISTS trade_stats_by_name (
+                    name VARCHAR(100) PRIMARY KEY,
+                    total_trades BIGINT NOT NULL DEFAULT 0,
+                    winning_trades BIGINT NOT NULL DEFAULT 0,
+                    total_pnl DECIMAL(28, 8) NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            # 每個 trader（symbol 或 symbol 上的策略變體）一列狀態，記錄目前由哪個程序負責
+            conn.cursor().execute('''
+                CREATE TABLE IF NOT EXISTS symbol_state (
+                    name VARCHAR(100) PRIMARY KEY,
+                    symbol VARCHAR(20) NOT NULL,
+                    owner VARCHAR(100),
+                    position VARCHAR(10),
+                    entry_price DECIMAL(20, 8),
+                    balance DECIMAL(20, 8),
+                    pnl DECIMAL(20, 8),
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # 多程序分配 symbol：每個 symbol 一個租約，expires_at 為 epoch 毫秒
+            conn.cursor().execute('''
+                CREATE TABLE IF NOT EXISTS symbol_leases (
+                    symbol VARCHAR(20) PRIMARY KEY,
+                    owner VARCHAR(100),
+                    expires_at BIGINT NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            conn.cursor().execute('''
+                CREATE TABLE IF NOT EXISTS shard_workers (
+                    owner VARCHAR(100) PRIMARY KEY,
+                    heartbeat BIGINT NOT NULL
+                )
+            ''')
+            
         else:
             # SQLite 語法
-            self.conn.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS trades (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     trade_id TEXT UNIQUE NOT NULL,
@@ -67,11 +246,13 @@ class TradingDatabase:
                     balance REAL,
                     sma_short REAL,
                     sma_long REAL,
-                    order_id TEXT
+                    order_id TEXT,
+                    ts INTEGER,
+                    name TEXT
                 )
             ''')
             
-            self.conn.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS system_state (
                     id INTEGER PRIMARY KEY,
                     position TEXT,
@@ -80,81 +261,391 @@ class TradingDatabase:
                     updated_at TEXT
                 )
             ''')
-        
-        self.conn.commit()
+            
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS trade_stats (
+                    id INTEGER PRIMARY KEY,
+                    total_trades INTEGER NOT NULL DEFAULT 0,
+                    winning_trades INTEGER NOT NULL DEFAULT 0,
+                    total_pnl REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS trade_stats_by_name (
+                    name TEXT PRIMARY KEY,
+                    total_trades INTEGER NOT NULL DEFAULT 0,
+                    winning_trades INTEGER NOT NULL DEFAULT 0,
+                    total_pnl REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS symbol_state (
+                    name TEXT PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    owner TEXT,
+                    position TEXT,
+                    entry_price REAL,
+                    balance REAL,
+                    pnl REAL,
+                    updated_at TEXT
+                )
+            ''')
+            
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS symbol_leases (
+                    symbol TEXT PRIMARY KEY,
+                    owner TEXT,
+                    expires_at INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS shard_workers (
+                    owner TEXT PRIMARY KEY,
+                    heartbeat INTEGER NOT NULL
+                )
+            ''')
+            
+    
+    def _migrate(self, conn):
+        """舊資料庫補上 ts 欄位（epoch 毫秒）、name 欄位（trader 名稱）與索引"""
+        if self.db_type == 'postgres':
+            cursor = conn.cursor()
+            cursor.execute('ALTER TABLE trades ADD COLUMN IF NOT EXISTS ts BIGINT')
+            cursor.execute('ALTER TABLE trades ADD COLUMN IF NOT EXISTS name VARCHAR(100)')
+            self._backfill_ts(conn)
+            for sql in INDEXES:
+                cursor.execute(sql)
+        else:
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(trades)')]
+            if 'ts' not in columns:
+                conn.execute('ALTER TABLE trades ADD COLUMN ts INTEGER')
+            if 'name' not in columns:
+                conn.execute('ALTER TABLE trades ADD COLUMN name TEXT')
+            self._backfill_ts(conn)
+            for sql in INDEXES:
+                conn.execute(sql)
+    
+    def _backfill_ts(self, conn, batch=10000):
+        """由 timestamp 換算 ts；與寫入時相同，以本機時區解讀沒有時區的時間"""
+        if self.db_type == 'postgres':
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, timestamp FROM trades WHERE ts IS NULL')
+            rows = cursor.fetchall()
+        else:
+            rows = conn.execute('SELECT id, timestamp FROM trades WHERE ts IS NULL').fetchall()
+        if not rows:
+            return
+        updates = [(_epoch_ms(ts), trade_id) for trade_id, ts in rows]
+        for i in range(0, len(updates), batch):
+            if self.db_type == 'postgres':
+                cursor.executemany('UPDATE trades SET ts = %s WHERE id = %s', updates[i:i + batch])
+            else:
+                conn.executemany('UPDATE trades SET ts = ? WHERE id = ?', updates[i:i + batch])
+        logging.info(f"Backfilled ts for {len(updates)} trades")
+    
+    def _init_statistics(self, conn):
+        """第一次建立彙總表時，從既有交易重新計算一次"""
+        if self.db_type == 'postgres':
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM trade_stats WHERE id=1')
+            exists = cursor.fetchone()
+        else:
+            exists = conn.execute('SELECT 1 FROM trade_stats WHERE id=1').fetchone()
+        # 舊資料庫還沒有依名稱的統計時也重算一次
+        by_name = 'SELECT 1 FROM trade_stats_by_name LIMIT 1'
+        sells = "SELECT 1 FROM trades WHERE action='SELL' LIMIT 1"
+        if not exists or (not self._execute(conn, by_name).fetchone() and self._execute(conn, sells).fetchone()):
+            self._rebuild_statistics(conn)
+    
+    def _rebuild_statistics(self, conn):
+        query = '''
+            SELECT COUNT(*),
+                   COALESCE(SUM(CASE WHEN pnl > 0 THEN 1 ELSE 0 END), 0),
+                   COALESCE(SUM(pnl), 0)
+            FROM trades WHERE action='SELL'
+        '''
+        if self.db_type == 'postgres':
+            cursor = conn.cursor()
+            cursor.execute(query)
+            total, wins, total_pnl = cursor.fetchone()
+            cursor.execute('''
+                INSERT INTO trade_stats (id, total_trades, winning_trades, total_pnl)
+                VALUES (1, %s, %s, %s)
+                ON CONFLICT (id) DO UPDATE
+                SET total_trades = EXCLUDED.total_trades, winning_trades = EXCLUDED.winning_trades,
+                    total_pnl = EXCLUDED.total_pnl
+            ''', (total, wins, total_pnl))
+        else:
+            total, wins, total_pnl = conn.execute(query).fetchone()
+            conn.execute('''
+                INSERT OR REPLACE INTO trade_stats (id, total_trades, winning_trades, total_pnl)
+                VALUES (1, ?, ?, ?)
+            ''', (total, wins, total_pnl))
+        # name 欄位加入前的舊交易以 symbol 為名稱
+        self._execute(conn, 'DELETE FROM trade_stats_by_name')
+        self._execute(conn, '''
+            INSERT INTO trade_stats_by_name (name, total_trades, winning_trades, total_pnl)
+            SELECT COALESCE(name, symbol), COUNT(*),
+                   SUM(CASE WHEN pnl > 0 THEN 1 ELSE 0 END), COALESCE(SUM(pnl), 0)
+            FROM trades WHERE action='SELL'
+            GROUP BY COALESCE(name, symbol)
+        ''')
+    
+    def rebuild_statistics(self):
+        """從 trades 全表重新計算統計（校正用）"""
+        with self.connection(write=True) as conn:
+            self._rebuild_statistics(conn)
     
     def insert_trade(self, trade_data):
-        """原子性插入交易記錄"""
-        trade_id = f"{trade_data['symbol']}_{int(datetime.now().timestamp() * 1000)}"
+        """原子性插入交易記錄；write-behind 模式下排入佇列，由背景執行緒批次寫入"""
+        now = datetime.now()
+        ts = int(now.timestamp() * 1000)
+        # client order id 每筆訂單唯一；同一毫秒成交的多個策略變體不會互相衝突
+        trade_id = trade_data.get('order_id') or f"{trade_data['symbol']}_{ts}"
+        row = (
+            trade_id,
+            now if self.db_type == 'postgres' else now.isoformat(),
+            trade_data['action'],
+            trade_data['symbol'],
+            trade_data['price'],
+            trade_data['quantity'],
+            trade_data.get('pnl'),
+            trade_data.get('balance'),
+            trade_data.get('sma_short'),
+            trade_data.get('sma_long'),
+            trade_data.get('order_id'),
+            ts,
+            trade_data.get('name') or trade_data['symbol']
+        )
+        
+        if self._queue is not None:
+            self._queue.put(('trade', row))
+            return trade_id
         
+        with metrics.DB_COMMIT_SECONDS.time('trade'), self.connection(write=True) as conn:
+            self._write_trades(conn, [row])
+        return trade_id
+    
+    def save_state(self, position, entry_price, balance, name=None, symbol=None, owner=None, pnl=None):
+        """
+        儲存系統狀態。
+        有 name（trader 名稱）時寫入 symbol_state 的該列，並記錄 symbol 與負責的程序 owner；
+        沒有 name 時維持舊行為，寫入 system_state 的單一列（id=1）
+        """
+        now = datetime.now() if self.db_type == 'postgres' else datetime.now().isoformat()
+        if name is None:
+            state = (position, entry_price, balance, now)
+        else:
+            state = (name, symbol, owner, position, entry_price, balance, pnl, now)
+        
+        if self._queue is not None:
+            self._queue.put(('state', state))
+            return
+        
+        with metrics.DB_COMMIT_SECONDS.time('state'), self.connection(write=True) as conn:
+            self._write_state(conn, state)
+    
+    def _write_trades(self, conn, rows):
         if self.db_type == 'postgres':
-            cursor = self.conn.cursor()
-            cursor.execute('''
+            cursor = conn.cursor()
+            cursor.executemany('''
                 INSERT INTO trades 
-                (trade_id, timestamp, action, symbol, price, quantity, pnl, balance, sma_short, sma_long, order_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                trade_id,
-                datetime.now(),
-                trade_data['action'],
-                trade_data['symbol'],
-                trade_data['price'],
-                trade_data['quantity'],
-                trade_data.get('pnl'),
-                trade_data.get('balance'),
-                trade_data.get('sma_short'),
-                trade_data.get('sma_long'),
-                trade_data.get('order_id')
-            ))
+                (trade_id, timestamp, action, symbol, price, quantity, pnl, balance, sma_short, sma_long, order_id, ts, name)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', rows)
         else:
-            self.conn.execute('''
+            conn.executemany('''
                 INSERT INTO trades 
-                (trade_id, timestamp, action, symbol, price, quantity, pnl, balance, sma_short, sma_long, order_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                trade_id,
-                datetime.now().isoformat(),
-                trade_data['action'],
-                trade_data['symbol'],
-                trade_data['price'],
-                trade_data['quantity'],
-                trade_data.get('pnl'),
-                trade_data.get('balance'),
-                trade_data.get('sma_short'),
-                trade_data.get('sma_long'),
-                trade_data.get('order_id')
-            ))
+                (trade_id, timestamp, action, symbol, price, quantity, pnl, balance, sma_short, sma_long, order_id, ts, name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
         
-        self.conn.commit()
-        return trade_id
+        metrics.DB_ROWS.inc(amount=len(rows))
+        # 同一個交易內更新統計彙總（row: action 在 index 2，pnl 在 index 6，name 在 index 12）
+        sells = [row for row in rows if row[2] == 'SELL']
+        if not sells:
+            return
+        delta = (
+            len(sells),
+            sum(1 for row in sells if row[6] is not None and row[6] > 0),
+            sum(row[6] for row in sells if row[6] is not None)
+        )
+        by_name = {}
+        for row in sells:
+            total, wins, pnl = by_name.get(row[12], (0, 0, 0.0))
+            by_name[row[12]] = (total + 1, wins + (1 if row[6] is not None and row[6] > 0 else 0),
+                                pnl + (row[6] if row[6] is not None else 0.0))
+        p = '%s' if self.db_type == 'postgres' else '?'
+        upsert = f'''
+            INSERT INTO trade_stats_by_name (name, total_trades, winning_trades, total_pnl)
+            VALUES ({p}, {p}, {p}, {p})
+            ON CONFLICT (name) DO UPDATE
+            SET total_trades = trade_stats_by_name.total_trades + EXCLUDED.total_trades,
+                winning_trades = trade_stats_by_name.winning_trades + EXCLUDED.winning_trades,
+                total_pnl = trade_stats_by_name.total_pnl + EXCLUDED.total_pnl
+        '''
+        stats = [(name,) + counts for name, counts in by_name.items()]
+        if self.db_type == 'postgres':
+            cursor.executemany(upsert, stats)
+        else:
+            conn.executemany(upsert, stats)
+        if self.db_type == 'postgres':
+            cursor.execute('''
+                UPDATE trade_stats
+                SET total_trades = total_trades + %s, winning_trades = winning_trades + %s,
+                    total_pnl = total_pnl + %s
+                WHERE id = 1
+            ''', delta)
+        else:
+            conn.execute('''
+                UPDATE trade_stats
+                SET total_trades = total_trades + ?, winning_trades = winning_trades + ?,
+                    total_pnl = total_pnl + ?
+                WHERE id = 1
+            ''', delta)
     
-    def save_state(self, position, entry_price, balance):
-        """儲存系統狀態"""
+    def _write_state(self, conn, state):
+        if len(state) == 8:
+            self._write_symbol_state(conn, state)
+            return
         if self.db_type == 'postgres':
-            cursor = self.conn.cursor()
+            cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO system_state (id, position, entry_price, balance, updated_at)
-                VALUES (1, %s, %s, %s, NOW())
+                VALUES (1, %s, %s, %s, %s)
                 ON CONFLICT (id) DO UPDATE 
-                SET position = %s, entry_price = %s, balance = %s, updated_at = NOW()
-            ''', (position, entry_price, balance, position, entry_price, balance))
+                SET position = EXCLUDED.position, entry_price = EXCLUDED.entry_price,
+                    balance = EXCLUDED.balance, updated_at = EXCLUDED.updated_at
+            ''', state)
         else:
-            self.conn.execute('''
+            conn.execute('''
                 INSERT OR REPLACE INTO system_state (id, position, entry_price, balance, updated_at)
                 VALUES (1, ?, ?, ?, ?)
-            ''', (position, entry_price, balance, datetime.now().isoformat()))
-        
-        self.conn.commit()
+            ''', state)
     
-    def restore_state(self):
-        """恢復系統狀態"""
+    def _write_symbol_state(self, conn, state):
         if self.db_type == 'postgres':
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT position, entry_price, balance FROM system_state WHERE id=1')
-            result = cursor.fetchone()
+            conn.cursor().execute('''
+                INSERT INTO symbol_state (name, symbol, owner, position, entry_price, balance, pnl, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (name) DO UPDATE
+                SET symbol = EXCLUDED.symbol, owner = EXCLUDED.owner, position = EXCLUDED.position,
+                    entry_price = EXCLUDED.entry_price, balance = EXCLUDED.balance, pnl = EXCLUDED.pnl,
+                    updated_at = EXCLUDED.updated_at
+            ''', state)
         else:
-            cursor = self.conn.execute('SELECT position, entry_price, balance FROM system_state WHERE id=1')
-            result = cursor.fetchone()
+            conn.execute('''
+                INSERT OR REPLACE INTO symbol_state (name, symbol, owner, position, entry_price, balance, pnl, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', state)
+    
+    # ---------- write-behind ----------
+    
+    def _writer_loop(self):
+        """背景寫入：累積到 batch_size 筆或超過 flush_interval 秒就在同一個交易內寫入"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush_batch(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                break
+    
+    def _flush_batch(self, batch):
+        trades = [row for kind, row in batch if kind == 'trade']
+        # 每個 trader（舊格式為單一列）只需要最新的狀態快照
+        latest = {}
+        for kind, row in batch:
+            if kind == 'state':
+                latest[row[0] if len(row) == 8 else None] = row
+        states = list(latest.values())
+        try:
+            with metrics.DB_COMMIT_SECONDS.time('batch'), self.connection(write=True) as conn:
+                if trades:
+                    self._write_trades(conn, trades)
+                for state in states:
+                    self._write_state(conn, state)
+        except Exception as e:
+            # 一筆壞資料（例如重複的 trade_id）會讓整批 rollback；逐筆重寫，只把失敗的那幾筆留下
+            logging.warning(f"Write-behind batch failed ({e}), retrying {len(trades) + len(states)} rows one by one")
+            self._write_rows([('trade', row) for row in trades] + [('state', row) for row in states])
+    
+    def _write_rows(self, items):
+        """每筆各自一個交易寫入；失敗的放進 parked"""
+        for kind, row in items:
+            try:
+                with self.connection(write=True) as conn:
+                    if kind == 'trade':
+                        self._write_trades(conn, [row])
+                    else:
+                        self._write_state(conn, row)
+            except Exception as e:
+                self.parked.append((kind, row))
+                metrics.DB_PARKED.inc(kind)
+                logging.error(f"Write-behind {kind} parked: {e} | {row}")
+    
+    def retry_parked(self):
+        """重寫 parked 的資料（例如資料庫恢復後）；回傳仍然失敗的筆數"""
+        items = []
+        while self.parked:
+            items.append(self.parked.popleft())
+        self._write_rows(items)
+        return len(self.parked)
+    
+    def flush(self):
+        """等待佇列內所有寫入完成"""
+        if self._queue is not None:
+            self._queue.join()
+    
+    def close(self):
+        """停止背景寫入（先把佇列寫完）並關閉連線"""
+        if self._queue is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._queue = None
+        if self.pool is not None:
+            self.pool.closeall()
+        if self._shared_conn is not None:
+            self._shared_conn.close()
+        with self._conns_lock:
+            for conn in self._thread_conns.values():
+                conn.close()
+            self._thread_conns.clear()
+        self._local = threading.local()
+    
+    def restore_state(self, name=None):
+        """恢復系統狀態；有 name 時讀 symbol_state 的該列（含 pnl），否則讀舊的 system_state"""
+        if name is not None:
+            return self._restore_symbol_state(name)
+        with self.connection() as conn:
+            if self.db_type == 'postgres':
+                cursor = conn.cursor()
+                cursor.execute('SELECT position, entry_price, balance FROM system_state WHERE id=1')
+                result = cursor.fetchone()
+            else:
+                cursor = conn.execute('SELECT position, entry_price, balance FROM system_state WHERE id=1')
+                result = cursor.fetchone()
         
         if result:
             return {
@@ -164,31 +655,223 @@ class TradingDatabase:
             }
         return None
     
-    def get_statistics(self):
-        """獲取交易統計"""
+    def _restore_symbol_state(self, name):
+        p = '%s' if self.db_type == 'postgres' else '?'
+        with self.connection() as conn:
+            result = self._execute(conn, f'''
+                SELECT position, entry_price, balance, pnl, owner FROM symbol_state WHERE name = {p}
+            ''', (name,)).fetchone()
+        if not result:
+            return None
+        return {
+            'position': result[0],
+            'entry_price': float(result[1]) if result[1] else 0.0,
+            'balance': float(result[2]) if result[2] is not None else 1000.0,
+            'pnl': float(result[3]) if result[3] else 0.0,
+            'owner': result[4]
+        }
+    
+    def symbol_states(self, symbol=None):
+        """所有（或指定 symbol 的）trader 狀態，依 name 排序"""
+        p = '%s' if self.db_type == 'postgres' else '?'
+        sql = 'SELECT name, symbol, owner, position, entry_price, balance, pnl, updated_at FROM symbol_state'
+        params = ()
+        if symbol:
+            sql += f' WHERE symbol = {p}'
+            params = (symbol,)
+        with self.connection() as conn:
+            rows = self._execute(conn, sql + ' ORDER BY name', params).fetchall()
+        states = []
+        for name, sym, owner, position, entry_price, balance, pnl, updated_at in rows:
+            states.append({
+                'name': name, 'symbol': sym, 'owner': owner, 'position': position,
+                'entry_price': float(entry_price) if entry_price is not None else None,
+                'balance': float(balance) if balance is not None else None,
+                'pnl': float(pnl) if pnl is not None else None,
+                'updated_at': updated_at.isoformat() if isinstance(updated_at, datetime) else updated_at
+            })
+        return states
+    
+    def _execute(self, conn, sql, params=()):
+        """兩種資料庫共用的執行方式，回傳可 fetch 的 cursor"""
         if self.db_type == 'postgres':
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM trades WHERE action='SELL'")
-            total = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM trades WHERE action='SELL' AND pnl > 0")
-            wins = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT SUM(pnl) FROM trades WHERE action='SELL'")
-            total_pnl = cursor.fetchone()[0] or 0
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return cursor
+        return conn.execute(sql, params)
+    
+    # ---------- symbol 租約（多程序分片） ----------
+    
+    def register_symbols(self, symbols):
+        """建立尚未存在的 symbol 租約列（無人持有）"""
+        rows = [(symbol,) for symbol in symbols]
+        with self.connection(write=True) as conn:
+            if self.db_type == 'postgres':
+                conn.cursor().executemany(
+                    'INSERT INTO symbol_leases (symbol) VALUES (%s) ON CONFLICT (symbol) DO NOTHING', rows)
+            else:
+                conn.executemany('INSERT OR IGNORE INTO symbol_leases (symbol) VALUES (?)', rows)
+    
+    def claim_symbols(self, owner, symbols, count, expires_at, now_ms):
+        """
+        從 symbols 中搶最多 count 個無人持有或已過期的租約，回傳搶到的 symbol。
+        PostgreSQL 用 FOR UPDATE SKIP LOCKED，多個程序同時搶時各自拿到不同的列、不互相等待；
+        SQLite 一次只有一個寫入者，同一條 UPDATE 內的子查詢與更新本身就是原子的。
+        """
+        if count <= 0 or not symbols:
+            return []
+        symbols = list(symbols)
+        if self.db_type == 'postgres':
+            sql = '''
+                UPDATE symbol_leases SET owner = %s, expires_at = %s
+                WHERE symbol IN (
+                    SELECT symbol FROM symbol_leases
+                    WHERE symbol = ANY(%s) AND (owner IS NULL OR expires_at < %s)
+                    ORDER BY symbol LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING symbol
+            '''
+            params = (owner, expires_at, symbols, now_ms, count)
         else:
-            cursor = self.conn.execute("SELECT COUNT(*) FROM trades WHERE action='SELL'")
-            total = cursor.fetchone()[0]
-            
-            cursor = self.conn.execute("SELECT COUNT(*) FROM trades WHERE action='SELL' AND pnl > 0")
-            wins = cursor.fetchone()[0]
-            
-            cursor = self.conn.execute("SELECT SUM(pnl) FROM trades WHERE action='SELL'")
-            total_pnl = cursor.fetchone()[0] or 0
+            marks = ', '.join('?' * len(symbols))
+            sql = f'''
+                UPDATE symbol_leases SET owner = ?, expires_at = ?
+                WHERE symbol IN (
+                    SELECT symbol FROM symbol_leases
+                    WHERE symbol IN ({marks}) AND (owner IS NULL OR expires_at < ?)
+                    ORDER BY symbol LIMIT ?
+                )
+                RETURNING symbol
+            '''
+            params = (owner, expires_at, *symbols, now_ms, count)
+        with self.connection(write=True) as conn:
+            return sorted(row[0] for row in self._execute(conn, sql, params).fetchall())
+    
+    def renew_leases(self, owner, expires_at, now_ms):
+        """延長 owner 仍有效的租約，回傳目前確實持有的 symbol（已過期被別人搶走的不會回傳）"""
+        p = '%s' if self.db_type == 'postgres' else '?'
+        sql = f'''
+            UPDATE symbol_leases SET expires_at = {p}
+            WHERE owner = {p} AND expires_at >= {p}
+            RETURNING symbol
+        '''
+        with self.connection(write=True) as conn:
+            return sorted(row[0] for row in self._execute(conn, sql, (expires_at, owner, now_ms)).fetchall())
+    
+    def release_symbols(self, owner, symbols=None):
+        """釋放 owner 持有的租約（預設全部），讓其他程序立刻可以接手"""
+        p = '%s' if self.db_type == 'postgres' else '?'
+        sql = f'UPDATE symbol_leases SET owner = NULL, expires_at = 0 WHERE owner = {p}'
+        params = [owner]
+        if symbols is not None:
+            symbols = list(symbols)
+            if not symbols:
+                return
+            sql += f" AND symbol IN ({', '.join([p] * len(symbols))})"
+            params.extend(symbols)
+        with self.connection(write=True) as conn:
+            self._execute(conn, sql, params)
+    
+    def heartbeat_worker(self, owner, now_ms, stale_before):
+        """更新 owner 的心跳，順便清掉 stale_before 之前就沒有心跳的程序；回傳存活的 owner 清單"""
+        p = '%s' if self.db_type == 'postgres' else '?'
+        with self.connection(write=True) as conn:
+            if self.db_type == 'postgres':
+                self._execute(conn, '''
+                    INSERT INTO shard_workers (owner, heartbeat) VALUES (%s, %s)
+                    ON CONFLICT (owner) DO UPDATE SET heartbeat = EXCLUDED.heartbeat
+                ''', (owner, now_ms))
+            else:
+                self._execute(conn, 'INSERT OR REPLACE INTO shard_workers (owner, heartbeat) VALUES (?, ?)',
+                              (owner, now_ms))
+            self._execute(conn, f'DELETE FROM shard_workers WHERE heartbeat < {p}', (stale_before,))
+            rows = self._execute(conn, 'SELECT owner FROM shard_workers ORDER BY owner').fetchall()
+        return [row[0] for row in rows]
+    
+    def leave_workers(self, owner):
+        """程序正常結束時移除自己的心跳，其他程序下一輪就會重新分配"""
+        p = '%s' if self.db_type == 'postgres' else '?'
+        with self.connection(write=True) as conn:
+            self._execute(conn, f'DELETE FROM shard_workers WHERE owner = {p}', (owner,))
+    
+    def symbol_leases(self):
+        """所有租約：[{'symbol', 'owner', 'expires_at'}]"""
+        with self.connection() as conn:
+            rows = self._execute(conn, 'SELECT symbol, owner, expires_at FROM symbol_leases ORDER BY symbol').fetchall()
+        return [{'symbol': s, 'owner': o, 'expires_at': e} for s, o, e in rows]
+    
+    def get_statistics(self):
+        """獲取交易統計（讀取彙總表，O(1)）"""
+        with self.connection() as conn:
+            if self.db_type == 'postgres':
+                cursor = conn.cursor()
+                cursor.execute('SELECT total_trades, winning_trades, total_pnl FROM trade_stats WHERE id=1')
+                result = cursor.fetchone()
+            else:
+                result = conn.execute('SELECT total_trades, winning_trades, total_pnl FROM trade_stats WHERE id=1').fetchone()
+            by_name = self._execute(conn, '''
+                SELECT name, total_trades, winning_trades, total_pnl FROM trade_stats_by_name ORDER BY name
+            ''').fetchall()
         
-        return {
-            'total_trades': total,
-            'winning_trades': wins,
-            'win_rate': round((wins / total * 100) if total > 0 else 0, 2),
-            'total_pnl': round(float(total_pnl), 4)
-        }
\ No newline at end of file
+        total, wins, total_pnl = result or (0, 0, 0)
+        
+        stats = _summarize_stats(total, wins, total_pnl)
+        stats['by_name'] = {name: _summarize_stats(*row) for name, *row in by_name}
+        return stats
+    
+    def query_trades(self, symbol=None, action=None, start_ms=None, end_ms=None, limit=100,
+                     cursor=None, ascending=False):
+        """
+        依時間分頁查詢交易（keyset pagination，依 (ts, id) 排序）。
+        start_ms / end_ms 為 epoch 毫秒的閉區間；cursor 是上一頁回傳的 next_cursor。
+        回傳 {'trades': [...], 'next_cursor': str 或 None}
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        p = '%s' if self.db_type == 'postgres' else '?'
+        where, params = [], []
+        if symbol:
+            where.append(f'symbol = {p}')
+            params.append(symbol)
+        if action:
+            where.append(f'action = {p}')
+            params.append(action)
+        if start_ms is not None:
+            where.append(f'ts >= {p}')
+            params.append(int(start_ms))
+        if end_ms is not None:
+            where.append(f'ts <= {p}')
+            params.append(int(end_ms))
+        if cursor:
+            where.append(f"(ts, id) {'>' if ascending else '<'} ({p}, {p})")
+            params.extend(decode_cursor(cursor))
+        direction = 'ASC' if ascending else 'DESC'
+        sql = f"SELECT {', '.join(TRADE_FIELDS)} FROM trades"
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += f' ORDER BY ts {direction}, id {direction} LIMIT {p}'
+        # 多抓一筆判斷是否還有下一頁
+        params.append(limit + 1)
+        
+        with self.connection() as conn:
+            if self.db_type == 'postgres':
+                cur = conn.cursor()
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            else:
+                rows = conn.execute(sql, params).fetchall()
+        
+        trades = []
+        for row in rows[:limit]:
+            trade = dict(zip(TRADE_FIELDS, row))
+            if isinstance(trade['timestamp'], datetime):
+                trade['timestamp'] = trade['timestamp'].isoformat()
+            for key in ('price', 'quantity', 'pnl', 'balance', 'sma_short', 'sma_long'):
+                if trade[key] is not None:
+                    trade[key] = float(trade[key])
+            trades.append(trade)
+        next_cursor = None
+        if len(rows) > limit:
+            last = trades[-1]
+            next_cursor = encode_cursor(last['ts'], last['id'])
+        return {'trades': trades, 'next_cursor': next_cursor}
@@ -0,0 +1,172 @@
+import os
+import json
+import shutil
+import logging
+from datetime import datetime
+
+# 匯出欄位（symbol 與日期放在分割目錄名稱，不重複寫進檔案）
+COLUMNS = ('id', 'trade_id', 'timestamp', 'ts', 'action', 'symbol', 'price', 'quantity',
+           'pnl', 'balance', 'sma_short', 'sma_long', 'order_id', 'name')
+FLOAT_COLUMNS = ('price', 'quantity', 'pnl', 'balance', 'sma_short', 'sma_long')
+
+WATERMARK_FILE = '_watermark.json'
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()),
+        ('trade_id', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+        ('ts', pa.int64()),
+        ('action', pa.string()),
+        ('price', pa.float64()),
+        ('quantity', pa.float64()),
+        ('pnl', pa.float64()),
+        ('balance', pa.float64()),
+        ('sma_short', pa.float64()),
+        ('sma_long', pa.float64()),
+        ('order_id', pa.string()),
+        ('name', pa.string()),
+    ])
+
+
+def _to_datetime(value):
+    # SQLite 存 ISO 字串，PostgreSQL 回傳 datetime
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+class TradeExporter:
+    """
+    將 trades 以欄式 Parquet 匯出，目錄依 symbol/日期分割：
+        <root>/symbol=BTCUSDT/date=2024-01-31/part-000000001234.parquet
+    以 id 為水位線分批（keyset）讀取，每批寫完才推進水位線，
+    所以 export() 只處理上次之後的新交易，中途失敗重跑也不會重複。
+    （PostgreSQL 多個程序同時寫入時，較小的 id 可能較晚提交；必要時用 full=True 重匯。）
+    """
+
+    def __init__(self, db, root='data/trades', chunk_size=50000):
+        self.db = db
+        self.root = root
+        self.chunk_size = chunk_size
+        self.watermark_path = os.path.join(root, WATERMARK_FILE)
+
+    def watermark(self):
+        """上次匯出的最後一筆 id（從未匯出為 0）"""
+        if not os.path.exists(self.watermark_path):
+            return 0
+        with open(self.watermark_path) as f:
+            return int(json.load(f)['last_id'])
+
+    def _save_watermark(self, last_id):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.watermark_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'last_id': last_id, 'exported_at': datetime.now().isoformat()}, f)
+        os.replace(tmp, self.watermark_path)
+
+    def _fetch_chunk(self, after_id):
+        placeholder = '%s' if self.db.db_type == 'postgres' else '?'
+        query = f'''
+            SELECT {', '.join(COLUMNS)} FROM trades
+            WHERE id > {placeholder} ORDER BY id LIMIT {placeholder}
+        '''
+        with self.db.connection() as conn:
+            if self.db.db_type == 'postgres':
+                cursor = conn.cursor()
+                cursor.execute(query, (after_id, self.chunk_size))
+            else:
+                cursor = conn.execute(query, (after_id, self.chunk_size))
+            return cursor.fetchall()
+
+    def _write_chunk(self, rows):
+        """依 (symbol, 日期) 分組寫檔；檔名取該組最小 id，重跑同一批會覆蓋而不是重複"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _schema()
+        groups = {}
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            record['timestamp'] = _to_datetime(record['timestamp'])
+            for col in FLOAT_COLUMNS:
+                if record[col] is not None:
+                    record[col] = float(record[col])
+            key = (record.pop('symbol'), record['timestamp'].date().isoformat())
+            groups.setdefault(key, []).append(record)
+
+        for (symbol, day), records in groups.items():
+            directory = os.path.join(self.root, f'symbol={symbol}', f'date={day}')
+            os.makedirs(directory, exist_ok=True)
+            table = pa.Table.from_pylist(records, schema=schema)
+            pq.write_table(table, os.path.join(directory, f"part-{records[0]['id']:012d}.parquet"),
+                           compression='zstd')
+        return len(groups)
+
+    def export(self, full=False):
+        """
+        匯出水位線之後的交易；full=True 則從頭重新匯出。
+        回傳 {'rows': 匯出筆數, 'files': 寫入檔案數, 'last_id': 新水位線}
+        """
+        if full and os.path.isdir(self.root):
+            # 重新匯出前清掉舊的分割目錄，避免批次邊界不同造成重複
+            shutil.rmtree(self.root)
+        last_id = 0 if full else self.watermark()
+        exported = files = 0
+        while True:
+            rows = self._fetch_chunk(last_id)
+            if not rows:
+                break
+            files += self._write_chunk(rows)
+            exported += len(rows)
+            last_id = rows[-1][0]
+            self._save_watermark(last_id)
+            if len(rows) < self.chunk_size:
+                break
+        if exported:
+            logging.info(f"Exported {exported} trades to {self.root} ({files} files), watermark {last_id}")
+        return {'rows': exported, 'files': files, 'last_id': last_id}
+
+
+def load_trades(root='data/trades', symbols=None, start_date=None, end_date=None, columns=None):
+    """
+    讀回匯出的交易（pandas DataFrame，依 id 排序）。
+    symbols / start_date / end_date（'YYYY-MM-DD'）只讀取符合的分割目錄。
+    """
+    import pyarrow.dataset as ds
+
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"No trade export at {root}, run TradeExporter(db).export() first")
+    # 以目前的欄位定義讀取，較早匯出、缺少新欄位的檔案補 null
+    import pyarrow as pa
+    schema = _schema()
+    schema = schema.append(pa.field('symbol', pa.string())).append(pa.field('date', pa.string()))
+    dataset = ds.dataset(root, format='parquet', partitioning='hive', ignore_prefixes=['_', '.'], schema=schema)
+    predicate = None
+    if symbols:
+        predicate = ds.field('symbol').isin(list(symbols))
+    if start_date:
+        cond = ds.field('date') >= start_date
+        predicate = cond if predicate is None else predicate & cond
+    if end_date:
+        cond = ds.field('date') <= end_date
+        predicate = cond if predicate is None else predicate & cond
+    if columns is not None and 'id' not in columns:
+        columns = ['id'] + list(columns)
+    table = dataset.to_table(columns=columns, filter=predicate)
+    return table.to_pandas().sort_values('id', kind='stable').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from trading_data.database import TradingDatabase
+
+    parser = argparse.ArgumentParser(description='Export trades to partitioned Parquet')
+    parser.add_argument('--root', default='data/trades')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--full', action='store_true', help='Ignore the watermark and re-export everything')
+    args = parser.parse_args()
+
+    result = TradeExporter(TradingDatabase(), args.root, args.chunk_size).export(full=args.full)
+    print(f"Exported {result['rows']} trades ({result['files']} files), watermark {result['last_id']}")
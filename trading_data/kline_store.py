@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+from trading.clock import next_open_ms
+from trading.utils import interval_to_ms
+
+# Binance 單次 get_klines 上限
+MAX_KLINES_PER_REQUEST = 1000
+
+
+class KlineStore:
+    """
+    本地 K 線快取（SQLite），以 (symbol, interval, open_time) 為主鍵。
+    sync() 只向 Binance 補抓缺少的區段，其餘讀取都走本地資料。
+    """
+
+    def __init__(self, path='data/klines.db'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.lock = threading.Lock()
+        # 每個 (symbol, interval) 在程序啟動後只做一次完整缺口掃描
+        self._gap_checked = set()
+        self.init_tables()
+
+    def init_tables(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS klines (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                open_time INTEGER NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                volume REAL NOT NULL,
+                close_time INTEGER NOT NULL,
+                quote_volume REAL,
+                trades INTEGER,
+                taker_base_volume REAL,
+                taker_quote_volume REAL,
+                PRIMARY KEY (symbol, interval, open_time)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def insert(self, symbol, interval, klines):
+        """寫入 K 線（Binance row 格式），重複的 open_time 直接覆蓋"""
+        rows = [
+            (symbol, interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]),
+             int(k[6]), float(k[7]), int(k[8]), float(k[9]), float(k[10]))
+            for k in klines
+        ]
+        if not rows:
+            return 0
+        with self.lock:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO klines
+                (symbol, interval, open_time, open, high, low, close, volume, close_time,
+                 quote_volume, trades, taker_base_volume, taker_quote_volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            self.conn.commit()
+        return len(rows)
+
+    def latest_open_time(self, symbol, interval):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT MAX(open_time) FROM klines WHERE symbol=? AND interval=?', (symbol, interval)
+            ).fetchone()
+        return row[0]
+
+    def find_gaps(self, symbol, interval):
+        """回傳 [(last_open_time, next_open_time), ...]，兩者之間缺少 K 線"""
+        step = interval_to_ms(interval)
+        with self.lock:
+            return self.conn.execute('''
+                SELECT open_time, next_open FROM (
+                    SELECT open_time, LEAD(open_time) OVER (ORDER BY open_time) AS next_open
+                    FROM klines WHERE symbol=? AND interval=?
+                ) WHERE next_open - open_time > ?
+            ''', (symbol, interval, step)).fetchall()
+
+    def _fetch_range(self, client, symbol, interval, start_time, end_time, now_ms):
+        """分頁抓取 [start_time, end_time] 的已收盤 K 線"""
+        fetched = 0
+        while start_time <= end_time:
+            klines = client.get_klines(symbol=symbol, interval=interval, startTime=start_time,
+                                       endTime=end_time, limit=MAX_KLINES_PER_REQUEST)
+            if not klines:
+                break
+            fetched += self.insert(symbol, interval, [k for k in klines if k[6] < now_ms])
+            start_time = next_open_ms(klines[-1][0], interval)
+            if len(klines) < MAX_KLINES_PER_REQUEST:
+                break
+        return fetched
+
+    def sync(self, client, symbol, interval, lookback=1000, now_ms=None):
+        """
+        補齊本地快取到最新一根已收盤 K 線。
+        空快取時抓最近 lookback 根；首次呼叫時另外補上中間的缺口。
+        """
+        now_ms = now_ms or int(time.time() * 1000)
+        step = interval_to_ms(interval)
+        fetched = 0
+        key = (symbol, interval)
+        if key not in self._gap_checked:
+            for last_open, next_open in self.find_gaps(symbol, interval):
+                fetched += self._fetch_range(client, symbol, interval, next_open_ms(last_open, interval),
+                                             next_open - 1, now_ms)
+            self._gap_checked.add(key)
+
+        latest = self.latest_open_time(symbol, interval)
+        start_time = next_open_ms(latest, interval) if latest is not None else now_ms - lookback * step
+        # 最新一根仍在形成中，只抓到它之前
+        if next_open_ms(start_time, interval) <= now_ms:
+            fetched += self._fetch_range(client, symbol, interval, start_time, now_ms, now_ms)
+        if fetched:
+            logging.info(f"KlineStore synced {fetched} {symbol} {interval} candles")
+        return fetched
+
+    def get_klines(self, symbol, interval, limit=None, start_time=None, end_time=None):
+        """讀取本地 K 線，依 open_time 由舊到新，格式同 client.get_klines"""
+        sql = '''
+            SELECT open_time, open, high, low, close, volume, close_time,
+                   quote_volume, trades, taker_base_volume, taker_quote_volume
+            FROM klines WHERE symbol=? AND interval=?
+        '''
+        params = [symbol, interval]
+        if start_time is not None:
+            sql += ' AND open_time >= ?'
+            params.append(start_time)
+        if end_time is not None:
+            sql += ' AND open_time <= ?'
+            params.append(end_time)
+        sql += ' ORDER BY open_time DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        rows.reverse()
+        return [list(r) for r in rows]
+
+    def to_array(self, symbol, interval, start_time=None, end_time=None):
+        """以 numpy 陣列回傳（供回測使用）"""
+        import numpy as np
+        rows = self.get_klines(symbol, interval, start_time=start_time, end_time=end_time)
+        return np.array(rows, dtype=np.float64).reshape(-1, 11)
+
+    def close(self):
+        self.conn.close()
@@ -1,5 +1,4 @@
 from database import TradingDatabase
-import sqlite3
 
 db = TradingDatabase()
 
@@ -9,15 +8,9 @@ for key, value in stats.items():
     print(f"{key}: {value}")
 
 print("\n=== 最近 10 筆交易 ===")
-cursor = db.conn.execute('''
-    SELECT timestamp, action, price, quantity, pnl 
-    FROM trades 
-    ORDER BY timestamp DESC 
-    LIMIT 10
-''')
-
-for row in cursor.fetchall():
-    print(f"{row[0]} | {row[1]} | Price: {row[2]} | Qty: {row[3]} | PnL: {row[4]}")
+# 走 (ts, id) 索引，只讀最新 10 筆
+for t in db.query_trades(limit=10)['trades']:
+    print(f"{t['timestamp']} | {t['action']} | Price: {t['price']} | Qty: {t['quantity']} | PnL: {t['pnl']}")
 
 print("\n=== 當前狀態 ===")
 state = db.restore_state()
@@ -26,4 +19,12 @@ if state:
     print(f"Entry Price: {state['entry_price']}")
     print(f"Balance: {state['balance']}")
 else:
-    print("No saved state")
\ No newline at end of file
+    print("No saved state")
+print("\n=== 各 trader 狀態 ===")
+for s in db.symbol_states():
+    print(f"{s['name']} | {s['owner'] or '-'} | {s['position'] or 'FLAT'} | Entry: {s['entry_price']} | "
+          f"Balance: {s['balance']} | PnL: {s['pnl']} | {s['updated_at']}")
+
+print("\n=== 幣種租約 ===")
+for lease in db.symbol_leases():
+    print(f"{lease['symbol']} | {lease['owner'] or '-'} | expires_at: {lease['expires_at']}")